@@ -1,4 +1,10 @@
 ENDPOINTS = {
+    # local stand-in (environments/ascii_align/mock_server.py), no GPU or network
+    "mock": {
+        "model": "mock",
+        "url": "http://127.0.0.1:8000/v1",
+        "key": "MOCK_API_KEY",
+    },
     # allenai
     "olmo3-32b-t": {
         "model": "allenai/olmo-3-32b-think",
@@ -987,8 +987,11 @@ def detect_misaligned(diagram: str, require_at_least_one_rect: bool = True) -> D
     Backward compatibility:
     - correct is retained as an alias for correct_rectangles.
     """
-    grid = normalize_grid(diagram)
+    return detect_misaligned_grid(normalize_grid(diagram), require_at_least_one_rect)
 
+
+def detect_misaligned_grid(grid: List[List[str]], require_at_least_one_rect: bool = True) -> Dict[str, int]:
+    """Same diagnostics as `detect_misaligned`, for an already normalized grid."""
     correct_rectangles, rectangle_errors, _consumed_box_cells, valid_boxes = _detect_rectangles(grid)
     connector_errors = _count_connector_errors(grid)
     connector_errors += _count_vertical_stack_centering_errors(grid, valid_boxes)
@@ -1007,3 +1010,10 @@ def detect_misaligned(diagram: str, require_at_least_one_rect: bool = True) -> D
         "correct": correct_rectangles,
         "misaligned": misaligned,
     }
+
+
+if __name__ == "__main__":
+    # The commands live in ascii_align_cli.py, so editing them leaves checker_version() alone.
+    from ascii_align_cli import main
+
+    main()
@@ -1,16 +1,37 @@
+from __future__ import annotations
+
+import atexit
+import functools
 import logging
 import re
-
-import verifiers as vf
-from datasets import load_dataset
+import time
+from typing import TYPE_CHECKING
 
 from alignment_check import (
     _find_spans,
     _validate_box,
-    detect_misaligned,
     has_disallowed_box_drawing_chars,
-    normalize_grid,
 )
+from difficulty import DifficultyIndex, skipped_examples
+from layout_spec import expected_columns, info_layout_spec, span_target
+from response_cache import DEFAULT_RESPONSE_CACHE_MAX_ENTRIES, ResponseCache
+from rollout_store import DEFAULT_FLUSH_ROWS, RolloutStore
+from scoring_cache import (
+    DEFAULT_CACHE_SIZE,
+    DEFAULT_DISK_CACHE_MAX_ENTRIES,
+    cached_detect_misaligned,
+    cached_layout_centers,
+    configure_scoring_cache,
+    scoring_cache_stats,
+)
+from scoring_pool import CACHE_HIT_METRIC, SAMPLED_METRIC, TIMEOUT_METRIC, ScoringPool, async_reward_funcs
+from splits import prepare_splits
+from token_budget import TokenBudgetModel
+
+# verifiers and datasets are only imported by `load_environment`, so scoring
+# workers and tools that just score diagrams start without them.
+if TYPE_CHECKING:
+    import verifiers as vf
 
 
 logger = logging.getLogger("verifiers.ascii_align")
@@ -18,8 +39,8 @@ logger = logging.getLogger("verifiers.ascii_align")
 _TEXT_FENCE_RE = re.compile(r"```text\s*(.*?)\s*```", re.IGNORECASE | re.DOTALL)
 
 SYSTEM_PROMPT = """
-You generate ASCII diagrams for the user's request. 
-Respond with a single markdown code block fenced with ```text and ``` 
+You generate ASCII diagrams for the user's request.
+Respond with a single markdown code block fenced with ```text and ```
 containing only the ASCII diagram.
 
 For box structure, use only these corner characters: ┌, ┐, └, ┘.
@@ -28,6 +49,58 @@ You may use normal text/content characters (letters, numbers, punctuation, symbo
 """
 
 
+# Matches the closing fence only when more text follows it; the opening
+# "```text" never matches, and a reply that simply ends at "```" needs no stop.
+CLOSING_FENCE_STOP = "\n```\n"
+
+
+def fence_stop_sampling_args() -> dict:
+    """
+    Sampling args that end generation once the diagram fence closes.
+
+    Only for vLLM endpoints serving non-thinking models: `extra_body`'s
+    `include_stop_str_in_output` is a vLLM extension that OpenAI rejects,
+    some OpenAI models reject `stop` altogether, and vLLM matches stop
+    strings against the reasoning too, so a thinking model would stop on
+    the first fenced draft it writes while reasoning.
+    """
+    return {"stop": [CLOSING_FENCE_STOP], "extra_body": {"include_stop_str_in_output": True}}
+
+
+def requests_fence_stop(sampling_args) -> bool:
+    stop = (sampling_args or {}).get("stop") or []
+    return CLOSING_FENCE_STOP in ([stop] if isinstance(stop, str) else stop)
+
+
+def _has_unclosed_text_fence(content: str) -> bool:
+    opening = content.lower().rfind("```text")
+    return opening >= 0 and "```" not in content[opening + len("```text") :]
+
+
+def _restore_closing_fence(response) -> None:
+    """
+    Re-append the closing fence to replies that stopped on it without keeping it.
+
+    Meant for requests that sent `fence_stop_sampling_args`. vLLM reports the
+    matched string as `stop_reason` and None for an end-of-sequence stop;
+    only the former is repaired, so a reply that ended inside an open
+    ```text block still fails the format check. Choices without a
+    `stop_reason` field at all (servers that do not send it) are repaired
+    when they finished with "stop". Replies cut by the token limit are left
+    alone.
+    """
+    for choice in getattr(response, "choices", None) or []:
+        if hasattr(choice, "stop_reason"):
+            if choice.stop_reason != CLOSING_FENCE_STOP:
+                continue
+        elif getattr(choice, "finish_reason", None) != "stop":
+            continue
+        message = getattr(choice, "message", None)
+        content = getattr(message, "content", None)
+        if content and _has_unclosed_text_fence(content):
+            message.content = content.rstrip("\n") + CLOSING_FENCE_STOP.rstrip("\n")
+
+
 def _extract_diagram(completion) -> str | None:
     response = completion[-1]["content"]
 
@@ -57,11 +130,14 @@ def _alignment_stats(completion) -> dict[str, int] | None:
     if has_disallowed_box_drawing_chars(diagram):
         return None
 
-    return detect_misaligned(diagram)
+    return cached_detect_misaligned(diagram)
 
 
 def alignment_reward(completion) -> float:
-    stats = _alignment_stats(completion)
+    return _alignment_ratio(_alignment_stats(completion))
+
+
+def _alignment_ratio(stats: dict[str, int] | None) -> float:
     if stats is None:
         return 0.0
 
@@ -92,58 +168,13 @@ def _cluster_columns(columns: list[float], threshold: float = 2.0) -> list[list[
     return clusters
 
 
-def _expected_layout_columns(info: dict | None, box_count: int) -> int:
-    if box_count <= 2:
-        return 2
-
-    safe_info = info or {}
-    theme = str(safe_info.get("theme", "")).lower()
-
-    shape_budget = safe_info.get("shape_budget")
-    try:
-        shape_budget = int(shape_budget) if shape_budget is not None else None
-    except (TypeError, ValueError):
-        shape_budget = None
-
-    if theme == "sequence":
-        return 3
-
-    if shape_budget is not None:
-        if shape_budget >= 10:
-            return 3
-        if shape_budget <= 4:
-            return 2
-
-    if box_count >= 6:
-        return 3
-    return 2
-
-
-def _desired_boxes_per_column(info: dict | None) -> float:
-    safe_info = info or {}
-    theme = str(safe_info.get("theme", "")).lower()
-
-    shape_budget = safe_info.get("shape_budget")
-    try:
-        shape_budget = int(shape_budget) if shape_budget is not None else None
-    except (TypeError, ValueError):
-        shape_budget = None
-
-    if theme == "sequence":
-        return 1.6
-    if theme == "state_machines":
-        return 2.0 if shape_budget is not None and shape_budget >= 12 else 2.3
-    if shape_budget is not None and shape_budget >= 12:
-        return 2.2
-    return 2.8
-
-
-def _layout_box_centers(grid: list[list[str]]) -> list[float]:
+def _layout_box_centers(grid: list[list[str]], find_spans=_find_spans, validate_box=_validate_box) -> list[float]:
+    """Column centers of the valid boxes; `find_spans`/`validate_box` can come from another checker version."""
     if not grid:
         return []
 
-    top_spans = sorted(_find_spans(grid, "┌", "┐"), key=lambda s: (s.row, s.c0, s.c1))
-    bottom_spans = sorted(_find_spans(grid, "└", "┘"), key=lambda s: (s.row, s.c0, s.c1))
+    top_spans = sorted(find_spans(grid, "┌", "┐"), key=lambda s: (s.row, s.c0, s.c1))
+    bottom_spans = sorted(find_spans(grid, "└", "┘"), key=lambda s: (s.row, s.c0, s.c1))
 
     bottoms_by_key: dict[tuple[int, int], list] = {}
     for bottom in bottom_spans:
@@ -155,7 +186,7 @@ def _layout_box_centers(grid: list[list[str]]) -> list[float]:
         for bottom in candidates:
             if bottom.row <= top.row:
                 continue
-            if _validate_box(grid, top, bottom):
+            if validate_box(grid, top, bottom):
                 centers.append(0.5 * (top.c0 + top.c1))
                 break
 
@@ -170,11 +201,14 @@ def layout_spread_reward(completion, info=None) -> float:
     if has_disallowed_box_drawing_chars(diagram):
         return 0.0
 
-    grid = normalize_grid(diagram)
-    if not grid or not grid[0]:
+    centers, width = cached_layout_centers(diagram, _layout_box_centers)
+    return _layout_spread_score(centers, width, info)
+
+
+def _layout_spread_score(centers: list[float], width: int, info=None) -> float:
+    if width <= 0:
         return 0.0
 
-    centers = _layout_box_centers(grid)
     box_count = len(centers)
     if box_count < 2:
         return 0.0
@@ -182,21 +216,20 @@ def layout_spread_reward(completion, info=None) -> float:
     clusters = _cluster_columns(centers, threshold=2.0)
     unique_columns = len(clusters)
 
-    expected_columns = _expected_layout_columns(info, box_count)
-    column_score = min(1.0, max(0.0, (unique_columns - 1) / max(1, expected_columns - 1)))
+    spec = info_layout_spec(info)
+    columns = expected_columns(spec, box_count)
+    column_score = min(1.0, max(0.0, (unique_columns - 1) / max(1, columns - 1)))
 
-    width = len(grid[0])
     horizontal_span = max(centers) - min(centers)
     normalized_span = horizontal_span / max(1.0, float(width - 1))
-    span_target = 0.22 if expected_columns >= 3 else 0.12
-    span_score = min(1.0, normalized_span / span_target)
+    span_score = min(1.0, normalized_span / span_target(columns))
 
     largest_cluster = max(len(cluster) for cluster in clusters)
     dominance = largest_cluster / float(box_count)
     stack_penalty = 0.0 if unique_columns == 1 else (0.75 if dominance >= 0.85 and box_count >= 4 else 1.0)
 
     boxes_per_column = box_count / float(unique_columns)
-    desired_bpc = _desired_boxes_per_column(info)
+    desired_bpc = spec["boxes_per_column"]
     column_density_penalty = min(1.0, desired_bpc / max(1.0, boxes_per_column))
 
     score = (0.7 * column_score + 0.3 * span_score) * stack_penalty * column_density_penalty
@@ -241,56 +274,406 @@ def misaligned_total_metric(completion) -> float:
     return _normalized_dimension(stats, "misaligned")
 
 
-def load_environment() -> vf.Environment:
+REWARD_FUNCS = [
+    format_reward,
+    alignment_reward,
+    layout_spread_reward,
+    rectangle_error_metric,
+    connector_error_metric,
+    arrow_error_metric,
+    misaligned_total_metric,
+]
+REWARD_WEIGHTS = [1.0, 1.0, 1.0, 0.0, 0.0, 0.0, 0.0]
+
+# Zero-weight diagnostics and the stats field each one normalizes.
+DIAGNOSTIC_FIELDS = {
+    "rectangle_error_metric": "rectangle_errors",
+    "connector_error_metric": "connector_errors",
+    "arrow_error_metric": "arrow_errors",
+    "misaligned_total_metric": "misaligned",
+}
+
+
+# Raw checker counts and layout measurements behind the rewards, stored per
+# rollout for analysis (None when there is no scorable diagram).
+FEATURE_FIELDS = (
+    "correct_rectangles",
+    "rectangle_errors",
+    "connector_errors",
+    "arrow_errors",
+    "misaligned",
+    "box_count",
+    "layout_columns",
+    "expected_columns",
+    "layout_span",
+    "diagram_width",
+    "diagram_height",
+)
+
+
+def rollout_features(completion, info=None) -> dict[str, float | None]:
+    """`FEATURE_FIELDS` for one completion, from the same cached results the rewards use."""
+    features: dict[str, float | None] = dict.fromkeys(FEATURE_FIELDS)
+    stats = _alignment_stats(completion)
+    if stats is None:
+        return features
+    for key in ("correct_rectangles", "rectangle_errors", "connector_errors", "arrow_errors", "misaligned"):
+        features[key] = stats[key]
+
+    diagram = _extract_diagram(completion)
+    lines = diagram.splitlines()
+    features["diagram_height"] = len(lines)
+    centers, width = cached_layout_centers(diagram, _layout_box_centers)
+    features["diagram_width"] = width
+    features["box_count"] = len(centers)
+    if centers:
+        features["layout_columns"] = len(_cluster_columns(centers, threshold=2.0))
+        features["expected_columns"] = expected_columns(info_layout_spec(info), len(centers))
+        features["layout_span"] = (max(centers) - min(centers)) / max(1.0, float(width - 1))
+    return features
+
+
+def score_completion(completion, info=None, diagnostics: bool = True, features: bool = False) -> dict[str, float]:
+    """
+    Every rubric value for one completion, keyed by reward function name.
+
+    With `diagnostics=False` only the weighted rewards are computed and the
+    zero-weight diagnostic metrics are left out. With `features=True` the
+    `rollout_features` values are added under their own names.
+    """
+    scores = {
+        "format_reward": format_reward(completion),
+        "alignment_reward": alignment_reward(completion),
+        "layout_spread_reward": layout_spread_reward(completion, info=info),
+    }
+    if diagnostics:
+        stats = _alignment_stats(completion)
+        for name, key in DIAGNOSTIC_FIELDS.items():
+            scores[name] = _normalized_dimension(stats, key)
+    if features:
+        scores.update(rollout_features(completion, info))
+    return scores
+
+
+def record_difficulty(index: DifficultyIndex, info: dict | None, scores: dict[str, float]) -> None:
+    """Add one rollout's weighted reward to the difficulty index."""
+    source_index = (info or {}).get("source_index")
+    if source_index is None:
+        return
+    reward = sum(weight * scores[func.__name__] for func, weight in zip(REWARD_FUNCS, REWARD_WEIGHTS))
+    index.record(source_index, reward)
+
+
+ROLLOUT_COLUMNS = {
+    "rollout_id": "string",
+    "model": "string",
+    "split": "string",
+    "example_id": "int64",
+    "source_index": "int64",
+    "train_order_index": "int64",
+    "theme": "string",
+    "shape_budget": "string",
+    "reward": "float64",
+    **{func.__name__: "float64" for func in REWARD_FUNCS},
+    SAMPLED_METRIC: "float64",
+    TIMEOUT_METRIC: "float64",
+    CACHE_HIT_METRIC: "float64",
+    **{name: "int64" for name in FEATURE_FIELDS if name != "layout_span"},
+    "layout_span": "float64",
+    "generation_ms": "float64",
+    "scoring_ms": "float64",
+    "completion": "string",
+    "recorded_at": "float64",
+}
+
+
+def store_rollout(store: RolloutStore, state: dict, scores: dict[str, float], scoring_ms: float) -> None:
+    """Append one scored rollout (ids, rewards, diagnostics, features, timings) to the store."""
+    info = state.get("info") or {}
+    completion = state.get("completion") or []
+    row = {
+        **scores,
+        "rollout_id": state.get("trajectory_id"),
+        "model": state.get("model"),
+        "split": "train" if "train_order_index" in info else "eval",
+        "example_id": state.get("example_id"),
+        "source_index": info.get("source_index"),
+        "train_order_index": info.get("train_order_index"),
+        "theme": info.get("theme"),
+        "shape_budget": None if info.get("shape_budget") is None else str(info["shape_budget"]),
+        "reward": sum(weight * scores.get(func.__name__, 0.0) for func, weight in zip(REWARD_FUNCS, REWARD_WEIGHTS)),
+        "generation_ms": (state.get("timing") or {}).get("generation_ms"),
+        "scoring_ms": scoring_ms,
+        "completion": completion[-1].get("content") if completion else None,
+        "recorded_at": time.time(),
+    }
+    store.append(row)
+
+
+def load_environment(
+    score_cache_size: int = DEFAULT_CACHE_SIZE,
+    score_cache_path: str | None = None,
+    score_cache_max_entries: int = DEFAULT_DISK_CACHE_MAX_ENTRIES,
+    scoring_executor: str = "process",
+    scoring_workers: int | None = None,
+    scoring_max_concurrency: int | None = None,
+    scoring_timeout: float | None = 30.0,
+    scoring_timeout_score: float = 0.0,
+    scoring_timeout_capture_dir: str | None = None,
+    diagnostic_sample_rate: float = 1.0,
+    skip_diagnostics_under_pressure: bool = False,
+    stop_after_fence: bool = False,
+    per_example_max_tokens: bool = False,
+    token_budget_path: str | None = None,
+    token_budget_scale: float = 1.0,
+    prefix_group_size: int = 0,
+    prefix_batch_size: int = 32,
+    shard_index: int = 0,
+    num_shards: int = 1,
+    max_examples: int = -1,
+    test_size: float = 0.2,
+    seed: int = 42,
+    split_method: str = "shuffle",
+    dataset_path: str | None = None,
+    prepared_cache_dir: str | None = None,
+    dataset_num_proc: int | None = None,
+    difficulty_index_path: str | None = None,
+    difficulty_record: bool = True,
+    difficulty_keep_fraction: float = 1.0,
+    difficulty_easy_threshold: float = 0.8,
+    difficulty_hard_threshold: float = 0.2,
+    difficulty_min_rollouts: int = 16,
+    near_duplicate_threshold: float | None = None,
+    near_duplicate_cap: int = 1,
+    eval_stratify: bool = False,
+    eval_stratum_weights: dict[str, float] | None = None,
+    eval_examples: int = -1,
+    synthetic_examples: int = 0,
+    synthetic_seed: int = 0,
+    response_cache_path: str | None = None,
+    response_cache_replay: bool = False,
+    response_cache_max_entries: int = DEFAULT_RESPONSE_CACHE_MAX_ENTRIES,
+    response_cache_policy: str | None = None,
+    rollout_store_dir: str | None = None,
+    rollout_store_flush_rows: int = DEFAULT_FLUSH_ROWS,
+) -> vf.Environment:
     """
     Single-turn environment that asks for ASCII diagrams inside ```text fences.
+
+    Args:
+        score_cache_size: entries kept in the in-memory checker/layout LRU caches
+            (duplicate diagrams within a rollout group are scored once).
+        score_cache_path: optional SQLite file shared across processes and runs;
+            entries are keyed by checker version, so stale results are ignored.
+        score_cache_max_entries: size cap for the on-disk cache.
+        scoring_executor: where rubric scoring runs: "process" (worker processes),
+            "thread", or "none" (inline on the event loop, the old behaviour).
+        scoring_workers: executor size (defaults to min(8, cpus - 1)).
+        scoring_max_concurrency: cap on in-flight scoring jobs.
+        scoring_timeout: per-rollout scoring deadline in seconds (None disables).
+            With the "process" executor the stuck worker is killed and replaced.
+        scoring_timeout_score: value every reward function gets for a timed-out
+            rollout; the `scoring_timeout` metric is set to 1.0 for it.
+        scoring_timeout_capture_dir: directory where timed-out completions are
+            appended to `timeouts.jsonl` for later analysis.
+        diagnostic_sample_rate: fraction of rollouts (chosen by hashing the
+            rollout id) whose zero-weight diagnostic metrics are computed. The
+            rest report 0.0 with `diagnostics_sampled=0.0`; the rubric gets
+            sampled values scaled by the share that computed diagnostics, the
+            rollout store the raw ones (`scoring_pool.diagnostic_means`). Saves
+            little CPU, since the diagnostics reuse the rewards' cached stats.
+        skip_diagnostics_under_pressure: compute only the weighted rewards while
+            every scoring slot is busy.
+        stop_after_fence: stop generation once the ```text block closes instead
+            of spending tokens on trailing prose. vLLM endpoints with
+            non-thinking models only (see `fence_stop_sampling_args`).
+        per_example_max_tokens: cap each request's token limit at the example's
+            `info["max_tokens"]`, estimated from theme and shape_budget (a
+            configured `max_tokens` is lowered to it, never raised). Requires a
+            calibrated `token_budget_path`, since the built-in rates are rough
+            guesses; add a `token_budget_scale` for thinking models.
+        token_budget_path: JSON written by `TokenBudgetModel.calibrate(...).save()`
+            from observed diagram sizes; the built-in rates are used otherwise.
+        token_budget_scale: multiplier on every budget (e.g. 3-4 for thinking
+            models, whose reasoning shares the budget).
+        prefix_group_size: when > 1, sort train examples by (theme, prompt) inside
+            consecutive windows of this size so prompts sharing a prefix land in
+            the same batches; the order across windows is unchanged.
+        prefix_batch_size: examples per step (batch_size / rollouts_per_example),
+            used to log the shared-prefix token ratio per batch.
+        shard_index, num_shards: materialize only every `num_shards`-th train/eval
+            row starting at `shard_index`. Split and order are computed on the
+            full index first, so `source_index` and `train_order_index` keep their
+            global meaning on every shard.
+        max_examples: keep only the first N source rows (-1 for all).
+        test_size, seed: train/eval split parameters.
+        split_method: "shuffle" (seeded `train_test_split`, the original split)
+            or "hash", where each prompt's split and train position come from a
+            seeded hash of its text, so adding source rows never moves others.
+        dataset_path: local copy of the source train split (save_to_disk
+            directory, .arrow or .parquet), opened memory-mapped with no
+            network access; the rest of the pipeline is unchanged.
+        prepared_cache_dir: directory where the prepared train/eval splits are
+            saved, keyed by source, settings and preparation code; later starts
+            with the same key load them directly.
+        dataset_num_proc: processes for the row conversion `map`.
+        difficulty_index_path: SQLite file of per-`source_index` reward statistics.
+            With `difficulty_record`, every scored rollout is added to it.
+        difficulty_keep_fraction: fraction of saturated train examples (too easy
+            or too hard according to the index) kept before generation; 1.0
+            keeps everything, 0.0 drops all of them. The kept ones are chosen
+            by hashing `source_index`.
+        difficulty_easy_threshold, difficulty_hard_threshold: mean reward, as a
+            fraction of the maximum weighted reward, at/above which an example
+            is saturated easy, and at/below which it is saturated hard.
+        difficulty_min_rollouts: rollouts an example needs in the index before
+            it can be considered saturated.
+        near_duplicate_threshold: when set, cluster prompts whose character
+            shingle Jaccard similarity is at least this value (MinHash/LSH
+            candidates, verified exactly).
+        near_duplicate_cap: prompts kept per near-duplicate cluster (lowest
+            `source_index` first); 1 keeps one representative.
+        eval_stratify: order the eval split so that its first N rows (what a
+            `num_examples = N` val run uses) are a deterministic sample
+            stratified by theme and shape budget bucket.
+        eval_stratum_weights: relative sampling weight per stratum, keyed by
+            "theme/bucket" (e.g. "sequence/10-15") or by theme; missing strata
+            weigh 1.0 and 0 excludes a stratum.
+        eval_examples: keep only the first N eval rows (-1 for all).
+        synthetic_examples: when > 0, use this many prompts from
+            `data.generate_prompts` (offline and reproducible) instead of the
+            hub dataset or `dataset_path`.
+        synthetic_seed: seed for the generated prompts.
+        response_cache_path: SQLite file caching raw model responses by (model,
+            prompt messages, sampling args, sample index, `response_cache_policy`);
+            reruns with the same settings read them back instead of querying
+            the endpoint. Meant for evaluating fixed weights: the model name
+            does not identify a checkpoint, so training rollouts bypass the
+            cache unless `response_cache_policy` is set.
+        response_cache_replay: never query the endpoint; a request missing from
+            the cache fails its rollout with a `ModelError`.
+        response_cache_max_entries: size cap for the response cache (least
+            recently used responses are pruned).
+        response_cache_policy: version of the weights being sampled (e.g. a
+            checkpoint step or hash), added to every cache key. Set it when
+            the same model name serves changing weights, e.g. across training
+            steps or a resume.
+        rollout_store_dir: directory of Parquet parts that every scored
+            rollout (eval and training) is appended to, with its rewards,
+            diagnostics, `rollout_features`, timings and completion text;
+            read it back with `rollout_store.read_rollouts`.
+        rollout_store_flush_rows: rollouts buffered per written part.
     """
-    dataset = load_dataset("13point5/tldraw-vf-env", split="train")
-
-    # Keep a stable ID tied to original dataset row order.
-    dataset = dataset.map(lambda _row, idx: {"source_index": idx}, with_indices=True)
-
-    # convert prompt into an array with one user message object
-    dataset = dataset.map(lambda row: {"prompt": [{"role": "user", "content": row["prompt"]}]})
-
-    columns = dataset.column_names
-    dataset = dataset.map(lambda row: {"info": dict(row)})
-
-    columns_to_remove = [col for col in columns if col not in ["prompt", "info"]]
-    dataset = dataset.remove_columns(columns_to_remove)
-
-    split = dataset.train_test_split(test_size=0.2, seed=42, shuffle=True)
-    train_dataset = split["train"]
-    eval_dataset = split["test"]
-
-    # Track final train ordering so runs/resumes can be compared in the web app.
-    train_dataset = train_dataset.map(
-        lambda row, idx: {
-            "info": {
-                **dict(row["info"]),
-                "source_index": row["info"]["source_index"],
-                "train_order_index": idx,
-            }
-        },
-        with_indices=True,
+    import verifiers as vf
+
+    from ascii_align_env import AsciiAlignEnv
+
+    cache_args = (score_cache_size, score_cache_path, score_cache_max_entries)
+    configure_scoring_cache(*cache_args)
+
+    if not 0 <= shard_index < num_shards:
+        raise ValueError(f"shard_index must be in [0, {num_shards}), got {shard_index}")
+    if response_cache_replay and not response_cache_path:
+        raise ValueError("response_cache_replay requires response_cache_path")
+
+    if per_example_max_tokens and not token_budget_path:
+        raise ValueError("per_example_max_tokens requires a calibrated token_budget_path")
+
+    if token_budget_path:
+        budget_model = TokenBudgetModel.load(token_budget_path, scale=token_budget_scale)
+    else:
+        budget_model = TokenBudgetModel(scale=token_budget_scale)
+
+    difficulty_index = DifficultyIndex(difficulty_index_path) if difficulty_index_path else None
+    skip_train = None
+    if difficulty_index is not None and difficulty_keep_fraction < 1.0:
+        max_reward = sum(REWARD_WEIGHTS)
+        saturated = difficulty_index.saturated(
+            difficulty_easy_threshold * max_reward,
+            difficulty_hard_threshold * max_reward,
+            min_rollouts=difficulty_min_rollouts,
+        )
+        skip_train = skipped_examples(saturated, difficulty_keep_fraction, seed=seed)
+
+    train_dataset, eval_dataset = prepare_splits(
+        dataset_path=dataset_path,
+        budget_model=budget_model,
+        max_examples=max_examples,
+        test_size=test_size,
+        seed=seed,
+        split_method=split_method,
+        prefix_group_size=prefix_group_size,
+        prefix_batch_size=prefix_batch_size,
+        system_prompt=SYSTEM_PROMPT,
+        shard_index=shard_index,
+        num_shards=num_shards,
+        cache_dir=prepared_cache_dir,
+        num_proc=dataset_num_proc,
+        skip_train=skip_train,
+        near_duplicate_threshold=near_duplicate_threshold,
+        near_duplicate_cap=near_duplicate_cap,
+        eval_stratify=eval_stratify,
+        eval_stratum_weights=eval_stratum_weights,
+        eval_examples=eval_examples,
+        synthetic_examples=synthetic_examples,
+        synthetic_seed=synthetic_seed,
+    )
+
+    on_scores = None
+    if difficulty_index is not None and difficulty_record:
+        on_scores = functools.partial(record_difficulty, difficulty_index)
+        atexit.register(difficulty_index.flush)
+
+    score_fn = score_completion
+    on_rollout = None
+    if rollout_store_dir:
+        rollout_store = RolloutStore(rollout_store_dir, ROLLOUT_COLUMNS, flush_rows=rollout_store_flush_rows)
+        atexit.register(rollout_store.close)
+        score_fn = functools.partial(score_completion, features=True)
+        on_rollout = functools.partial(store_rollout, rollout_store)
+
+    # Reward funcs are CPU-bound; run them in a pool so scoring overlaps with
+    # generation requests instead of blocking the shared event loop.
+    scoring_pool = ScoringPool(
+        score_fn,
+        executor=scoring_executor,
+        max_workers=scoring_workers,
+        max_concurrency=scoring_max_concurrency,
+        initializer=configure_scoring_cache,
+        initargs=cache_args,
+        timeout=scoring_timeout,
+        timeout_scores={func.__name__: scoring_timeout_score for func in REWARD_FUNCS},
+        capture_dir=scoring_timeout_capture_dir,
+        diagnostic_names=list(DIAGNOSTIC_FIELDS),
+        diagnostic_sample_rate=diagnostic_sample_rate,
+        skip_diagnostics_under_pressure=skip_diagnostics_under_pressure,
+        on_scores=on_scores,
+        on_rollout=on_rollout,
+        cache_stats_fn=scoring_cache_stats,
     )
+    response_cache = None
+    if response_cache_path:
+        response_cache = ResponseCache(
+            response_cache_path,
+            max_entries=response_cache_max_entries,
+            replay=response_cache_replay,
+            policy_version=response_cache_policy,
+        )
 
     rubric = vf.Rubric(
-        funcs=[
-            format_reward,
-            alignment_reward,
-            layout_spread_reward,
-            rectangle_error_metric,
-            connector_error_metric,
-            arrow_error_metric,
-            misaligned_total_metric,
-        ],
-        weights=[1.0, 1.0, 1.0, 0.0, 0.0, 0.0, 0.0],
+        funcs=async_reward_funcs(
+            [func.__name__ for func in REWARD_FUNCS] + [SAMPLED_METRIC, TIMEOUT_METRIC, CACHE_HIT_METRIC],
+            scoring_pool,
+        ),
+        weights=list(REWARD_WEIGHTS) + [0.0, 0.0, 0.0],
     )
 
-    return vf.SingleTurnEnv(
+    return AsciiAlignEnv(
         dataset=train_dataset,
         eval_dataset=eval_dataset,
         system_prompt=SYSTEM_PROMPT,
         rubric=rubric,
+        sampling_args=fence_stop_sampling_args() if stop_after_fence else None,
+        per_example_max_tokens=per_example_max_tokens,
+        response_cache=response_cache,
     )
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from typing import List
+
+import checker_diff
+import golden
+import rescore
+
+
+def main(argv: List[str] | None = None) -> None:
+    """
+    Command line entry point, `python -m alignment_check <command>` (or
+    `python -m ascii_align_cli`), kept out of alignment_check.py so that
+    changes here do not change `checker_version()`:
+    - score: re-score archived rollouts with the current checker (`rescore.py`)
+    - diff: compare two checker versions over archived rollouts (`checker_diff.py`)
+    - golden: build or verify the golden regression corpus (`golden.py`)
+    """
+    parser = argparse.ArgumentParser(prog="python -m alignment_check")
+    commands = parser.add_subparsers(dest="command", required=True)
+    score = commands.add_parser("score", help="Re-score JSONL/Parquet rollout dumps on all cores")
+    rescore.add_arguments(score)
+    score.set_defaults(run=rescore.run)
+    diff = commands.add_parser("diff", help="Report the rollouts whose scores change between two checker versions")
+    checker_diff.add_arguments(diff)
+    diff.set_defaults(run=checker_diff.run)
+    corpus = commands.add_parser("golden", help="Verify the checker against the golden corpus, or rebuild it")
+    golden.add_arguments(corpus)
+    corpus.set_defaults(run=golden.run)
+
+    args = parser.parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
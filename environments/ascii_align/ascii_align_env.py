@@ -0,0 +1,91 @@
+import logging
+
+import verifiers as vf
+from openai.types import Completion
+from openai.types.chat import ChatCompletion
+
+from ascii_align import _restore_closing_fence, requests_fence_stop
+from response_cache import ResponseCache
+from token_budget import apply_token_budget
+
+logger = logging.getLogger("verifiers.ascii_align")
+
+
+class AsciiAlignEnv(vf.SingleTurnEnv):
+    """
+    `SingleTurnEnv` that:
+    - caps each request's token limit at the example's `info["max_tokens"]` budget
+    - reads responses through an optional `ResponseCache`; training rollouts
+      (examples with a `train_order_index`) only use it when the cache has a
+      `policy_version`, since the policy changes as it trains
+    - repairs responses cut at the closing diagram fence
+    """
+
+    def __init__(
+        self,
+        per_example_max_tokens: bool = False,
+        response_cache: ResponseCache | None = None,
+        **kwargs,
+    ):
+        self.per_example_max_tokens = per_example_max_tokens
+        self.response_cache = response_cache
+        self._warned_uncached_training = False
+        super().__init__(**kwargs)
+
+    def _cache_for(self, state) -> ResponseCache | None:
+        cache = self.response_cache
+        if cache is None or cache.policy_version is not None:
+            return cache
+        if "train_order_index" not in (state.get("info") or {}):
+            return cache
+        if cache.replay:
+            raise vf.ModelError("Response cache replay needs a policy version for training rollouts")
+        if not self._warned_uncached_training:
+            self._warned_uncached_training = True
+            logger.warning("Training rollouts bypass the response cache; set a policy version to cache them")
+        return None
+
+    async def get_model_response(
+        self,
+        state,
+        prompt,
+        client=None,
+        model=None,
+        oai_tools=None,
+        sampling_args=None,
+        message_type=None,
+    ):
+        budget = (state.get("info") or {}).get("max_tokens") if self.per_example_max_tokens else None
+        if budget:
+            sampling_args = apply_token_budget(sampling_args or state.get("sampling_args"), budget)
+
+        cache = self._cache_for(state)
+        cache_key = None
+        response = None
+        if cache is not None:
+            message_type = message_type or self.message_type
+            cache_key = cache.sample_key(
+                model or state["model"], prompt, sampling_args or state.get("sampling_args"), message_type
+            )
+            cached = cache.get(cache_key)
+            if cached is not None:
+                response_type = ChatCompletion if message_type == "chat" else Completion
+                response = response_type.model_validate(cached)
+            elif cache.replay:
+                raise vf.ModelError(f"Response cache miss in replay mode (key {cache_key})")
+
+        if response is None:
+            response = await super().get_model_response(
+                state,
+                prompt,
+                client=client,
+                model=model,
+                oai_tools=oai_tools,
+                sampling_args=sampling_args,
+                message_type=message_type,
+            )
+            if cache_key is not None:
+                cache.put(cache_key, response.model_dump(mode="json"))
+        if requests_fence_stop(sampling_args or state.get("sampling_args")):
+            _restore_closing_fence(response)
+        return response
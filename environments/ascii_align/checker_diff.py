@@ -0,0 +1,350 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+import types
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+import alignment_check
+from ascii_align import (
+    REWARD_FUNCS,
+    REWARD_WEIGHTS,
+    _alignment_ratio,
+    _extract_diagram,
+    _layout_box_centers,
+    _layout_spread_score,
+    _normalized_dimension,
+)
+from rescore import Record, input_files, iter_records
+from scoring_cache import DiskScoreCache, LRUCache, _fingerprint, canonicalize_diagram, layout_version
+
+logger = logging.getLogger(__name__)
+
+CHECKER_PATH = Path(__file__).resolve().with_name("alignment_check.py")
+DEFAULT_BATCH_SIZE = 4096
+DEFAULT_JOB_SIZE = 64
+STAT_FIELDS = ("correct_rectangles", "rectangle_errors", "connector_errors", "arrow_errors", "misaligned")
+# Per-row fields compared between the two versions, in report order.
+DIFF_FIELDS = (*STAT_FIELDS, "box_count", *(func.__name__ for func in REWARD_FUNCS), "reward")
+_METRIC_STATS = {
+    "rectangle_error_metric": "rectangle_errors",
+    "connector_error_metric": "connector_errors",
+    "arrow_error_metric": "arrow_errors",
+    "misaligned_total_metric": "misaligned",
+}
+# Box-finding helpers `_layout_box_centers` takes from a checker version.
+LAYOUT_HELPERS = ("_find_spans", "_validate_box")
+
+# Checker modules of the worker process, by version fingerprint.
+_CHECKERS: Dict[str, types.ModuleType] = {}
+
+
+def read_checker_source(spec: str | None) -> str:
+    """
+    Source of one checker version: a path to an alignment_check.py file,
+    `git:<rev>` for the committed file at that revision, or None for the
+    working copy.
+    """
+    if spec is None:
+        return CHECKER_PATH.read_text(encoding="utf-8")
+    if spec.startswith("git:"):
+        return subprocess.run(
+            ["git", "show", f"{spec[4:]}:./{CHECKER_PATH.name}"],
+            cwd=CHECKER_PATH.parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    return Path(spec).read_text(encoding="utf-8")
+
+
+def load_checker(source: str, version: str | None = None) -> types.ModuleType:
+    """Import checker `source` as a standalone module, independent of the `alignment_check` already imported."""
+    version = version or _fingerprint(source)
+    module = types.ModuleType(f"alignment_check_{version}")
+    module.__file__ = f"<alignment_check {version}>"
+    # Dataclasses look their module up in sys.modules while the class body runs.
+    sys.modules[module.__name__] = module
+    exec(compile(source, module.__file__, "exec"), module.__dict__)
+    return module
+
+
+def layout_helpers(checker: types.ModuleType) -> Tuple[Any, ...]:
+    """
+    The checker's `LAYOUT_HELPERS`, or the working copy's when it lacks any
+    of them (its layout centers then cannot differ from the working copy's).
+    """
+    helpers = tuple(getattr(checker, name, None) for name in LAYOUT_HELPERS)
+    if all(callable(helper) for helper in helpers):
+        return helpers
+    return tuple(getattr(alignment_check, name) for name in LAYOUT_HELPERS)
+
+
+def missing_layout_helpers(source: str) -> List[str]:
+    """`LAYOUT_HELPERS` that checker `source` does not define at module level."""
+    return [name for name in LAYOUT_HELPERS if not re.search(rf"^def {name}\(", source, re.M)]
+
+
+def checker_outputs(checker: types.ModuleType, lines: Tuple[str, ...]) -> Dict[str, Any]:
+    """
+    Everything the rewards need from one checker on a canonical diagram:
+    the `detect_misaligned` counts and the layout box centers, or
+    {"disallowed": True} when the checker rejects its glyphs outright.
+    """
+    text = "\n".join(lines)
+    if checker.has_disallowed_box_drawing_chars(text):
+        return {"disallowed": True}
+    width = max((len(line) for line in lines), default=0)
+    grid = [list(line.ljust(width)) for line in lines]
+    stats = checker.detect_misaligned(text)
+    centers = _layout_box_centers(grid, *layout_helpers(checker))
+    return {"stats": {field: stats[field] for field in STAT_FIELDS}, "centers": centers}
+
+
+def _init_worker(sources: Dict[str, str]) -> None:
+    for version, source in sources.items():
+        _CHECKERS[version] = load_checker(source, version)
+
+
+def _check_job(job: List[Tuple[str, Tuple[str, ...], str]]) -> List[Tuple[str, str, Dict[str, Any]]]:
+    return [(key, version, checker_outputs(_CHECKERS[version], lines)) for key, lines, version in job]
+
+
+def row_fields(outputs: Dict[str, Any], offset: int, width: int, info: Dict[str, Any] | None) -> Dict[str, Any]:
+    """The rubric values of one rollout, as `score_completion` would compute them from `outputs`."""
+    stats = outputs.get("stats")
+    centers = [center + offset for center in outputs.get("centers", [])]
+    scores: Dict[str, Any] = {
+        "format_reward": 1.0,
+        "alignment_reward": _alignment_ratio(stats),
+        "layout_spread_reward": _layout_spread_score(centers, width, info) if stats is not None else 0.0,
+        **{name: _normalized_dimension(stats, field) for name, field in _METRIC_STATS.items()},
+    }
+    fields: Dict[str, Any] = {field: stats[field] if stats else None for field in STAT_FIELDS}
+    fields["box_count"] = len(centers) if stats is not None else None
+    fields.update(scores)
+    fields["reward"] = sum(weight * scores[func.__name__] for func, weight in zip(REWARD_FUNCS, REWARD_WEIGHTS))
+    return fields
+
+
+def field_deltas(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, List[Any]]:
+    """{field: [old, new, new - old]} for every field that differs; the delta is None if either side is."""
+    changed = {}
+    for field in DIFF_FIELDS:
+        a, b = old[field], new[field]
+        if a != b:
+            changed[field] = [a, b, None if a is None or b is None else b - a]
+    return changed
+
+
+class CheckerDiff:
+    """
+    Compare two checker versions over a stream of archived rollouts.
+
+    Diagrams are deduplicated by their canonical grid hash (the key the
+    scoring caches use), so each distinct diagram is checked once per
+    version: first against an in-memory LRU, then against the optional
+    `DiskScoreCache` at `cache_path` (keyed by the version's source
+    fingerprint plus `layout_version`, so a rerun, or a later diff against
+    the same baseline, only checks new diagrams), and only then on the
+    process pool.
+
+    Records are handled `batch_size` at a time: the batch's missing
+    (diagram, version) pairs are checked in jobs of `job_size`, then the
+    batch's rows are compared. Rows without a diagram score the same under
+    both versions and are only counted.
+    """
+
+    def __init__(
+        self,
+        baseline_source: str,
+        candidate_source: str,
+        workers: int | None = None,
+        cache_path: str | os.PathLike | None = None,
+        memory_entries: int = 100_000,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        job_size: int = DEFAULT_JOB_SIZE,
+    ) -> None:
+        # Cached layout centers also depend on `_layout_box_centers` and the working copy's helpers.
+        layout = layout_version(_layout_box_centers)
+        self.baseline = _fingerprint(baseline_source, layout)
+        self.candidate = _fingerprint(candidate_source, layout)
+        for label, source in (("baseline", baseline_source), ("candidate", candidate_source)):
+            missing = missing_layout_helpers(source)
+            if missing:
+                logger.warning(
+                    f"The {label} checker does not define {', '.join(missing)}; "
+                    "its layout centers are computed with the working copy's helpers"
+                )
+        self.sources = {self.baseline: baseline_source, self.candidate: candidate_source}
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.batch_size = max(1, batch_size)
+        self.job_size = max(1, job_size)
+        # Room for every (diagram, version) pair of a batch, so none is evicted before it is compared.
+        self._memory = LRUCache(max(memory_entries, 2 * self.batch_size))
+        self._disk = DiskScoreCache(cache_path) if cache_path else None
+        # rows read; rows with a diagram; (diagram, version) pairs checked / served from a cache; rows that differ
+        self.counts = {"rows": 0, "diagrams": 0, "checked": 0, "cached": 0, "changed": 0}
+        self._field_totals: Dict[str, Dict[str, float]] = {}
+
+    def _lookup(self, key: str, version: str) -> Dict[str, Any] | None:
+        # A miss is remembered as None until `_store` fills it in the same batch.
+        return self._memory.get_or_compute(
+            f"{version}:{key}",
+            lambda: self._disk.get("checker_diff", key, version) if self._disk is not None else None,
+        )
+
+    def _store(self, key: str, version: str, outputs: Dict[str, Any]) -> None:
+        self._memory.put(f"{version}:{key}", outputs)
+        if self._disk is not None:
+            self._disk.put("checker_diff", key, version, outputs)
+
+    def _fill(self, pending: Dict[Tuple[str, str], Tuple[str, ...]], executor: ProcessPoolExecutor | None) -> None:
+        items = [(key, lines, version) for (key, version), lines in pending.items()]
+        jobs = [items[i : i + self.job_size] for i in range(0, len(items), self.job_size)]
+        if executor is None:
+            results = map(_check_job, jobs)
+        else:
+            window: deque[Future] = deque()
+
+            def bounded() -> Iterator[List[Tuple[str, str, Dict[str, Any]]]]:
+                for job in jobs:
+                    window.append(executor.submit(_check_job, job))
+                    if len(window) >= 4 * self.workers:
+                        yield window.popleft().result()
+                while window:
+                    yield window.popleft().result()
+
+            results = bounded()
+        for result in results:
+            for key, version, outputs in result:
+                self._store(key, version, outputs)
+        self.counts["checked"] += len(items)
+
+    def _diff_batch(self, batch: List[Record], executor: ProcessPoolExecutor | None) -> Iterator[Dict[str, Any]]:
+        parsed = []
+        pending: Dict[Tuple[str, str], Tuple[str, ...]] = {}
+        for record in batch:
+            completion = record[2]
+            diagram = _extract_diagram(completion) if isinstance(completion, list) and completion else None
+            if diagram is None:
+                continue
+            canonical = canonicalize_diagram(diagram)
+            parsed.append((record, canonical))
+            for version in (self.baseline, self.candidate):
+                if (canonical.key, version) in pending:
+                    continue
+                if self._lookup(canonical.key, version) is None:
+                    pending[(canonical.key, version)] = canonical.lines
+                else:
+                    self.counts["cached"] += 1
+        if pending:
+            self._fill(pending, executor)
+
+        self.counts["diagrams"] += len(parsed)
+        for (source, index, _, info, passthrough), canonical in parsed:
+            old, new = (
+                row_fields(self._lookup(canonical.key, version), canonical.offset, canonical.width, info)
+                for version in (self.baseline, self.candidate)
+            )
+            changed = field_deltas(old, new)
+            if not changed:
+                continue
+            self.counts["changed"] += 1
+            for field, (_, _, delta) in changed.items():
+                totals = self._field_totals.setdefault(field, {"rows": 0, "delta_sum": 0.0})
+                totals["rows"] += 1
+                if delta is not None:
+                    totals["delta_sum"] += delta
+            yield {"source": source, "index": index, **passthrough, "diagram": canonical.key, "changed": changed}
+
+    def run(self, records: Iterable[Record]) -> Iterator[Dict[str, Any]]:
+        """Yield one compact row per rollout whose fields differ between the versions, in input order."""
+        executor = None
+        if self.workers > 0:
+            executor = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.sources,))
+        else:
+            _init_worker(self.sources)
+        try:
+            batch: List[Record] = []
+            for record in records:
+                self.counts["rows"] += 1
+                batch.append(record)
+                if len(batch) == self.batch_size:
+                    yield from self._diff_batch(batch, executor)
+                    batch = []
+            if batch:
+                yield from self._diff_batch(batch, executor)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    def summary(self) -> Dict[str, Any]:
+        fields = {
+            field: {"rows": int(t["rows"]), "mean_delta": t["delta_sum"] / t["rows"]}
+            for field, t in sorted(self._field_totals.items(), key=lambda item: DIFF_FIELDS.index(item[0]))
+        }
+        return {
+            "baseline": self.baseline,
+            "candidate": self.candidate,
+            **self.counts,
+            "fields": fields,
+        }
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("inputs", nargs="+", help=".jsonl/.parquet rollout dumps or directories of them")
+    parser.add_argument("-o", "--output", required=True, help="JSONL report of the rollouts whose scores change")
+    parser.add_argument(
+        "--baseline", default="git:HEAD", help="alignment_check.py path or git:<rev> (default: git:HEAD)"
+    )
+    parser.add_argument("--candidate", default=None, help="alignment_check.py path or git:<rev> (default: working copy)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Checker processes (default: all cores)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rollouts deduplicated together")
+    parser.add_argument("--job-size", type=int, default=DEFAULT_JOB_SIZE, help="Diagrams per worker job")
+    parser.add_argument("--cache-path", default=None, help="SQLite file keeping checker outputs across runs")
+
+
+def run(args: argparse.Namespace) -> None:
+    """Write the changed rows to `args.output` and print a JSON summary."""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    baseline, candidate = read_checker_source(args.baseline), read_checker_source(args.candidate)
+    if baseline == candidate:
+        logger.warning("Baseline and candidate checkers are identical; no row can change")
+
+    diff = CheckerDiff(baseline, candidate, args.workers, args.cache_path, batch_size=args.batch_size, job_size=args.job_size)
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    try:
+        with open(output, "w", encoding="utf-8") as f:
+            for row in diff.run(iter_records(input_files(args.inputs))):
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    finally:
+        diff.close()
+    summary = diff.summary()
+    summary["elapsed_s"] = round(time.perf_counter() - start, 2)
+    print(json.dumps(summary, indent=2))
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare two alignment checker versions over archived rollouts.")
+    add_arguments(parser)
+    run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,3 +1,6 @@
+import random
+
+
 DEFAULT_THEMES = [
     {
         "name": "flowcharts",
@@ -67,3 +70,168 @@ DEFAULT_THEMES = [
 
 def get_default_prompts() -> list[str]:
     return [example for theme in DEFAULT_THEMES for example in theme["examples"]]
+
+
+# Vocabulary for `generate_prompts`. Each theme has templates whose slots are
+# filled from these pools; `{n}` is the number of boxes the prompt asks for.
+_PROCESSES = [
+    "password reset", "checkout", "user onboarding", "refund request", "bug triage", "expense approval",
+    "content moderation", "account deletion", "invoice payment", "code review", "data backup", "support escalation",
+]
+_CONDITIONS = [
+    "an expired token", "a failed payment", "missing permissions", "a duplicate request", "a timeout",
+    "invalid input", "a flagged account", "an out-of-stock item",
+]
+_COMPONENTS = [
+    "client", "API gateway", "auth service", "Redis cache", "Postgres database", "message queue", "worker pool",
+    "object storage", "CDN", "search index", "metrics sink", "feature store", "model server", "scheduler",
+    "load balancer", "billing service",
+]
+_SYSTEMS = ["web app", "ML inference", "CI/CD", "data pipeline", "chat backend", "video streaming", "e-commerce"]
+_INTERACTIONS = [
+    "login", "file upload", "data export", "payment capture", "webhook delivery", "password change",
+    "search query", "report generation",
+]
+_ENTITIES = {
+    "order": ["created", "paid", "packed", "shipped", "delivered", "returned", "canceled"],
+    "subscription": ["trial", "active", "past_due", "paused", "canceled", "resumed"],
+    "job": ["queued", "running", "succeeded", "failed", "retrying", "abandoned"],
+    "pull request": ["draft", "open", "in_review", "approved", "merged", "closed"],
+    "support ticket": ["new", "assigned", "waiting", "escalated", "resolved", "reopened"],
+}
+_LANES = ["PM", "Engineer", "QA", "Ops", "Marketing", "Designer", "Support", "Legal", "Finance"]
+_SUBJECTS = ["a product launch", "a data migration", "learning Rust", "a hiring plan", "a conference talk", "an SDK release"]
+_VERBS = ["Draw", "Create", "Make", "Sketch"]
+
+_TEMPLATES = {
+    "flowcharts": [
+        "{verb} a flowchart for a {process} flow with {n} steps and a decision for {condition}.",
+        "{verb} a {n}-step flowchart for {process}, with a retry loop when there is {condition}.",
+    ],
+    "architecture": [
+        "{verb} a {system} architecture with {components}.",
+        "{verb} an architecture diagram where data flows {chain}.",
+    ],
+    "sequence": [
+        "{verb} a sequence diagram for {interaction} between {components}.",
+        "{verb} a sequence diagram for {interaction}: {chain}, then back to the {first}.",
+    ],
+    "state_machines": [
+        "{verb} a state machine for a {entity}: {states}.",
+        "{verb} a {entity} lifecycle state machine with states {states} and the events between them.",
+    ],
+    "swimlanes": [
+        "{verb} a swimlane diagram for {process} across {lanes}.",
+        "{verb} a swimlane diagram with {n} lanes for a {process} workflow.",
+    ],
+    "frameworks": [
+        "{verb} a timeline with {n} milestones for {subject}.",
+        "{verb} a mind map for {subject} with {n} branches.",
+        "{verb} a 2x2 matrix for {subject} with quadrant labels and {n} example notes.",
+    ],
+    "syntax_drills": [
+        "{verb} {n} rectangles in a neat grid labeled A1 onward.",
+        "{verb} {n} boxes left-to-right with consistent spacing and arrows between them.",
+        "{verb} {n} boxes stacked top-to-bottom, each connected to the next.",
+    ],
+}
+
+# (min, max) boxes requested per theme.
+_BOX_RANGES = {
+    "flowcharts": (4, 12),
+    "architecture": (3, 9),
+    "sequence": (3, 6),
+    "state_machines": (3, 7),
+    "swimlanes": (2, 5),
+    "frameworks": (4, 10),
+    "syntax_drills": (3, 16),
+}
+
+
+def _generate_prompt(rng: random.Random, theme: str) -> dict[str, object]:
+    low, high = _BOX_RANGES[theme]
+    n = rng.randint(low, high)
+    template = rng.choice(_TEMPLATES[theme])
+    components = rng.sample(_COMPONENTS, min(n, len(_COMPONENTS)))
+    entity = rng.choice(sorted(_ENTITIES))
+    states = _ENTITIES[entity][: max(3, min(n, len(_ENTITIES[entity])))]
+    lanes = rng.sample(_LANES, min(n, len(_LANES)))
+    shape_budget = n
+    if theme == "state_machines":
+        shape_budget = len(states)
+    elif theme == "swimlanes":
+        # Each lane holds a couple of steps on top of its own header box.
+        shape_budget = 3 * n
+    prompt = template.format(
+        verb=rng.choice(_VERBS),
+        n=n,
+        process=rng.choice(_PROCESSES),
+        condition=rng.choice(_CONDITIONS),
+        system=rng.choice(_SYSTEMS),
+        components=", ".join(components[:-1]) + f" and {components[-1]}",
+        chain=" -> ".join(components),
+        first=components[0],
+        interaction=rng.choice(_INTERACTIONS),
+        entity=entity,
+        states=", ".join(states),
+        lanes=", ".join(lanes),
+        subject=rng.choice(_SUBJECTS),
+    )
+    return {"prompt": prompt, "theme": theme, "shape_budget": shape_budget}
+
+
+def generate_prompts(count: int, seed: int = 0, themes: list[str] | None = None) -> list[dict[str, object]]:
+    """
+    `count` procedurally generated rows with the hub dataset's columns (prompt, theme, shape_budget).
+
+    Row i only depends on (seed, i), so a larger `count` extends a smaller
+    set instead of reshuffling it. Themes cycle in `DEFAULT_THEMES` order.
+    """
+    names = themes or [theme["name"] for theme in DEFAULT_THEMES]
+    unknown = sorted(set(names) - set(_TEMPLATES))
+    if unknown:
+        raise ValueError(f"Unknown themes: {unknown}")
+    return [_generate_prompt(random.Random(f"{seed}:{i}"), names[i % len(names)]) for i in range(count)]
+
+
+def generate_diagram(
+    box_count: int,
+    seed: int | str = 0,
+    columns: int = 3,
+    flaw_rate: float = 0.0,
+) -> str:
+    """
+    A synthetic answer diagram: `box_count` labeled boxes, `columns` per row.
+
+    Boxes in a row are joined by `──▶` arrows and each row hangs off the
+    first box of the previous one. Every box is drawn correctly except that,
+    with probability `flaw_rate` each, a box's right wall is pushed one cell
+    out of line, which the checker reports as a broken rectangle.
+    """
+    rng = random.Random(f"diagram:{seed}")
+    box_count = max(1, int(box_count))
+    columns = max(1, int(columns))
+    labels = [f"Step {i + 1}" for i in range(box_count)]
+    width = max(len(label) for label in labels) + 2
+    center = 1 + width // 2
+
+    lines: list[str] = []
+    for start in range(0, box_count, columns):
+        row = labels[start : start + columns]
+        flawed = [rng.random() < flaw_rate for _ in row]
+        last_row = start + columns >= box_count
+        if start:
+            lines.append(" " * center + "│")
+        top, middle, bottom = [], [], []
+        for i, label in enumerate(row):
+            edge = "─" * width
+            if i == 0 and start:
+                edge = edge[: center - 1] + "┴" + edge[center:]
+            top.append("┌" + edge + "┐")
+            middle.append("│" + f" {label}".ljust(width + flawed[i]) + "│")
+            edge = "─" * width
+            if i == 0 and not last_row:
+                edge = edge[: center - 1] + "┬" + edge[center:]
+            bottom.append("└" + edge + "┘")
+        lines += ["   ".join(top), "──▶".join(middle), "   ".join(bottom)]
+    return "\n".join(line.rstrip() for line in lines)
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import hashlib
+import re
+import struct
+from typing import Dict, List, Sequence, Set, Tuple
+
+DEFAULT_NUM_PERM = 64
+DEFAULT_SHINGLE_SIZE = 5
+
+# One salt per 16 hash values (blake2b salts are 16 bytes).
+_SALTS = [i.to_bytes(16, "little") for i in range(64)]
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def shingles(text: str, size: int = DEFAULT_SHINGLE_SIZE) -> Set[str]:
+    """Character shingles of the lowercased, whitespace-collapsed text."""
+    normalized = _WHITESPACE_RE.sub(" ", text.lower()).strip()
+    if len(normalized) <= size:
+        return {normalized}
+    return {normalized[i : i + size] for i in range(len(normalized) - size + 1)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def minhash_signature(shingle_set: Set[str], num_perm: int = DEFAULT_NUM_PERM) -> Tuple[int, ...]:
+    """
+    `num_perm` 32-bit MinHash values.
+
+    Each shingle is hashed once per 16 values (a salted 64-byte blake2b
+    digest split into 32-bit words), and the signature is the elementwise
+    minimum, which keeps the per-shingle work in C.
+    """
+    rounds = -(-num_perm // 16)
+    layout = struct.Struct(f"<{16 * rounds}I")
+    hashes = [
+        layout.unpack(
+            b"".join(
+                hashlib.blake2b(shingle.encode("utf-8"), digest_size=64, salt=salt).digest()
+                for salt in _SALTS[:rounds]
+            )
+        )
+        for shingle in shingle_set
+    ]
+    return tuple(map(min, zip(*hashes)))[:num_perm]
+
+
+def lsh_bands(num_perm: int, threshold: float, recall: float = 0.95) -> Tuple[int, int]:
+    """
+    (bands, rows) for banded LSH over `num_perm` hashes.
+
+    Picks the most selective banding that still makes pairs at `threshold`
+    Jaccard similarity collide in some band with probability >= `recall`;
+    candidates are verified exactly afterwards, so only recall matters.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if 1.0 - (1.0 - threshold**rows) ** bands >= recall:
+            best = (bands, rows)
+    return best
+
+
+class _UnionFind:
+    def __init__(self, size: int) -> None:
+        self.parent = list(range(size))
+
+    def find(self, x: int) -> int:
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, x: int, y: int) -> None:
+        rx, ry = self.find(x), self.find(y)
+        if rx != ry:
+            # The smaller index becomes the root, so it is the cluster's representative.
+            self.parent[max(rx, ry)] = min(rx, ry)
+
+
+def near_duplicate_clusters(
+    texts: Sequence[str],
+    threshold: float,
+    num_perm: int = DEFAULT_NUM_PERM,
+    shingle_size: int = DEFAULT_SHINGLE_SIZE,
+) -> List[int]:
+    """
+    Cluster id (the smallest member index) for every text.
+
+    Texts are linked when the Jaccard similarity of their character shingles
+    is >= `threshold`; MinHash/LSH only proposes candidate pairs, each of
+    which is checked exactly, and clusters are the transitive closure.
+    """
+    shingle_sets = [shingles(text, shingle_size) for text in texts]
+    bands, rows = lsh_bands(num_perm, threshold)
+    clusters = _UnionFind(len(texts))
+
+    buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+    for index, shingle_set in enumerate(shingle_sets):
+        signature = minhash_signature(shingle_set, num_perm)
+        for band in range(bands):
+            key = (band, signature[band * rows : (band + 1) * rows])
+            members = buckets.setdefault(key, [])
+            for other in members:
+                # Pairs already in one cluster need no check; every other
+                # candidate pair is checked, so no link of a chain is missed.
+                if clusters.find(other) != clusters.find(index) and (
+                    jaccard(shingle_set, shingle_sets[other]) >= threshold
+                ):
+                    clusters.union(other, index)
+            members.append(index)
+
+    return [clusters.find(index) for index in range(len(texts))]
+
+
+def capped_members(cluster_ids: Sequence[int], cap: int = 1) -> Set[int]:
+    """Indices kept when each cluster is capped at its `cap` lowest-index members."""
+    kept: Set[int] = set()
+    counts: Dict[int, int] = {}
+    for index, cluster in enumerate(cluster_ids):
+        if counts.get(cluster, 0) < cap:
+            counts[cluster] = counts.get(cluster, 0) + 1
+            kept.add(index)
+    return kept
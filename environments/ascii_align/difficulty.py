@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Set, Tuple
+
+# Rollouts buffered in memory before they are written to the index.
+_FLUSH_EVERY = 256
+
+
+class DifficultyIndex:
+    """
+    Per-`source_index` reward statistics persisted in SQLite.
+
+    Rewards are the rubric's weighted reward, the same value prime-rl's
+    online difficulty filter compares against its easy/hard thresholds.
+    Several env processes can record into the same file (WAL mode); each
+    buffers `_FLUSH_EVERY` rollouts between writes.
+    """
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        self.path = str(path)
+        self._pending: Dict[int, List[float]] = {}
+        self._pending_count = 0
+        self._conn: sqlite3.Connection | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross fork(); reopen lazily in each process.
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS difficulty ("
+                " source_index INTEGER PRIMARY KEY,"
+                " rollouts INTEGER NOT NULL,"
+                " reward_sum REAL NOT NULL)"
+            )
+            self._conn = conn
+            self._pid = os.getpid()
+            self._pending.clear()
+            self._pending_count = 0
+        return self._conn
+
+    def record(self, source_index: int, reward: float) -> None:
+        with self._lock:
+            self._connection()
+            self._pending.setdefault(int(source_index), []).append(float(reward))
+            self._pending_count += 1
+            if self._pending_count >= _FLUSH_EVERY:
+                self._flush()
+
+    def record_results(self, path: str | os.PathLike) -> int:
+        """Add every rollout of a verifiers `results.jsonl`; returns how many were recorded."""
+        recorded = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                source_index = (row.get("info") or {}).get("source_index")
+                if source_index is None or row.get("reward") is None:
+                    continue
+                self.record(source_index, row["reward"])
+                recorded += 1
+        self.flush()
+        return recorded
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        conn = self._connection()
+        conn.executemany(
+            "INSERT INTO difficulty (source_index, rollouts, reward_sum) VALUES (?, ?, ?)"
+            " ON CONFLICT (source_index) DO UPDATE SET"
+            " rollouts = rollouts + excluded.rollouts, reward_sum = reward_sum + excluded.reward_sum",
+            [(index, len(rewards), sum(rewards)) for index, rewards in self._pending.items()],
+        )
+        self._pending.clear()
+        self._pending_count = 0
+
+    def stats(self) -> Dict[int, Tuple[int, float]]:
+        """`source_index -> (rollouts, mean reward)` for everything flushed so far."""
+        with self._lock:
+            rows = self._connection().execute("SELECT source_index, rollouts, reward_sum FROM difficulty").fetchall()
+        return {index: (rollouts, reward_sum / rollouts) for index, rollouts, reward_sum in rows if rollouts > 0}
+
+    def saturated(self, easy_threshold: float, hard_threshold: float, min_rollouts: int = 16) -> Set[int]:
+        """Examples whose mean reward is at/above `easy_threshold` or at/below `hard_threshold`."""
+        return {
+            index
+            for index, (rollouts, mean) in self.stats().items()
+            if rollouts >= min_rollouts and (mean >= easy_threshold or mean <= hard_threshold)
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._flush()
+                self._conn.close()
+            self._conn = None
+
+
+def skipped_examples(saturated: Iterable[int], keep_fraction: float, seed: int = 0) -> Set[int]:
+    """
+    Saturated examples to drop before generation.
+
+    A deterministic `keep_fraction` of them (chosen by hashing the
+    `source_index`) is still trained on, so a regression on examples the
+    model used to solve, or a late breakthrough on hard ones, shows up in the
+    index again.
+    """
+
+    def kept(index: int) -> bool:
+        digest = hashlib.blake2b(f"{seed}:{index}".encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big") / 2.0**64 < keep_fraction
+
+    return {index for index in saturated if not kept(index)}
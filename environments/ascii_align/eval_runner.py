@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import runpy
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Mapping
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENDPOINTS_PATH = Path(__file__).resolve().parents[2] / "configs" / "endpoints.py"
+# Statuses that mean "send less", besides a reply slower than the latency target.
+OVERLOAD_STATUSES = {429, 503}
+
+
+def load_endpoints(path: str | Path = DEFAULT_ENDPOINTS_PATH) -> Dict[str, Dict[str, str]]:
+    """The `ENDPOINTS` registry ({name: {"model", "url", "key"}}) from an endpoints.py file."""
+    return runpy.run_path(str(path))["ENDPOINTS"]
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limit on one endpoint's in-flight requests.
+
+    Every successful reply raises the limit by 1/limit (about +1 per round
+    trip of a full window); a 429/503, or a reply slower than
+    `target_latency` seconds, multiplies it by `backoff`. Only replies to
+    requests sent after the previous cut can cut again, so one burst of
+    rejections halves the limit once rather than once per request.
+    """
+
+    def __init__(
+        self,
+        initial: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 256,
+        target_latency: float | None = None,
+        backoff: float = 0.5,
+    ) -> None:
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.overloaded = 0
+        self._last_cut = float("-inf")
+        self._condition: asyncio.Condition | None = None
+
+    def _cond(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self) -> float:
+        """Wait for a free slot; returns the start time to pass to `release`."""
+        async with self._cond():
+            await self._cond().wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return time.monotonic()
+
+    async def release(self, started: float, status: int | None) -> None:
+        """Free the slot and adapt the limit; `status` is None when the request failed without a reply."""
+        now = time.monotonic()
+        self.requests += 1
+        slow = self.target_latency is not None and now - started > self.target_latency
+        if status in OVERLOAD_STATUSES or (slow and status is not None):
+            if status in OVERLOAD_STATUSES:
+                self.overloaded += 1
+            if started >= self._last_cut:
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                self._last_cut = now
+        elif status is not None and status < 400:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+        async with self._cond():
+            self.in_flight -= 1
+            self._cond().notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "peak_in_flight": self.peak_in_flight,
+            "requests": self.requests,
+            "overloaded": self.overloaded,
+        }
+
+
+class LimitedTransport:
+    """
+    httpx transport that passes requests to a shared `inner` transport
+    (one connection pool for every endpoint) under an `AdaptiveLimiter`.
+
+    Closing it leaves `inner` open; whoever created the pool closes it.
+    """
+
+    def __init__(self, inner: Any, limiter: AdaptiveLimiter) -> None:
+        self.inner = inner
+        self.limiter = limiter
+
+    async def handle_async_request(self, request: Any) -> Any:
+        started = await self.limiter.acquire()
+        status = None
+        try:
+            response = await self.inner.handle_async_request(request)
+            status = response.status_code
+            return response
+        finally:
+            await self.limiter.release(started, status)
+
+    async def aclose(self) -> None:
+        pass
+
+    async def __aenter__(self) -> "LimitedTransport":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.aclose()
+
+
+async def run_sweep(
+    env: Any,
+    endpoints: Mapping[str, Mapping[str, str]],
+    num_examples: int = -1,
+    rollouts_per_example: int = 1,
+    sampling_args: Dict[str, Any] | None = None,
+    initial_concurrency: int = 8,
+    max_concurrency: int = 256,
+    target_latency: float | None = None,
+    max_connections: int = 1024,
+    max_retries: int = 8,
+    timeout: float = 600.0,
+    output_dir: str | Path | None = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Evaluate `env` on every endpoint at once and return a summary per endpoint name.
+
+    All endpoints share one httpx connection pool, and `env` (with its
+    scoring pool) is shared too, so scoring workers stay warm across models.
+    Each endpoint gets its own `AdaptiveLimiter`; verifiers' own concurrency
+    cap is lifted so the limiter alone paces requests. The OpenAI client's
+    retries (with backoff) resend rate-limited requests, and each attempt
+    counts against the limiter. An endpoint that fails is reported with its
+    error and does not stop the others. With `output_dir`, each endpoint's
+    rollouts are saved under `output_dir/<name>`.
+    """
+    import httpx
+    from openai import AsyncOpenAI
+
+    pool = httpx.AsyncHTTPTransport(
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    )
+
+    async def evaluate(name: str, endpoint: Mapping[str, str]) -> Dict[str, Any]:
+        limiter = AdaptiveLimiter(initial_concurrency, max_limit=max_concurrency, target_latency=target_latency)
+        http_client = httpx.AsyncClient(
+            transport=LimitedTransport(pool, limiter), timeout=httpx.Timeout(timeout, connect=30.0)
+        )
+        client = AsyncOpenAI(
+            base_url=endpoint["url"],
+            api_key=os.getenv(endpoint["key"]) or "EMPTY",
+            max_retries=max_retries,
+            http_client=http_client,
+        )
+        start = time.perf_counter()
+        summary: Dict[str, Any] = {"model": endpoint["model"]}
+        try:
+            outputs = await env.evaluate(
+                client,
+                endpoint["model"],
+                sampling_args=sampling_args,
+                num_examples=num_examples,
+                rollouts_per_example=rollouts_per_example,
+                max_concurrent=-1,
+                results_path=Path(output_dir) / name if output_dir else None,
+                save_results=output_dir is not None,
+                use_tqdm=False,
+            )
+            metadata = outputs["metadata"]
+            summary.update(
+                rollouts=len(outputs["reward"]),
+                avg_reward=metadata["avg_reward"],
+                avg_metrics=metadata["avg_metrics"],
+            )
+        except Exception as exc:
+            logger.exception("Evaluation of %s failed", name)
+            summary["error"] = repr(exc)
+        finally:
+            await http_client.aclose()
+        summary["elapsed_s"] = round(time.perf_counter() - start, 2)
+        summary.update(limiter.stats())
+        logger.info("%s: %s", name, {k: v for k, v in summary.items() if k != "avg_metrics"})
+        return summary
+
+    try:
+        summaries = await asyncio.gather(*(evaluate(name, endpoint) for name, endpoint in endpoints.items()))
+    finally:
+        await pool.aclose()
+    return dict(zip(endpoints, summaries))
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Evaluate ascii-align on many ENDPOINTS entries concurrently.")
+    parser.add_argument("endpoints", nargs="*", help="ENDPOINTS names to evaluate")
+    parser.add_argument("--all", action="store_true", help="Evaluate every ENDPOINTS entry")
+    parser.add_argument("-e", "--endpoints-path", default=str(DEFAULT_ENDPOINTS_PATH))
+    parser.add_argument("-n", "--num-examples", type=int, default=-1)
+    parser.add_argument("-r", "--rollouts-per-example", type=int, default=1)
+    parser.add_argument("-t", "--max-tokens", type=int, default=None)
+    parser.add_argument("-T", "--temperature", type=float, default=None)
+    parser.add_argument("-a", "--env-args", type=json.loads, default={}, help="JSON load_environment() kwargs")
+    parser.add_argument("--initial-concurrency", type=int, default=8, help="Starting in-flight limit per endpoint")
+    parser.add_argument("--max-concurrency", type=int, default=256, help="Ceiling of each endpoint's limit")
+    parser.add_argument("--target-latency", type=float, default=None, help="Seconds; slower replies shrink the limit")
+    parser.add_argument("--max-connections", type=int, default=1024, help="Size of the shared connection pool")
+    parser.add_argument("--output-dir", default=None, help="Save each endpoint's rollouts and summary.json here")
+    args = parser.parse_args(argv)
+
+    registry = load_endpoints(args.endpoints_path)
+    names = list(registry) if args.all else args.endpoints
+    unknown = [name for name in names if name not in registry]
+    if unknown or not names:
+        parser.error(f"unknown endpoints {unknown}" if unknown else "name endpoints or pass --all")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    from ascii_align import load_environment
+
+    env = load_environment(**args.env_args)
+    sampling_args = {
+        key: value
+        for key, value in (("max_tokens", args.max_tokens), ("temperature", args.temperature))
+        if value is not None
+    }
+    summaries = asyncio.run(
+        run_sweep(
+            env,
+            {name: registry[name] for name in names},
+            num_examples=args.num_examples,
+            rollouts_per_example=args.rollouts_per_example,
+            sampling_args=sampling_args or None,
+            initial_concurrency=args.initial_concurrency,
+            max_concurrency=args.max_concurrency,
+            target_latency=args.target_latency,
+            max_connections=args.max_connections,
+            output_dir=args.output_dir,
+        )
+    )
+
+    text = json.dumps(summaries, indent=2)
+    print(text)
+    if args.output_dir:
+        Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+        (Path(args.output_dir) / "summary.json").write_text(text + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import argparse
+import ast
+import gzip
+import json
+import logging
+import os
+import random
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from alignment_check import detect_misaligned, has_disallowed_box_drawing_chars, normalize_grid
+from ascii_align import _extract_diagram, _layout_box_centers, _layout_spread_score
+from data import generate_diagram
+from scoring_cache import canonicalize_diagram, checker_version
+
+logger = logging.getLogger(__name__)
+
+# Bump when the entry format changes; expected values are refreshed with `golden build`.
+GOLDEN_FORMAT = 1
+TESTS_DIR = Path(__file__).resolve().with_name("tests")
+DEFAULT_CORPUS_PATH = TESTS_DIR / "golden" / "corpus.jsonl.gz"
+DEFAULT_SYNTHETIC_COUNT = 5000
+DEFAULT_MAX_DIVERGENCES = 20
+DEFAULT_CHUNK_SIZE = 64
+STAT_FIELDS = ("correct_rectangles", "rectangle_errors", "connector_errors", "arrow_errors", "misaligned")
+# Glyphs a mutation may put in place of a structural one.
+_MUTATION_GLYPHS = "─│┌┐└┘┬┴├┤┼▶◀▲▼"
+_STRUCTURAL_RE = re.compile(f"[{_MUTATION_GLYPHS}]")
+
+
+def golden_outputs(diagram: str) -> Dict[str, Any]:
+    """What the corpus pins for one diagram, computed by the current checker without any cache."""
+    grid = normalize_grid(diagram)
+    centers = _layout_box_centers(grid)
+    width = len(grid[0]) if grid else 0
+    stats = detect_misaligned(diagram)
+    return {
+        "disallowed": has_disallowed_box_drawing_chars(diagram),
+        **{field: stats[field] for field in STAT_FIELDS},
+        "layout_centers": centers,
+        "layout_spread": _layout_spread_score(centers, width),
+    }
+
+
+def _mutate(diagram: str, rng: random.Random) -> str:
+    """One small local edit of the kind models make: a shifted line, a dropped cell or a wrong glyph."""
+    lines = diagram.split("\n")
+    row = rng.randrange(len(lines))
+    line = lines[row]
+    kind = rng.choice(("shift", "drop", "swap", "swap"))
+    if kind == "shift" or not line.strip():
+        lines[row] = " " + line if rng.random() < 0.7 or not line.startswith(" ") else line[1:]
+    else:
+        cells = [m.start() for m in _STRUCTURAL_RE.finditer(line)] or [i for i, ch in enumerate(line) if ch != " "]
+        col = rng.choice(cells)
+        replacement = "" if kind == "drop" else rng.choice(_MUTATION_GLYPHS.replace(line[col], ""))
+        lines[row] = line[:col] + replacement + line[col + 1 :]
+    return "\n".join(lines)
+
+
+def synthetic_diagrams(count: int, seed: int = 0) -> Iterator[Tuple[str, str]]:
+    """(id, diagram) pairs: `data.generate_diagram` layouts, most with one to three random mutations."""
+    rng = random.Random(f"golden:{seed}")
+    for i in range(count):
+        box_count, columns = rng.randint(1, 9), rng.randint(1, 4)
+        diagram = generate_diagram(box_count, seed=f"{seed}:{i}", columns=columns, flaw_rate=rng.choice((0.0, 0.2)))
+        mutations = rng.choice((0, 1, 1, 2, 3))
+        for _ in range(mutations):
+            diagram = _mutate(diagram, rng)
+        yield f"synthetic:{seed}:{i}:{box_count}x{columns}:m{mutations}", diagram
+
+
+def fixture_diagrams(tests_dir: Path = TESTS_DIR) -> Iterator[Tuple[str, str]]:
+    """
+    (id, diagram) pairs from the hand-written tests: every ```text block of
+    the Markdown fixtures and every string literal with a box in the test
+    modules (rollout replies are reduced to their fenced diagram).
+    """
+    for path in sorted(tests_dir.glob("**/*.md")):
+        for n, diagram in enumerate(re.findall(r"```text\n(.*?)\n```", path.read_text(encoding="utf-8"), re.S)):
+            yield f"fixture:{path.relative_to(tests_dir)}:{n}", diagram
+    for path in sorted(tests_dir.glob("test_*.py")):
+        literals = [
+            node.value
+            for node in ast.walk(ast.parse(path.read_text(encoding="utf-8")))
+            if isinstance(node, ast.Constant) and isinstance(node.value, str) and "┌" in node.value
+        ]
+        for n, text in enumerate(literals):
+            diagram = _extract_diagram([{"content": text}]) if "```text" in text else text
+            if diagram and "\n" in diagram:
+                yield f"test:{path.name}:{n}", diagram
+
+
+def rollout_diagrams(paths: Iterable[str | os.PathLike]) -> Iterator[Tuple[str, str]]:
+    """(id, diagram) pairs from archived rollouts (anything `python -m alignment_check score` reads)."""
+    from rescore import input_files, iter_records
+
+    for source, index, completion, _, _ in iter_records(input_files(paths)):
+        diagram = _extract_diagram(completion) if isinstance(completion, list) and completion else None
+        if diagram:
+            yield f"rollout:{Path(source).name}:{index}", diagram
+
+
+def build_corpus(diagrams: Iterable[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """Corpus entries with expected outputs, one per distinct canonical diagram (first id wins)."""
+    seen = set()
+    entries = []
+    for entry_id, diagram in diagrams:
+        key = canonicalize_diagram(diagram).key
+        if key in seen:
+            continue
+        seen.add(key)
+        entries.append({"id": entry_id, "diagram": diagram, "expected": golden_outputs(diagram)})
+    return entries
+
+
+def write_corpus(path: str | os.PathLike, entries: List[Dict[str, Any]], version: int) -> None:
+    """Gzipped JSONL: a header line ({"golden_version", "format", "checker", "entries"}), then one entry per line."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    header = {"golden_version": version, "format": GOLDEN_FORMAT, "checker": checker_version(), "entries": len(entries)}
+    tmp = path.with_name(f".{path.name}.tmp")
+    # No name or mtime in the gzip header, so an unchanged corpus is byte-identical.
+    with open(tmp, "wb") as f, gzip.GzipFile(filename="", mode="wb", fileobj=f, mtime=0) as raw:
+        raw.write((json.dumps(header) + "\n").encode("utf-8"))
+        for entry in entries:
+            raw.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+    os.replace(tmp, path)
+
+
+def read_corpus(path: str | os.PathLike = DEFAULT_CORPUS_PATH) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("format") != GOLDEN_FORMAT:
+            raise ValueError(f"{path} has golden format {header.get('format')}, expected {GOLDEN_FORMAT}")
+        return header, [json.loads(line) for line in f if line.strip()]
+
+
+def entry_divergences(entry: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """{"id", "field", "expected", "actual"} for every pinned output the current checker disagrees with."""
+    actual = golden_outputs(entry["diagram"])
+    return [
+        {"id": entry["id"], "field": field, "expected": expected, "actual": actual.get(field)}
+        for field, expected in entry["expected"].items()
+        if actual.get(field) != expected
+    ]
+
+
+def _verify_chunk(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [divergence for entry in entries for divergence in entry_divergences(entry)]
+
+
+def verify_corpus(
+    entries: List[Dict[str, Any]],
+    workers: int | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_divergences: int = DEFAULT_MAX_DIVERGENCES,
+) -> List[Dict[str, Any]]:
+    """
+    Check every entry against the current checker on `workers` processes.
+
+    Returns the first `max_divergences` divergences in corpus order and stops
+    as soon as they are known, so a broken checker fails fast. `workers=0`
+    checks inline.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    chunks = [entries[i : i + chunk_size] for i in range(0, len(entries), chunk_size)]
+    divergences: List[Dict[str, Any]] = []
+    if workers <= 0:
+        for chunk in chunks:
+            divergences.extend(_verify_chunk(chunk))
+            if len(divergences) >= max_divergences:
+                break
+        return divergences[:max_divergences]
+
+    window: deque[Future] = deque()
+    with ProcessPoolExecutor(workers) as executor:
+        pending = iter(chunks)
+        for chunk in pending:
+            window.append(executor.submit(_verify_chunk, chunk))
+            if len(window) >= 4 * workers:
+                break
+        while window:
+            divergences.extend(window.popleft().result())
+            if len(divergences) >= max_divergences:
+                for future in window:
+                    future.cancel()
+                break
+            chunk = next(pending, None)
+            if chunk is not None:
+                window.append(executor.submit(_verify_chunk, chunk))
+    return divergences[:max_divergences]
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    actions = parser.add_subparsers(dest="action", required=True)
+    verify = actions.add_parser("verify", help="Check the current checker against the golden corpus")
+    verify.add_argument("--corpus", default=str(DEFAULT_CORPUS_PATH))
+    verify.add_argument("-w", "--workers", type=int, default=None, help="Checker processes (default: all cores)")
+    verify.add_argument("--max-divergences", type=int, default=DEFAULT_MAX_DIVERGENCES, help="Stop after this many")
+    build = actions.add_parser("build", help="Regenerate the corpus and pin the current checker's outputs")
+    build.add_argument("--corpus", default=str(DEFAULT_CORPUS_PATH))
+    build.add_argument("--synthetic", type=int, default=DEFAULT_SYNTHETIC_COUNT, help="Synthetic diagrams to include")
+    build.add_argument("--seed", type=int, default=0)
+    build.add_argument("--rollouts", nargs="*", default=[], help="Rollout dumps whose diagrams are added")
+    build.add_argument("--bump", action="store_true", help="Increase the corpus version (expected outputs changed)")
+
+
+def run(args: argparse.Namespace) -> None:
+    """
+    `verify` prints a JSON summary with the first divergences and exits
+    non-zero if there are any. `build` rewrites the corpus from the test
+    fixtures, `--rollouts` and seeded synthetic diagrams, keeping its version
+    unless `--bump` marks an intended change of expected outputs.
+    """
+    # The corpus and the test fixtures it is built from ship with the source tree, not the wheel.
+    if args.action == "build":
+        missing = not TESTS_DIR.is_dir()
+    else:
+        missing = Path(args.corpus) == DEFAULT_CORPUS_PATH and not DEFAULT_CORPUS_PATH.exists()
+    if missing:
+        raise SystemExit("The golden corpus is not available outside a source checkout (pass --corpus)")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    start = time.perf_counter()
+    if args.action == "build":
+        version = 1
+        if Path(args.corpus).exists():
+            version = read_corpus(args.corpus)[0]["golden_version"] + int(args.bump)
+        diagrams = [*fixture_diagrams(), *rollout_diagrams(args.rollouts), *synthetic_diagrams(args.synthetic, args.seed)]
+        entries = build_corpus(diagrams)
+        write_corpus(args.corpus, entries, version)
+        logger.info("Wrote %d entries (version %d) to %s in %.1fs", len(entries), version, args.corpus, time.perf_counter() - start)
+        return
+
+    header, entries = read_corpus(args.corpus)
+    divergences = verify_corpus(entries, args.workers, max_divergences=args.max_divergences)
+    print(
+        json.dumps(
+            {
+                "golden_version": header["golden_version"],
+                "entries": len(entries),
+                "checker_changed": header["checker"] != checker_version(),
+                "divergences": divergences,
+                "elapsed_s": round(time.perf_counter() - start, 2),
+            },
+            indent=2,
+            ensure_ascii=False,
+        )
+    )
+    if divergences:
+        raise SystemExit(f"The checker diverges from golden corpus v{header['golden_version']} (first divergences above)")
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Build or verify the golden checker corpus.")
+    add_arguments(parser)
+    run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
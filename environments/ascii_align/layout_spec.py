@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from typing import Any, Dict
+
+# `columns` value meaning "decide from the number of boxes actually drawn".
+COLUMNS_BY_BOX_COUNT = 0
+
+
+def _parse_shape_budget(value: Any) -> int | None:
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def layout_spec(theme: Any, shape_budget: Any) -> Dict[str, float]:
+    """
+    Example-level inputs of `layout_spread_reward`, precomputed once per example.
+
+    - `columns`: expected number of layout columns, or `COLUMNS_BY_BOX_COUNT`
+      when the prompt does not pin it down and the drawn box count decides
+    - `boxes_per_column`: density above which columns count as overstuffed
+    """
+    theme = str(theme or "").lower()
+    shape_budget = _parse_shape_budget(shape_budget)
+
+    if theme == "sequence":
+        columns = 3
+    elif shape_budget is not None and shape_budget >= 10:
+        columns = 3
+    elif shape_budget is not None and shape_budget <= 4:
+        columns = 2
+    else:
+        columns = COLUMNS_BY_BOX_COUNT
+
+    if theme == "sequence":
+        boxes_per_column = 1.6
+    elif theme == "state_machines":
+        boxes_per_column = 2.0 if shape_budget is not None and shape_budget >= 12 else 2.3
+    elif shape_budget is not None and shape_budget >= 12:
+        boxes_per_column = 2.2
+    else:
+        boxes_per_column = 2.8
+
+    return {"columns": columns, "boxes_per_column": boxes_per_column}
+
+
+def info_layout_spec(info: Dict[str, Any] | None) -> Dict[str, float]:
+    """The example's precomputed spec, or one derived from `theme`/`shape_budget` for older infos."""
+    safe_info = info or {}
+    spec = safe_info.get("layout")
+    if spec:
+        return spec
+    return layout_spec(safe_info.get("theme"), safe_info.get("shape_budget"))
+
+
+def expected_columns(spec: Dict[str, float], box_count: int) -> int:
+    if box_count <= 2:
+        return 2
+    if spec["columns"] != COLUMNS_BY_BOX_COUNT:
+        return int(spec["columns"])
+    return 3 if box_count >= 6 else 2
+
+
+def span_target(columns: int) -> float:
+    """Horizontal spread (fraction of diagram width) that earns the full span score."""
+    return 0.22 if columns >= 3 else 0.12
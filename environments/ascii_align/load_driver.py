@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+PERCENTILES = (50, 90, 99)
+
+
+def percentiles(values: Sequence[float], qs: Sequence[int] = PERCENTILES) -> Dict[str, float]:
+    """Nearest-rank percentiles plus the max, keyed "p50", ..., "max"; empty input gives {}."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    report = {f"p{q}": ordered[min(len(ordered) - 1, max(0, -(-q * len(ordered) // 100) - 1))] for q in qs}
+    report["max"] = ordered[-1]
+    return report
+
+
+class LoopStallMonitor:
+    """
+    Measures how late the event loop wakes a task that sleeps `interval` seconds.
+
+    Any lateness is time the loop spent running something else without
+    yielding (e.g. scoring inline on the loop); wake-ups later than
+    `threshold` seconds count as stalls.
+    """
+
+    def __init__(self, interval: float = 0.01, threshold: float = 0.05) -> None:
+        self.interval = interval
+        self.threshold = threshold
+        self.lags: List[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def report(self) -> Dict[str, Any]:
+        stalls = [lag for lag in self.lags if lag > self.threshold]
+        return {
+            "samples": len(self.lags),
+            "stalls": len(stalls),
+            "stalled_s": round(sum(stalls), 3),
+            "lag_ms": {k: round(v * 1000, 2) for k, v in percentiles(self.lags).items()},
+        }
+
+
+async def run_load(
+    env: Any,
+    base_url: str,
+    model: str = "mock",
+    num_examples: int = -1,
+    rollouts_per_example: int = 1,
+    max_concurrent: int = -1,
+    sampling_args: Dict[str, Any] | None = None,
+    independent_scoring: bool = False,
+    stall_threshold: float = 0.05,
+) -> Dict[str, Any]:
+    """
+    Evaluate `env` against `base_url` and summarize env-side throughput.
+
+    Scoring latency comes from each rollout's `timing["scoring_ms"]`; unless
+    `independent_scoring` is set, verifiers scores a rollout group together
+    and every member reports the group's time.
+    """
+    from openai import AsyncOpenAI
+
+    client = AsyncOpenAI(base_url=base_url, api_key="mock", max_retries=0, timeout=600)
+    monitor = LoopStallMonitor(threshold=stall_threshold)
+    monitor.start()
+    start = time.perf_counter()
+    try:
+        outputs = await env.evaluate(
+            client,
+            model,
+            sampling_args=sampling_args,
+            num_examples=num_examples,
+            rollouts_per_example=rollouts_per_example,
+            max_concurrent=max_concurrent,
+            independent_scoring=independent_scoring,
+            use_tqdm=False,
+        )
+    finally:
+        elapsed = time.perf_counter() - start
+        await monitor.stop()
+        await client.close()
+
+    states = outputs["state"]
+    rewards = outputs["reward"]
+    generation_ms = [float(s["timing"]["generation_ms"]) for s in states]
+    scoring_ms = [float(s["timing"]["scoring_ms"]) for s in states]
+    return {
+        "rollouts": len(states),
+        "elapsed_s": round(elapsed, 3),
+        "rollouts_per_s": round(len(states) / elapsed, 2) if elapsed > 0 else None,
+        "reward_mean": round(sum(rewards) / len(rewards), 4) if rewards else None,
+        "generation_ms": {k: round(v, 2) for k, v in percentiles(generation_ms).items()},
+        "scoring_ms": {k: round(v, 2) for k, v in percentiles(scoring_ms).items()},
+        "event_loop": monitor.report(),
+    }
+
+
+def start_mock_server(args: Sequence[str] = ()) -> tuple[subprocess.Popen, str]:
+    """
+    Run `mock_server.py` on a free port in a child process and return (process, base URL).
+
+    A separate process keeps the server's threads off this interpreter's
+    GIL, so they do not show up as env-side overhead.
+    """
+    process = subprocess.Popen(
+        [sys.executable, str(Path(__file__).with_name("mock_server.py")), "--port", "0", *args],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    base_url = process.stdout.readline().strip()
+    if not base_url:
+        process.kill()
+        raise RuntimeError("mock server exited before reporting its address")
+    return process, base_url
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Run load_environment() end to end against a mock endpoint and report env-side throughput."
+    )
+    parser.add_argument("--base-url", default=None, help="Use an already running endpoint instead of spawning one")
+    parser.add_argument("--model", default="mock")
+    parser.add_argument("--synthetic-examples", type=int, default=500, help="Generated prompts (0: the real dataset)")
+    parser.add_argument("-n", "--num-examples", type=int, default=-1)
+    parser.add_argument("-r", "--rollouts-per-example", type=int, default=4)
+    parser.add_argument("-c", "--max-concurrent", type=int, default=64)
+    parser.add_argument("-t", "--max-tokens", type=int, default=None)
+    parser.add_argument("-a", "--env-args", type=json.loads, default={}, help="JSON load_environment() kwargs")
+    parser.add_argument("--independent-scoring", action="store_true")
+    parser.add_argument("--stall-threshold-ms", type=float, default=50.0)
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock server: seconds before each reply")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Mock server: decode rate (0: instant)")
+    parser.add_argument("--flaw-rate", type=float, default=0.2, help="Mock server: misaligned box fraction")
+    parser.add_argument("--recorded", default=None, help="Mock server: JSONL of completions to replay")
+    parser.add_argument("--output", default=None, help="Also write the report here as JSON")
+    args = parser.parse_args(argv)
+
+    from ascii_align import load_environment
+
+    process = None
+    base_url = args.base_url
+    if base_url is None:
+        server_args = [
+            f"--latency={args.latency}",
+            f"--tokens-per-second={args.tokens_per_second}",
+            f"--flaw-rate={args.flaw_rate}",
+        ]
+        if args.recorded:
+            server_args.append(f"--recorded={args.recorded}")
+        process, base_url = start_mock_server(server_args)
+    try:
+        env_args = dict(args.env_args)
+        if args.synthetic_examples:
+            env_args.setdefault("synthetic_examples", args.synthetic_examples)
+        env = load_environment(**env_args)
+        sampling_args = {"max_tokens": args.max_tokens} if args.max_tokens else None
+        report = asyncio.run(
+            run_load(
+                env,
+                base_url,
+                model=args.model,
+                num_examples=args.num_examples,
+                rollouts_per_example=args.rollouts_per_example,
+                max_concurrent=args.max_concurrent,
+                sampling_args=sampling_args,
+                independent_scoring=args.independent_scoring,
+                stall_threshold=args.stall_threshold_ms / 1000,
+            )
+        )
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    report["env_args"] = env_args
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import logging
+import math
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List
+
+from data import generate_diagram
+from scoring_cache import _fingerprint
+
+logger = logging.getLogger(__name__)
+
+MOCK_MODEL = "mock"
+# Rough size of a token for usage accounting and pacing; box-drawing glyphs
+# tokenize poorly, so this is lower than the usual ~4 for English.
+CHARS_PER_TOKEN = 3
+TRAILING_PROSE = "Each box feeds the next one; the arrows show the order of the steps.\n"
+
+_NUMBER_RE = re.compile(r"\b(\d{1,2})\b")
+_LIST_SPLIT_RE = re.compile(r",\s*(?:and\s+)?|\s+and\s+|->")
+
+
+def count_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def box_count_from_prompt(prompt: str) -> int:
+    """How many boxes a prompt asks for: its first small number, else the length of its longest list."""
+    for match in _NUMBER_RE.finditer(prompt):
+        value = int(match.group(1))
+        if 2 <= value <= 30:
+            return value
+    items = max((len(_LIST_SPLIT_RE.split(part)) for part in prompt.split(":")), default=1)
+    return max(3, items)
+
+
+def load_recorded_completions(path: str | Path) -> List[str]:
+    """
+    Assistant replies from a JSONL file.
+
+    Each line is either {"completion": "<text>"} or a verifiers
+    `results.jsonl` row, whose `completion` is a message list; the last
+    assistant message is used.
+    """
+    completions: List[str] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            completion = json.loads(line).get("completion")
+            if isinstance(completion, list):
+                replies = [m.get("content") for m in completion if m.get("role") == "assistant"]
+                completion = replies[-1] if replies else None
+            if isinstance(completion, str) and completion:
+                completions.append(completion)
+    if not completions:
+        raise ValueError(f"No completions found in {path}")
+    return completions
+
+
+class MockCompletions:
+    """
+    Builds chat-completion responses without a model.
+
+    Replies are a ```` ```text ```` block holding `data.generate_diagram` for
+    the box count the prompt asks for (with `flaw_rate` of the boxes drawn
+    misaligned), followed by a line of prose; or, when `recorded` is given,
+    one of those completions picked by a hash of the prompt and request.
+    A request's `stop` strings cut the reply like vLLM does, keeping the
+    matched string when `include_stop_str_in_output` is set and reporting it
+    as `stop_reason` (None when the reply ended by itself), and `max_tokens`
+    truncates it with `finish_reason="length"`.
+
+    Each reply is held back for `latency` seconds plus its tokens over
+    `tokens_per_second` (0 sends it at once). Without a `seed` in the request,
+    repeated prompts get different diagrams from a per-server counter.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        tokens_per_second: float = 0.0,
+        flaw_rate: float = 0.2,
+        columns: int = 3,
+        recorded: List[str] | None = None,
+        seed: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.flaw_rate = flaw_rate
+        self.columns = columns
+        self.recorded = recorded
+        self.seed = seed
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def _content(self, prompt: str, key: str) -> str:
+        if self.recorded:
+            return self.recorded[int(_fingerprint(key), 16) % len(self.recorded)]
+        diagram = generate_diagram(box_count_from_prompt(prompt), key, self.columns, self.flaw_rate)
+        return f"```text\n{diagram}\n```\n\n{TRAILING_PROSE}"
+
+    def complete(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        messages = body.get("messages") or []
+        prompt = next((str(m.get("content", "")) for m in reversed(messages) if m.get("role") == "user"), "")
+        stops = body.get("stop") or []
+        if isinstance(stops, str):
+            stops = [stops]
+        keep_stop = bool(body.get("include_stop_str_in_output"))
+        max_tokens = body.get("max_completion_tokens") or body.get("max_tokens")
+        with self._lock:
+            request_seed = body["seed"] if body.get("seed") is not None else next(self._counter)
+
+        choices = []
+        completion_tokens = 0
+        for i in range(int(body.get("n") or 1)):
+            content = self._content(prompt, f"{self.seed}:{request_seed}:{i}:{prompt}")
+            finish_reason, stop_reason = "stop", None
+            cut = min(((content.find(s), s) for s in stops if s and s in content), default=None)
+            if cut is not None:
+                position, stop_reason = cut
+                content = content[: position + (len(stop_reason) if keep_stop else 0)]
+            if max_tokens and count_tokens(content) > max_tokens:
+                content = content[: int(max_tokens) * CHARS_PER_TOKEN]
+                finish_reason, stop_reason = "length", None
+            completion_tokens += count_tokens(content)
+            choices.append(
+                {
+                    "index": i,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": finish_reason,
+                    "stop_reason": stop_reason,
+                    "logprobs": None,
+                }
+            )
+
+        delay = self.latency
+        if self.tokens_per_second > 0:
+            delay += completion_tokens / self.tokens_per_second
+        if delay > 0:
+            time.sleep(delay)
+
+        prompt_tokens = sum(count_tokens(str(m.get("content", ""))) for m in messages)
+        return {
+            "id": f"chatcmpl-mock-{request_seed}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", MOCK_MODEL),
+            "choices": choices,
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "MockServer"
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status: int, payload: Dict[str, Any]) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path.rstrip("/").endswith("/models"):
+            self._send(200, {"object": "list", "data": [{"id": MOCK_MODEL, "object": "model", "owned_by": "mock"}]})
+        else:
+            self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self) -> None:  # noqa: N802
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        request = json.loads(body or b"{}")
+        if request.get("stream"):
+            self._send(400, {"error": {"message": "Streaming is not supported by the mock server"}})
+            return
+        if not self.server.admit():
+            self._send(429, {"error": {"message": "Too many concurrent requests", "type": "rate_limit_error"}})
+            return
+        try:
+            self._send(200, self.server.completions.complete(request))
+        finally:
+            self.server.done()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(format, *args)
+
+
+class MockServer(ThreadingHTTPServer):
+    """
+    OpenAI-compatible `/v1/chat/completions` and `/v1/models` endpoints
+    backed by `MockCompletions`, one thread per connection.
+
+    With `max_in_flight`, completions beyond that many concurrent ones are
+    rejected with 429, like a rate-limited provider.
+    """
+
+    daemon_threads = True
+    # Load tests open many connections at once.
+    request_queue_size = 1024
+
+    def __init__(
+        self,
+        completions: MockCompletions,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        max_in_flight: int | None = None,
+    ) -> None:
+        super().__init__((host, port), _Handler)
+        self.completions = completions
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._in_flight_lock = threading.Lock()
+
+    def admit(self) -> bool:
+        with self._in_flight_lock:
+            if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+                return False
+            self.in_flight += 1
+            return True
+
+    def done(self) -> None:
+        with self._in_flight_lock:
+            self.in_flight -= 1
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockServer":
+        """Serve from a daemon thread and return self."""
+        threading.Thread(target=self.serve_forever, name="mock-server", daemon=True).start()
+        return self
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for a chat-completions endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000, help="0 picks a free port")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each reply")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Decode rate per request (0: instant)")
+    parser.add_argument("--flaw-rate", type=float, default=0.2, help="Fraction of synthetic boxes drawn misaligned")
+    parser.add_argument("--columns", type=int, default=3, help="Boxes per row in synthetic diagrams")
+    parser.add_argument("--recorded", default=None, help="JSONL of recorded completions to replay instead")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-in-flight", type=int, default=None, help="Answer 429 above this many concurrent requests")
+    args = parser.parse_args(argv)
+
+    completions = MockCompletions(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        flaw_rate=args.flaw_rate,
+        columns=args.columns,
+        recorded=load_recorded_completions(args.recorded) if args.recorded else None,
+        seed=args.seed,
+    )
+    server = MockServer(completions, args.host, args.port, args.max_in_flight)
+    # The load driver reads this line to find the port.
+    print(server.base_url, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import re
+from typing import Any, Callable, Dict, Hashable, List, Sequence
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]|\s+")
+
+Tokenize = Callable[[str], Sequence[Hashable]]
+
+
+def render_prompt(messages: Any, system_prompt: str | None = None) -> str:
+    """Flatten chat messages (plus the env system prompt) into the text the server prefixes on."""
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+    parts = [f"system\n{system_prompt}"] if system_prompt else []
+    parts.extend(f"{message['role']}\n{message['content']}" for message in messages)
+    return "\n".join(parts)
+
+
+def simple_tokenize(text: str) -> List[str]:
+    """Word/punctuation/whitespace split; a stand-in when no model tokenizer is at hand."""
+    return _TOKEN_RE.findall(text)
+
+
+def shared_prefix_ratio(prompts: Sequence[str], tokenize: Tokenize = simple_tokenize) -> float:
+    """
+    Fraction of prompt tokens a prefix cache could reuse if `prompts` are sent in order.
+
+    Each prompt reuses its longest prefix shared with any earlier prompt in
+    the batch (tracked with a token trie), which is what an inference server
+    with automatic prefix caching gets within one batch. The result depends
+    on which prompts share a batch, not on their order inside it.
+    """
+    trie: Dict[Hashable, dict] = {}
+    total = 0
+    shared = 0
+    for prompt in prompts:
+        tokens = list(tokenize(prompt))
+        total += len(tokens)
+        node = trie
+        matching = True
+        for token in tokens:
+            child = node.get(token)
+            if child is None:
+                matching = False
+                child = node[token] = {}
+            elif matching:
+                shared += 1
+            node = child
+    return shared / total if total else 0.0
+
+
+def batch_prefix_ratios(
+    prompts: Sequence[str],
+    batch_size: int,
+    tokenize: Tokenize = simple_tokenize,
+) -> List[float]:
+    return [
+        shared_prefix_ratio(prompts[start : start + batch_size], tokenize)
+        for start in range(0, len(prompts), max(1, batch_size))
+    ]
+
+
+def prefix_grouped_order(keys: Sequence[tuple], group_size: int) -> List[int]:
+    """
+    Reorder indices so similar prompts are adjacent, one window at a time.
+
+    Rows are sorted by `keys` (e.g. theme, prompt text) only inside
+    consecutive windows of `group_size`. Batches smaller than the window then
+    draw prompts that share a prefix, while which examples are trained on
+    within each window-sized span of steps stays the same.
+    """
+    if group_size <= 1:
+        return list(range(len(keys)))
+    order: List[int] = []
+    for start in range(0, len(keys), group_size):
+        window = range(start, min(start + group_size, len(keys)))
+        order.extend(sorted(window, key=lambda i: (keys[i], i)))
+    return order
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from ascii_align import REWARD_FUNCS, REWARD_WEIGHTS, score_completion
+from scoring_cache import DEFAULT_CACHE_SIZE, configure_scoring_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 64
+INPUT_SUFFIXES = (".jsonl", ".parquet")
+# Columns carried from an input record to its output row when present.
+PASSTHROUGH_FIELDS = ("example_id", "rollout_id")
+# Flat columns (e.g. a rollout store) that stand in for a missing `info`.
+INFO_FIELDS = ("source_index", "theme", "shape_budget")
+
+# (source, index, completion, info, passthrough)
+Record = Tuple[str, int, Any, Dict[str, Any] | None, Dict[str, Any]]
+
+
+def input_files(paths: Iterable[str | os.PathLike]) -> List[Path]:
+    """The given files, plus every .jsonl/.parquet file under given directories, in sorted order."""
+    files: List[Path] = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob("*") if p.suffix in INPUT_SUFFIXES and p.is_file()))
+        elif path.suffix in INPUT_SUFFIXES:
+            files.append(path)
+        else:
+            raise ValueError(f"Expected a directory or a .jsonl/.parquet file, got {path}")
+    return files
+
+
+def _record(source: str, index: int, row: Dict[str, Any]) -> Record:
+    completion = row.get("completion")
+    if isinstance(completion, str):
+        completion = [{"role": "assistant", "content": completion}]
+    info = row.get("info")
+    if isinstance(info, str):
+        info = json.loads(info) if info else None
+    if info is None:
+        info = {key: row[key] for key in INFO_FIELDS if row.get(key) is not None} or None
+    passthrough = {key: row[key] for key in PASSTHROUGH_FIELDS if row.get(key) is not None}
+    if row.get("reward") is not None:
+        passthrough["previous_reward"] = row["reward"]
+    return source, index, completion, info, passthrough
+
+
+def iter_records(files: Iterable[Path], batch_size: int = 1024) -> Iterator[Record]:
+    """
+    Rollouts from verifiers `results.jsonl` files, JSONL dumps or Parquet
+    files (e.g. a rollout store), one at a time in file and row order.
+
+    `completion` may be a message list or the assistant text; `info` may be a
+    dict, a JSON string, or absent, in which case flat `theme`/
+    `shape_budget`/`source_index` columns are used.
+    """
+    for path in files:
+        source = str(path)
+        if path.suffix == ".parquet":
+            import pyarrow.parquet as pq
+
+            parquet = pq.ParquetFile(path)
+            names = set(parquet.schema_arrow.names)
+            wanted = ["completion", "info", "reward", *PASSTHROUGH_FIELDS, *INFO_FIELDS]
+            index = 0
+            for batch in parquet.iter_batches(batch_size, columns=[c for c in wanted if c in names]):
+                for row in batch.to_pylist():
+                    yield _record(source, index, row)
+                    index += 1
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                index = 0
+                for line in f:
+                    if line.strip():
+                        yield _record(source, index, json.loads(line))
+                        index += 1
+
+
+def _init_worker(cache_size: int, cache_path: str | None) -> None:
+    configure_scoring_cache(cache_size, cache_path)
+
+
+def score_record(completion: Any, info: Dict[str, Any] | None, features: bool = False) -> Dict[str, Any]:
+    """Every rubric value plus the weighted `reward`; unscorable input gets an `error` instead."""
+    if not isinstance(completion, list) or not completion:
+        return {"error": "missing completion"}
+    try:
+        scores: Dict[str, Any] = score_completion(completion, info, diagnostics=True, features=features)
+    except Exception as exc:
+        return {"error": repr(exc)}
+    scores["reward"] = sum(weight * scores[func.__name__] for func, weight in zip(REWARD_FUNCS, REWARD_WEIGHTS))
+    return scores
+
+
+def _score_chunk(chunk: List[Tuple[Any, Dict[str, Any] | None]], features: bool) -> List[Dict[str, Any]]:
+    return [score_record(completion, info, features) for completion, info in chunk]
+
+
+def _chunks(records: Iterator[Record], size: int) -> Iterator[List[Record]]:
+    chunk: List[Record] = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def rescore(
+    records: Iterable[Record],
+    workers: int | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    features: bool = False,
+    cache_size: int = DEFAULT_CACHE_SIZE,
+    cache_path: str | None = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Score `records` on `workers` processes and yield output rows in input order.
+
+    Records are sent in chunks of `chunk_size`, with at most four chunks per
+    worker in flight, so memory stays bounded however large the input is.
+    Each output row is {"source", "index", passthrough fields, scores,
+    "reward"}. `workers=0` scores inline.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    def rows(chunk: List[Record], results: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for (source, index, _, _, passthrough), scores in zip(chunk, results):
+            yield {"source": source, "index": index, **passthrough, **scores}
+
+    if workers <= 0:
+        _init_worker(cache_size, cache_path)
+        for chunk in _chunks(iter(records), chunk_size):
+            yield from rows(chunk, _score_chunk([(r[2], r[3]) for r in chunk], features))
+        return
+
+    window: deque[Tuple[List[Record], Future]] = deque()
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(cache_size, cache_path)) as executor:
+        for chunk in _chunks(iter(records), chunk_size):
+            window.append((chunk, executor.submit(_score_chunk, [(r[2], r[3]) for r in chunk], features)))
+            if len(window) >= 4 * workers:
+                done, future = window.popleft()
+                yield from rows(done, future.result())
+        while window:
+            done, future = window.popleft()
+            yield from rows(done, future.result())
+
+
+def _completed_rows(output: Path) -> Tuple[int, Tuple[str, int] | None]:
+    """(complete lines in `output`, (source, index) of the last one); a torn last line is cut off."""
+    if not output.exists():
+        return 0, None
+    count, last, good_bytes = 0, None, 0
+    with open(output, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            row = json.loads(line)
+            count, last, good_bytes = count + 1, (row["source"], row["index"]), good_bytes + len(line)
+    with open(output, "r+b") as f:
+        f.truncate(good_bytes)
+    return count, last
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("inputs", nargs="+", help=".jsonl/.parquet rollout dumps or directories of them")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file the scored rows are appended to")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Scoring processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rollouts per worker job")
+    parser.add_argument("--features", action="store_true", help="Add raw checker counts and layout features")
+    parser.add_argument("--score-cache-path", default=None, help="SQLite score cache shared by the workers")
+    parser.add_argument("--no-resume", action="store_true", help="Overwrite --output instead of continuing it")
+
+
+def run(args: argparse.Namespace) -> None:
+    """
+    Re-score rollout dumps into `args.output`, resuming where a previous run stopped.
+
+    Output rows are in input order, so the rows already in the output are
+    exactly the first records of the inputs; a resumed run checks that the
+    last of them matches and skips that many records.
+    """
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    output = Path(args.output)
+    if args.no_resume and output.exists():
+        output.unlink()
+    done, last = _completed_rows(output)
+
+    records: Iterator[Record] = iter_records(input_files(args.inputs))
+    for position in range(done):
+        record = next(records, None)
+        if position == done - 1 and (record is None or (record[0], record[1]) != last):
+            raise SystemExit(f"{output} does not match the inputs (last row {last}); pass --no-resume to start over")
+    if done:
+        logger.info("Resuming after %d scored rollouts", done)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    count = 0
+    with open(output, "a", encoding="utf-8") as f:
+        for row in rescore(records, args.workers, args.chunk_size, args.features, cache_path=args.score_cache_path):
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            count += 1
+            if count % 10_000 == 0:
+                f.flush()
+                logger.info("%d rollouts scored (%.0f/s)", done + count, count / (time.perf_counter() - start))
+    logger.info("Scored %d rollouts in %.1fs; %d total in %s", count, time.perf_counter() - start, done + count, output)
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Re-score archived rollouts with the current checker.")
+    add_arguments(parser)
+    run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict
+
+from scoring_cache import DiskScoreCache
+
+DEFAULT_RESPONSE_CACHE_MAX_ENTRIES = 200_000
+
+
+def request_key(
+    model: str,
+    prompt: Any,
+    sampling_args: Dict[str, Any] | None,
+    message_type: str = "chat",
+    policy_version: str | None = None,
+) -> str:
+    """Hash of everything that determines a request's output distribution."""
+    parts = [model, message_type, prompt, sampling_args or {}]
+    if policy_version is not None:
+        parts.append(policy_version)
+    payload = json.dumps(
+        parts,
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk cache of raw model responses for repeated evals.
+
+    Entries are keyed by (model, prompt messages, sampling args, sample
+    index): the k-th identical request made by this process is sample k, so
+    an eval with `rollouts_per_example = r` reads back the same r distinct
+    responses on every rerun, and a larger r only requests the extra samples.
+    Requests carrying a `seed` are keyed by it as part of the sampling args.
+
+    The model name does not identify its weights. `policy_version` (e.g. a
+    checkpoint step or hash) is added to every key, so responses cached from
+    one set of weights are never served for another; without it, the cache
+    is only valid while the weights behind the model name stay fixed.
+
+    With `replay`, misses are not sent anywhere (`get` returns None and the
+    caller fails the rollout). Storage is a `DiskScoreCache` file, so it is
+    shared across processes and pruned back below `max_entries` by least
+    recent use.
+    """
+
+    _KIND = "response"
+
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        max_entries: int = DEFAULT_RESPONSE_CACHE_MAX_ENTRIES,
+        replay: bool = False,
+        policy_version: str | None = None,
+    ) -> None:
+        self.replay = replay
+        self.policy_version = policy_version
+        self._store = DiskScoreCache(path, max_entries=max_entries)
+        self._samples: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def sample_key(self, model: str, prompt: Any, sampling_args: Dict[str, Any] | None, message_type: str = "chat") -> str:
+        """Key of the next sample of this request (call once per request)."""
+        base = request_key(model, prompt, sampling_args, message_type, self.policy_version)
+        with self._lock:
+            index = self._samples[base]
+            self._samples[base] += 1
+        return f"{base}:{index}"
+
+    def get(self, key: str) -> Dict[str, Any] | None:
+        return self._store.get(self._KIND, key, "")
+
+    def put(self, key: str, response: Dict[str, Any]) -> None:
+        if not self.replay:
+            self._store.put(self._KIND, key, "", response)
+
+    def reset_samples(self) -> None:
+        """Start sample indices over, e.g. before evaluating the same prompts again."""
+        with self._lock:
+            self._samples.clear()
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def stats(self) -> Dict[str, int]:
+        return self._store.stats()
+
+    def close(self) -> None:
+        self._store.close()
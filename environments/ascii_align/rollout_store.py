@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import itertools
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Mapping
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_ROWS = 1024
+COLUMN_TYPES = ("string", "int64", "float64")
+
+
+class RolloutStore:
+    """
+    Appendable directory of Parquet part files, one row per rollout.
+
+    Rows are buffered and written as a new zstd-compressed part every
+    `flush_rows` rows (and on `close`), so memory stays bounded however long
+    the run is. Each part is written to a temporary name and renamed, so
+    readers never see a partial file, and part names carry a per-store run
+    id, so several processes or a resumed run can append to the same
+    directory. `columns` fixes the schema ({name: "string" | "int64" |
+    "float64"}) so every part has identical column types; missing values are
+    stored as nulls and unknown keys are dropped.
+
+    `pyarrow` is imported on first flush, so it is only needed when a store
+    is used. Read the whole directory with `read_rollouts`.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        columns: Mapping[str, str],
+        flush_rows: int = DEFAULT_FLUSH_ROWS,
+        compression: str = "zstd",
+    ) -> None:
+        unknown = sorted({kind for kind in columns.values()} - set(COLUMN_TYPES))
+        if unknown:
+            raise ValueError(f"Unknown column types {unknown}; expected {COLUMN_TYPES}")
+        self.path = Path(path)
+        self.columns = dict(columns)
+        self.flush_rows = max(1, flush_rows)
+        self.compression = compression
+        self.rows_written = 0
+        self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self._parts = itertools.count()
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def append(self, row: Mapping[str, Any]) -> None:
+        with self._lock:
+            self._buffer.append({name: row.get(name) for name in self.columns})
+            if len(self._buffer) >= self.flush_rows:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._buffer:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in self.columns.items()])
+        table = pa.Table.from_pylist(self._buffer, schema=schema)
+        name = f"part-{self.run_id}-{os.getpid()}-{next(self._parts):05d}.parquet"
+        tmp = self.path / f".{name}.tmp"
+        pq.write_table(table, tmp, compression=self.compression)
+        os.replace(tmp, self.path / name)
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Could not write the last rollouts to %s", self.path)
+
+
+def read_rollouts(path: str | os.PathLike, columns: List[str] | None = None) -> Any:
+    """
+    Every part under `path` as one memory-mapped `pyarrow.Table`.
+
+    Parts written with different column sets are unified; a column missing
+    from older parts reads as null.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    parts = sorted(str(p) for p in Path(path).glob("part-*.parquet"))
+    if not parts:
+        raise FileNotFoundError(f"No rollout parts under {path}")
+    schema = pa.unify_schemas([pq.read_schema(part, memory_map=True) for part in parts])
+    return pq.read_table(parts, columns=columns, schema=schema, memory_map=True)
@@ -0,0 +1,393 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import alignment_check
+from alignment_check import detect_misaligned_grid, strip_ansi
+
+DEFAULT_CACHE_SIZE = 4096
+DEFAULT_DISK_CACHE_MAX_ENTRIES = 1_000_000
+
+# Plain module-level values a checker function can depend on.
+_CONSTANT_TYPES = (bool, int, float, str, tuple, frozenset, set, dict)
+
+
+@dataclass(frozen=True)
+class CanonicalDiagram:
+    """
+    Translation-free form of a diagram:
+    - ANSI stripped, tabs expanded (same as `normalize_grid`)
+    - trailing spaces and leading/trailing blank lines removed
+    - common leading indentation removed (recorded as `offset`)
+
+    `width` is the width `normalize_grid` produces for the original diagram,
+    which the layout reward needs even though the cache key ignores it.
+    """
+
+    lines: tuple[str, ...]
+    offset: int
+    width: int
+    key: str
+
+    def grid(self) -> List[List[str]]:
+        width = max((len(line) for line in self.lines), default=0)
+        return [list(line.ljust(width)) for line in self.lines]
+
+
+def canonicalize_diagram(diagram: str) -> CanonicalDiagram:
+    raw_lines = strip_ansi(diagram.expandtabs()).splitlines()
+    width = max((len(line) for line in raw_lines), default=0)
+
+    lines = [line.rstrip(" ") for line in raw_lines]
+    while lines and not lines[0]:
+        lines.pop(0)
+    while lines and not lines[-1]:
+        lines.pop()
+
+    offset = min((len(line) - len(line.lstrip(" ")) for line in lines if line), default=0)
+    lines = [line[offset:] for line in lines]
+
+    key = hashlib.blake2b("\n".join(lines).encode("utf-8"), digest_size=16).hexdigest()
+    return CanonicalDiagram(lines=tuple(lines), offset=offset, width=width, key=key)
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU map with hit/miss/eviction counters."""
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: OrderedDict[str, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def resize(self, maxsize: int) -> None:
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._data) > max(0, maxsize):
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+
+def _fingerprint(*parts: str) -> str:
+    digest = hashlib.blake2b(digest_size=8)
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def checker_version() -> str:
+    """Fingerprint of the full checker source; any edit invalidates `detect_misaligned` results."""
+    return _fingerprint(Path(alignment_check.__file__).read_text(encoding="utf-8"))
+
+
+def _code_names(code) -> set[str]:
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _code_names(const)
+    return names
+
+
+def layout_dependencies(compute_centers: Callable[[List[List[str]]], List[float]]) -> Dict[str, str]:
+    """
+    {name: source or repr} of every `alignment_check` function, class and
+    constant that `compute_centers` (and the helpers it takes as defaults)
+    reach through global references, e.g. `_find_spans` -> `edge_row_ok` ->
+    `connected` -> `N`/`E`/`S`/`W`. Connector and arrow checks are not
+    reached, so changing them does not invalidate cached layout results.
+    """
+    found: Dict[str, str] = {}
+    stack = [compute_centers]
+    for helper in compute_centers.__defaults__ or ():
+        if inspect.isfunction(helper) and helper.__module__ == alignment_check.__name__:
+            found[helper.__name__] = inspect.getsource(helper)
+            stack.append(helper)
+    while stack:
+        func = stack.pop()
+        for name in sorted(_code_names(func.__code__)):
+            value = func.__globals__.get(name)
+            if name in found or value is None:
+                continue
+            if inspect.isfunction(value) or inspect.isclass(value):
+                if value.__module__ != alignment_check.__name__:
+                    continue
+                found[name] = inspect.getsource(value)
+                if inspect.isfunction(value):
+                    stack.append(value)
+            elif func.__globals__ is vars(alignment_check) and isinstance(value, _CONSTANT_TYPES):
+                found[name] = repr(sorted(value) if isinstance(value, (set, frozenset)) else value)
+    return dict(sorted(found.items()))
+
+
+def layout_version(compute_centers: Callable[[List[List[str]]], List[float]]) -> str:
+    """Fingerprint of the code layout centers actually depend on (`layout_dependencies`)."""
+    sources = [f"{name}={source}" for name, source in layout_dependencies(compute_centers).items()]
+    return _fingerprint(*sources, inspect.getsource(compute_centers))
+
+
+class DiskScoreCache:
+    """
+    SQLite-backed result cache shared by every process pointing at the same file.
+
+    Rows are keyed by (kind, diagram key, version fingerprint), so results
+    computed by an older checker are never returned, while results for the
+    parts of the checker that did not change stay valid.
+    WAL mode lets worker processes read while one of them writes; the table
+    is pruned back below `max_entries` by least-recent access.
+    """
+
+    _PRUNE_EVERY = 256
+
+    def __init__(self, path: str | os.PathLike, max_entries: int = DEFAULT_DISK_CACHE_MAX_ENTRIES) -> None:
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._conn: sqlite3.Connection | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross fork(); reopen lazily in each process.
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS scores ("
+                " kind TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " version TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (kind, key, version))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS scores_accessed_at ON scores (accessed_at)")
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, kind: str, key: str, version: str) -> Any | None:
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value FROM scores WHERE kind = ? AND key = ? AND version = ?",
+                (kind, key, version),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            conn.execute(
+                "UPDATE scores SET accessed_at = ? WHERE kind = ? AND key = ? AND version = ?",
+                (time.time(), kind, key, version),
+            )
+            return json.loads(row[0])
+
+    def put(self, kind: str, key: str, version: str, value: Any) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO scores (kind, key, version, value, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, key, version, json.dumps(value), time.time()),
+            )
+            self._puts += 1
+            if self._puts % self._PRUNE_EVERY == 0:
+                self._prune(conn)
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        (count,) = conn.execute("SELECT COUNT(*) FROM scores").fetchone()
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+        # Drop a little extra so pruning does not run on every subsequent put.
+        excess += self.max_entries // 10
+        conn.execute(
+            "DELETE FROM scores WHERE rowid IN (SELECT rowid FROM scores ORDER BY accessed_at, rowid LIMIT ?)",
+            (excess,),
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._connection().execute("SELECT COUNT(*) FROM scores").fetchone()
+            return count
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+MISALIGNED_CACHE = LRUCache()
+LAYOUT_CACHE = LRUCache()
+_DISK_CACHE: DiskScoreCache | None = None
+_LAYOUT_VERSIONS: Dict[Callable, str] = {}
+
+
+def configure_scoring_cache(
+    maxsize: int = DEFAULT_CACHE_SIZE,
+    disk_path: str | os.PathLike | None = None,
+    disk_max_entries: int = DEFAULT_DISK_CACHE_MAX_ENTRIES,
+) -> None:
+    """Resize the in-memory caches and enable (or disable) the on-disk cache."""
+    global _DISK_CACHE
+    MISALIGNED_CACHE.resize(maxsize)
+    LAYOUT_CACHE.resize(maxsize)
+    if _DISK_CACHE is not None:
+        _DISK_CACHE.close()
+    _DISK_CACHE = DiskScoreCache(disk_path, max_entries=disk_max_entries) if disk_path else None
+
+
+def scoring_cache_stats() -> Dict[str, Dict[str, int]]:
+    stats = {
+        "detect_misaligned": MISALIGNED_CACHE.stats(),
+        "layout": LAYOUT_CACHE.stats(),
+    }
+    if _DISK_CACHE is not None:
+        stats["disk"] = _DISK_CACHE.stats()
+    return stats
+
+
+def cache_stats_delta(
+    before: Dict[str, Dict[str, int]], after: Dict[str, Dict[str, int]]
+) -> Dict[str, Dict[str, int]]:
+    """Counter increase between two `scoring_cache_stats()` snapshots."""
+    return {
+        name: {field: value - before.get(name, {}).get(field, 0) for field, value in counters.items()}
+        for name, counters in after.items()
+    }
+
+
+def merge_cache_stats(total: Dict[str, Dict[str, int]], delta: Dict[str, Dict[str, int]]) -> None:
+    """Add `delta` (a `scoring_cache_stats()`-shaped dict) into `total` in place."""
+    for name, counters in delta.items():
+        merged = total.setdefault(name, {})
+        for field, value in counters.items():
+            merged[field] = merged.get(field, 0) + value
+
+
+def cache_hit_rate(stats: Dict[str, Dict[str, int]]) -> float:
+    """
+    Share of in-memory cache lookups answered without running the checker:
+    LRU hits plus LRU misses that the disk cache served.
+    """
+    memory = [stats.get(name, {}) for name in ("detect_misaligned", "layout")]
+    lookups = sum(counters.get("hits", 0) + counters.get("misses", 0) for counters in memory)
+    served = sum(counters.get("hits", 0) for counters in memory) + stats.get("disk", {}).get("hits", 0)
+    return served / lookups if lookups else 0.0
+
+
+def _through_disk(kind: str, key: str, version: str, compute: Callable[[], Any]) -> Any:
+    if _DISK_CACHE is None:
+        return compute()
+    value = _DISK_CACHE.get(kind, key, version)
+    if value is None:
+        value = compute()
+        _DISK_CACHE.put(kind, key, version, value)
+    return value
+
+
+def cached_detect_misaligned(diagram: str, require_at_least_one_rect: bool = True) -> Dict[str, int]:
+    """
+    `detect_misaligned` behind the shared LRU cache.
+
+    The checker only looks at relative positions of structural glyphs, so
+    diagrams that differ by indentation, trailing spaces or surrounding blank
+    lines share one entry.
+    """
+    canonical = canonicalize_diagram(diagram)
+    key = f"{canonical.key}:{int(require_at_least_one_rect)}"
+    stats = MISALIGNED_CACHE.get_or_compute(
+        key,
+        lambda: _through_disk(
+            "detect_misaligned",
+            key,
+            checker_version(),
+            lambda: detect_misaligned_grid(canonical.grid(), require_at_least_one_rect),
+        ),
+    )
+    return dict(stats)
+
+
+def cached_layout_centers(
+    diagram: str,
+    compute_centers: Callable[[List[List[str]]], List[float]],
+) -> tuple[List[float], int]:
+    """
+    Return (box centers, grid width) in the coordinates of `normalize_grid(diagram)`.
+
+    Centers are cached relative to the canonical grid and shifted back by the
+    removed indentation, so indented duplicates hit the same entry.
+    """
+    canonical = canonicalize_diagram(diagram)
+    if compute_centers not in _LAYOUT_VERSIONS:
+        _LAYOUT_VERSIONS[compute_centers] = layout_version(compute_centers)
+    version = _LAYOUT_VERSIONS[compute_centers]
+    centers = LAYOUT_CACHE.get_or_compute(
+        canonical.key,
+        lambda: _through_disk("layout", canonical.key, version, lambda: compute_centers(canonical.grid())),
+    )
+    return [center + canonical.offset for center in centers], canonical.width
@@ -0,0 +1,455 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from multiprocessing.connection import Connection
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Mapping
+
+from scoring_cache import cache_hit_rate, cache_stats_delta, merge_cache_stats
+
+ScoreFn = Callable[..., Dict[str, float]]
+CacheStatsFn = Callable[[], Dict[str, Dict[str, int]]]
+
+EXECUTOR_KINDS = ("none", "thread", "process")
+
+TIMEOUT_METRIC = "scoring_timeout"
+SAMPLED_METRIC = "diagnostics_sampled"
+CACHE_HIT_METRIC = "score_cache_hit_rate"
+
+# Rollouts whose bundled scores are kept while the rubric walks its functions.
+_PENDING_LIMIT = 4096
+
+logger = logging.getLogger("verifiers.ascii_align.scoring_pool")
+
+
+class ScoringTimeout(Exception):
+    """A scoring job exceeded its deadline and its worker was killed."""
+
+
+def _default_workers() -> int:
+    return max(1, min(8, (os.cpu_count() or 1) - 1))
+
+
+def sample_unit(rollout_id: str) -> float:
+    """Deterministic value in [0, 1) for a rollout id, used for metric sampling."""
+    digest = hashlib.blake2b(rollout_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2.0**64
+
+
+def _slim_completion(completion) -> list[dict[str, str]]:
+    # Only the final message is scored; avoid pickling the whole transcript.
+    if isinstance(completion, str):
+        return [{"role": "assistant", "content": completion}]
+    message = completion[-1]
+    return [{"role": message.get("role", "assistant"), "content": message.get("content") or ""}]
+
+
+def _worker_main(
+    conn: Connection,
+    score_fn: ScoreFn,
+    initializer: Callable[..., None] | None,
+    initargs: tuple,
+    cache_stats_fn: CacheStatsFn | None = None,
+) -> None:
+    if initializer is not None:
+        initializer(*initargs)
+    while True:
+        try:
+            args = conn.recv()
+        except EOFError:
+            return
+        try:
+            before = cache_stats_fn() if cache_stats_fn is not None else {}
+            scores = score_fn(*args)
+            # Each worker runs one job at a time, so the delta is this job's alone.
+            delta = cache_stats_delta(before, cache_stats_fn()) if cache_stats_fn is not None else {}
+            conn.send(("ok", (scores, delta)))
+        except Exception as e:  # reported back to the caller, worker stays alive
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class _IsolatedWorker:
+    """One scoring process behind a pipe; killed and replaced on timeout."""
+
+    def __init__(self, ctx, score_fn: ScoreFn, initializer, initargs: tuple, cache_stats_fn=None) -> None:
+        self._ctx = ctx
+        self._target_args = (score_fn, initializer, initargs, cache_stats_fn)
+        self._start()
+
+    def _start(self) -> None:
+        self.conn, child_conn = self._ctx.Pipe()
+        self.process = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, *self._target_args),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    def call(self, args: tuple, timeout: float | None) -> tuple[Dict[str, float], Dict[str, Dict[str, int]]]:
+        try:
+            self.conn.send(args)
+            if not self.conn.poll(timeout):
+                self.restart()
+                raise ScoringTimeout(f"scoring exceeded {timeout}s")
+            status, payload = self.conn.recv()
+        except (EOFError, BrokenPipeError, ConnectionResetError) as e:
+            self.restart()
+            raise RuntimeError(f"scoring worker died: {e}") from e
+        if status != "ok":
+            raise RuntimeError(payload)
+        return payload
+
+    def restart(self) -> None:
+        self.close()
+        self._start()
+
+    def close(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class _IsolatedProcessPool:
+    """
+    Fixed set of single-job worker processes.
+
+    Unlike `ProcessPoolExecutor`, a job that overruns its deadline can be
+    stopped: its worker is killed and a fresh one takes its place, so one
+    pathological diagram cannot hold a slot for the rest of the batch.
+    The workers' scoring cache counters are summed in `cache_stats`.
+    """
+
+    def __init__(
+        self,
+        score_fn: ScoreFn,
+        max_workers: int,
+        initializer,
+        initargs: tuple,
+        cache_stats_fn: CacheStatsFn | None = None,
+    ) -> None:
+        ctx = multiprocessing.get_context("spawn")
+        self.cache_stats: Dict[str, Dict[str, int]] = {}
+        self._stats_lock = threading.Lock()
+        self._idle: queue.Queue[_IsolatedWorker] = queue.Queue()
+        self._workers = [
+            _IsolatedWorker(ctx, score_fn, initializer, initargs, cache_stats_fn) for _ in range(max_workers)
+        ]
+        for worker in self._workers:
+            self._idle.put(worker)
+        # Blocking pipe waits happen on these threads, never on the event loop.
+        self.dispatch = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ascii-align-dispatch")
+
+    def run(self, args: tuple, timeout: float | None) -> Dict[str, float]:
+        worker = self._idle.get()
+        try:
+            scores, delta = worker.call(args, timeout)
+        finally:
+            self._idle.put(worker)
+        with self._stats_lock:
+            merge_cache_stats(self.cache_stats, delta)
+        return scores
+
+    def shutdown(self) -> None:
+        self.dispatch.shutdown(wait=False, cancel_futures=True)
+        for worker in self._workers:
+            worker.close()
+
+
+class ScoringPool:
+    """
+    Runs a bundled scoring function off the event loop.
+
+    The rubric calls one function per metric; the first call for a rollout
+    submits a single job that computes every metric at once, and the other
+    metric functions await the same result. `max_concurrency` bounds how many
+    jobs are in flight so scoring cannot starve generation of CPU.
+
+    With a `timeout`, a job that overruns gets `timeout_scores` plus
+    `scoring_timeout=1.0`, and its diagram is appended to
+    `capture_dir/timeouts.jsonl`. The timeout runs from when a worker
+    starts the job, not from submission. Only the "process" executor can
+    actually stop the job; with "thread" the overrunning job is abandoned.
+
+    `diagnostic_names` are zero-weight metrics that are only computed for a
+    `diagnostic_sample_rate` fraction of rollouts; the rest report 0.0, and
+    `diagnostics_sampled` (1.0 or 0.0) says which. With
+    `skip_diagnostics_under_pressure`, jobs submitted while every slot is
+    busy skip diagnostics too. The rubric gets sampled values divided by
+    the share of rollouts submitted so far that compute diagnostics, so its
+    means stay unbiased whatever the rate and load; `on_scores` and
+    `on_rollout` get the raw values (what the rollout store keeps), which
+    `diagnostic_means` averages over the sampled rows. Skipping saves
+    little: the diagnostics read the same cached `detect_misaligned` stats
+    as the weighted rewards.
+
+    With `cache_stats_fn` (e.g. `scoring_cache_stats`), the scoring cache
+    counters of whichever process scores are read: "process" workers send
+    theirs back with every result, and `cache_stats()` sums them. Every
+    result then also carries `score_cache_hit_rate`, the pool's hit rate
+    so far (`scoring_cache.cache_hit_rate`).
+
+    `on_scores(info, scores)` is called in this process for every rollout
+    that finished scoring (not for timeouts). `on_rollout(state, scores,
+    scoring_ms)` is called once per rollout scored through `score_rollout`,
+    timeouts included, with the time from submission to result; errors it
+    raises are logged and do not fail scoring.
+    """
+
+    def __init__(
+        self,
+        score_fn: ScoreFn,
+        executor: str = "process",
+        max_workers: int | None = None,
+        max_concurrency: int | None = None,
+        initializer: Callable[..., None] | None = None,
+        initargs: tuple = (),
+        timeout: float | None = None,
+        timeout_scores: Dict[str, float] | None = None,
+        capture_dir: str | os.PathLike | None = None,
+        diagnostic_names: List[str] | None = None,
+        diagnostic_sample_rate: float = 1.0,
+        skip_diagnostics_under_pressure: bool = False,
+        on_scores: Callable[[dict | None, Dict[str, float]], None] | None = None,
+        on_rollout: Callable[[dict, Dict[str, float], float], None] | None = None,
+        cache_stats_fn: CacheStatsFn | None = None,
+    ) -> None:
+        if executor not in EXECUTOR_KINDS:
+            raise ValueError(f"executor must be one of {EXECUTOR_KINDS}, got {executor!r}")
+        if not 0.0 <= diagnostic_sample_rate <= 1.0:
+            raise ValueError(f"diagnostic_sample_rate must be in [0, 1], got {diagnostic_sample_rate}")
+        self.score_fn = score_fn
+        self.executor_kind = executor
+        self.max_workers = max_workers or _default_workers()
+        self.max_concurrency = max_concurrency or 2 * self.max_workers
+        self.initializer = initializer
+        self.initargs = initargs
+        self.timeout = timeout
+        self.timeout_scores = dict(timeout_scores or {})
+        self.capture_dir = Path(capture_dir) if capture_dir else None
+        self.timeouts = 0
+        self.diagnostic_names = list(diagnostic_names or [])
+        self.diagnostic_sample_rate = diagnostic_sample_rate
+        self.skip_diagnostics_under_pressure = skip_diagnostics_under_pressure
+        self.diagnostics_skipped = 0
+        # Rollouts submitted and how many of them were set to compute diagnostics.
+        self._diagnostic_counts = [0, 0]
+        self.on_scores = on_scores
+        self.on_rollout = on_rollout
+        self.cache_stats_fn = cache_stats_fn
+        self._executor: Executor | _IsolatedProcessPool | None = None
+        self._executor_lock = threading.Lock()
+        self._semaphores: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+        self._pending: OrderedDict[str, asyncio.Future] = OrderedDict()
+
+    def _get_executor(self) -> Executor | _IsolatedProcessPool | None:
+        # Created lazily so the environment can be pickled/forked before use.
+        if self.executor_kind == "none":
+            return None
+        with self._executor_lock:
+            if self._executor is None:
+                if self.executor_kind == "thread":
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="ascii-align-score",
+                        initializer=self.initializer,
+                        initargs=self.initargs,
+                    )
+                else:
+                    self._executor = _IsolatedProcessPool(
+                        self.score_fn,
+                        self.max_workers,
+                        self.initializer,
+                        self.initargs,
+                        self.cache_stats_fn,
+                    )
+            return self._executor
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphores[loop]
+
+    async def _run(self, completion, info: dict | None, diagnostics: bool) -> Dict[str, float]:
+        executor = self._get_executor()
+        if executor is None:
+            return self.score_fn(completion, info, diagnostics)
+        loop = asyncio.get_running_loop()
+        args = (_slim_completion(completion), info, diagnostics)
+        if isinstance(executor, _IsolatedProcessPool):
+            return await loop.run_in_executor(executor.dispatch, executor.run, args, self.timeout)
+        if self.timeout is None:
+            return await loop.run_in_executor(executor, self.score_fn, *args)
+        # As with the process pool, the timeout runs from when a worker picks
+        # the job up, so time spent queued behind other jobs does not count.
+        started = loop.create_future()
+
+        def call() -> Dict[str, float]:
+            loop.call_soon_threadsafe(lambda: started.done() or started.set_result(None))
+            return self.score_fn(*args)
+
+        job = loop.run_in_executor(executor, call)
+        await asyncio.wait([started, job], return_when=asyncio.FIRST_COMPLETED)
+        try:
+            return await asyncio.wait_for(job, self.timeout)
+        except asyncio.TimeoutError as e:
+            raise ScoringTimeout(f"scoring exceeded {self.timeout}s") from e
+
+    def _wants_diagnostics(self, rollout_id: str | None) -> bool:
+        if not self.diagnostic_names:
+            return True
+        if self.skip_diagnostics_under_pressure and self._semaphore().locked():
+            self.diagnostics_skipped += 1
+            return False
+        if self.diagnostic_sample_rate >= 1.0:
+            return True
+        if rollout_id is None:
+            return False
+        return sample_unit(rollout_id) < self.diagnostic_sample_rate
+
+    async def score(self, completion, info: dict | None = None, rollout_id: str | None = None) -> Dict[str, float]:
+        """Every metric of one completion, with diagnostics scaled for the rubric."""
+        return self._for_rubric(await self._score_raw(completion, info, rollout_id))
+
+    def _for_rubric(self, scores: Dict[str, float]) -> Dict[str, float]:
+        scored, sampled = self._diagnostic_counts
+        if not scores.get(SAMPLED_METRIC) or not self.diagnostic_names or sampled >= scored:
+            return scores
+        share = sampled / scored
+        return {**scores, **{name: scores[name] / share for name in self.diagnostic_names}}
+
+    async def _score_raw(self, completion, info: dict | None, rollout_id: str | None) -> Dict[str, float]:
+        diagnostics = self._wants_diagnostics(rollout_id)
+        self._diagnostic_counts[0] += 1
+        self._diagnostic_counts[1] += int(diagnostics)
+        async with self._semaphore():
+            try:
+                scores = await self._run(completion, info, diagnostics)
+            except ScoringTimeout:
+                self.timeouts += 1
+                self._capture_timeout(completion, info)
+                scores = {**self.timeout_scores, SAMPLED_METRIC: 0.0, TIMEOUT_METRIC: 1.0}
+                if self.cache_stats_fn is not None:
+                    scores[CACHE_HIT_METRIC] = cache_hit_rate(self.cache_stats())
+                return scores
+
+        scores = dict(scores)
+        for name in self.diagnostic_names:
+            if not diagnostics or name not in scores:
+                scores[name] = 0.0
+        scores[SAMPLED_METRIC] = float(diagnostics)
+        scores[TIMEOUT_METRIC] = 0.0
+        if self.cache_stats_fn is not None:
+            scores[CACHE_HIT_METRIC] = cache_hit_rate(self.cache_stats())
+        if self.on_scores is not None:
+            self.on_scores(info, scores)
+        return scores
+
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Scoring cache counters of the processes this pool scores in ({} without `cache_stats_fn`)."""
+        if self.cache_stats_fn is None:
+            return {}
+        if self.executor_kind != "process":
+            return self.cache_stats_fn()
+        executor = self._executor
+        if not isinstance(executor, _IsolatedProcessPool):
+            return {}
+        with executor._stats_lock:
+            return {name: dict(counters) for name, counters in executor.cache_stats.items()}
+
+    def _capture_timeout(self, completion, info: dict | None) -> None:
+        logger.warning(f"Scoring timed out after {self.timeout}s ({self.timeouts} total)")
+        if self.capture_dir is None:
+            return
+        record: Dict[str, Any] = {
+            "time": time.time(),
+            "timeout": self.timeout,
+            "content": _slim_completion(completion)[-1]["content"],
+            "info": info,
+        }
+        self.capture_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.capture_dir / "timeouts.jsonl", "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+    async def score_rollout(self, completion, info: dict | None = None, state: dict | None = None) -> Dict[str, float]:
+        """Score once per rollout, sharing the result across metric functions."""
+        rollout_id = state.get("trajectory_id") if state is not None else None
+        if rollout_id is None:
+            return await self.score(completion, info)
+
+        future = self._pending.get(rollout_id)
+        if future is None:
+            future = asyncio.ensure_future(self._score_and_report(completion, info, state, rollout_id))
+            self._pending[rollout_id] = future
+            while len(self._pending) > _PENDING_LIMIT:
+                self._pending.popitem(last=False)
+        # Shield so a cancelled metric call does not cancel the shared job.
+        return await asyncio.shield(future)
+
+    async def _score_and_report(self, completion, info: dict | None, state: dict, rollout_id: str) -> Dict[str, float]:
+        start = time.perf_counter()
+        scores = await self._score_raw(completion, info, rollout_id)
+        if self.on_rollout is not None:
+            try:
+                self.on_rollout(state, scores, (time.perf_counter() - start) * 1000)
+            except Exception:
+                logger.exception("on_rollout failed for rollout %s", rollout_id)
+        return self._for_rubric(scores)
+
+    def shutdown(self) -> None:
+        with self._executor_lock:
+            if isinstance(self._executor, _IsolatedProcessPool):
+                self._executor.shutdown()
+            elif self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._pending.clear()
+
+
+def diagnostic_means(rows: Iterable[Mapping[str, Any]], names: Iterable[str]) -> Dict[str, float | None]:
+    """
+    Mean of each diagnostic over the rows (scores or stored rollouts) that
+    computed it, i.e. with `diagnostics_sampled` set; None if none did.
+    """
+    names = list(names)
+    totals = dict.fromkeys(names, 0.0)
+    sampled = 0
+    for row in rows:
+        if not row.get(SAMPLED_METRIC):
+            continue
+        sampled += 1
+        for name in names:
+            totals[name] += row[name]
+    return {name: totals[name] / sampled if sampled else None for name in names}
+
+
+def async_reward_funcs(names: List[str], pool: ScoringPool) -> List[Callable[..., Awaitable[float]]]:
+    """
+    Async metric functions that read from the pool's bundled scores.
+
+    Each wrapper is named after its metric so rubric metric names (and W&B
+    charts) match the synchronous reward functions.
+    """
+
+    def make(name: str) -> Callable[..., Awaitable[float]]:
+        async def reward(completion, info=None, state=None) -> float:
+            scores = await pool.score_rollout(completion, info, state)
+            return scores[name]
+
+        reward.__name__ = name
+        reward.__qualname__ = name
+        return reward
+
+    return [make(name) for name in names]
@@ -0,0 +1,375 @@
+from __future__ import annotations
+
+import hashlib
+import inspect
+import logging
+import os
+import shutil
+import tempfile
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Collection, Dict, List, Mapping, Sequence
+
+import data
+from data import generate_prompts
+from dedup import capped_members, minhash_signature, near_duplicate_clusters, shingles
+from layout_spec import layout_spec
+from prompt_order import batch_prefix_ratios, prefix_grouped_order, render_prompt
+from scoring_cache import _fingerprint
+from stratify import shape_budget_bucket, stratified_order, stratum_key, stratum_weight
+from token_budget import TokenBudgetModel
+
+DATASET_NAME = "13point5/tldraw-vf-env"
+
+SPLIT_METHODS = ("shuffle", "hash")
+# Files that make up a local source; anything else in its directory (e.g.
+# `cache-*.arrow` files other tools' `map` calls leave there) is ignored.
+SOURCE_FILE_PATTERNS = ("state.json", "dataset_info.json", "dataset_dict.json", "data-*.arrow", "*.parquet")
+
+logger = logging.getLogger("verifiers.ascii_align.splits")
+
+
+def load_source_dataset(dataset_path: str | None = None, synthetic_examples: int = 0, synthetic_seed: int = 0):
+    """
+    Raw train split, from the hub, from a local copy, or generated; only the hub needs network access.
+
+    `dataset_path` may be a `save_to_disk` directory (e.g. from
+    `load_dataset(DATASET_NAME, split="train").save_to_disk(path)`), a single
+    `.arrow` file, or a `.parquet` file/directory. Arrow data is memory-mapped
+    rather than read into RAM. With `synthetic_examples`, rows come from
+    `data.generate_prompts` instead.
+    """
+    import datasets
+
+    if synthetic_examples > 0:
+        if dataset_path:
+            raise ValueError("dataset_path and synthetic_examples are mutually exclusive")
+        return datasets.Dataset.from_list(generate_prompts(synthetic_examples, seed=synthetic_seed))
+    if not dataset_path:
+        return datasets.load_dataset(DATASET_NAME, split="train")
+
+    path = Path(dataset_path).expanduser()
+    if path.is_dir() and ((path / "state.json").exists() or (path / "dataset_dict.json").exists()):
+        dataset = datasets.load_from_disk(str(path))
+        return dataset["train"] if isinstance(dataset, datasets.DatasetDict) else dataset
+    if path.suffix == ".arrow":
+        return datasets.Dataset.from_file(str(path))
+    if path.suffix == ".parquet" or path.is_dir():
+        files = sorted(str(f) for f in path.glob("*.parquet")) if path.is_dir() else str(path)
+        if not files:
+            raise FileNotFoundError(f"No parquet files found in {path}")
+        return datasets.Dataset.from_parquet(files)
+    raise ValueError(f"Unsupported dataset_path {dataset_path!r}: expected a save_to_disk directory, .arrow or .parquet")
+
+
+def source_identity(dataset_path: str | None = None, synthetic_examples: int = 0, synthetic_seed: int = 0) -> str:
+    """
+    Cheap identity of the source data, computed without opening it.
+
+    Local sources are identified by path, size and mtime of their data and
+    metadata files (`SOURCE_FILE_PATTERNS`), and generated ones by their
+    settings and the generator's source. The hub
+    source is identified by name only, so prepared splits cached from it
+    must be cleared by hand after the hub dataset changes.
+    """
+    if synthetic_examples > 0:
+        return f"synthetic:{synthetic_examples}:{synthetic_seed}:{_fingerprint(inspect.getsource(data))}"
+    if not dataset_path:
+        return f"hub:{DATASET_NAME}"
+    path = Path(dataset_path).expanduser().resolve()
+    if path.is_dir():
+        files = sorted({f for pattern in SOURCE_FILE_PATTERNS for f in path.rglob(pattern) if f.is_file()})
+    else:
+        files = [path]
+    return f"local:{path}:" + ",".join(
+        f"{f.relative_to(path) if f != path else f.name}:{f.stat().st_size}:{f.stat().st_mtime_ns}" for f in files
+    )
+
+
+def split_indices(num_rows: int, test_size: float, seed: int) -> tuple[List[int], List[int]]:
+    """Source row indices of the train/eval splits (same as `train_test_split` on the data itself)."""
+    import datasets
+
+    # The split permutation only depends on the row count and seed, so split
+    # a tiny index table instead of rewriting the data.
+    index = datasets.Dataset.from_dict({"source_index": list(range(num_rows))})
+    split = index.train_test_split(test_size=test_size, seed=seed, shuffle=True)
+    return split["train"]["source_index"], split["test"]["source_index"]
+
+
+def _hash_unit(*parts: str) -> float:
+    digest = hashlib.blake2b("\0".join(parts).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2.0**64
+
+
+def hash_split_indices(prompts: Sequence[str], test_size: float, seed: int) -> tuple[List[int], List[int]]:
+    """
+    Source row indices of the train/eval splits, decided row by row from a hash of the prompt.
+
+    A row lands in eval when its hash falls below `test_size`, and rows are
+    ordered by a second hash, so adding, removing or reordering source rows
+    never moves any other prompt between splits or changes their relative
+    order. Identical prompts always share a split.
+    """
+    if not 0.0 <= test_size < 1.0:
+        raise ValueError(f"test_size must be a fraction in [0, 1) for hash splits, got {test_size}")
+    train_rows: List[int] = []
+    eval_rows: List[int] = []
+    for index, prompt in enumerate(prompts):
+        rows = eval_rows if _hash_unit(str(seed), "split", prompt) < test_size else train_rows
+        rows.append(index)
+
+    def order(index: int) -> tuple[float, int]:
+        return _hash_unit(str(seed), "order", prompts[index]), index
+
+    return sorted(train_rows, key=order), sorted(eval_rows, key=order)
+
+
+def env_rows_batch(
+    batch: Dict[str, List[Any]],
+    indices: List[int],
+    source_indices: Sequence[int],
+    budget_model: TokenBudgetModel,
+    train: bool,
+    shard_index: int = 0,
+    num_shards: int = 1,
+) -> Dict[str, List[Any]]:
+    """
+    Turn a batch of source rows into env rows (`prompt` messages plus a compact `info`).
+
+    `indices` are positions in the shard being built; `source_indices` maps
+    them back to source rows. Train rows record their global train position
+    as `train_order_index` so runs/resumes can be compared in the web app.
+    """
+    columns = list(batch)
+    prompts: List[Any] = []
+    infos: List[Dict[str, Any]] = []
+    for offset, idx in enumerate(indices):
+        row = {column: batch[column][offset] for column in columns}
+        # convert prompt into an array with one user message object
+        row["prompt"] = [{"role": "user", "content": row["prompt"]}]
+        # Only ids and what scoring/generation need; `info` travels with every
+        # rollout, so the prompt and other source columns stay out of it.
+        info = {
+            # Keep a stable ID tied to original dataset row order.
+            "source_index": source_indices[idx],
+            "theme": row.get("theme"),
+            "shape_budget": row.get("shape_budget"),
+            "max_tokens": budget_model.budget(row.get("theme"), row.get("shape_budget")),
+            "layout": layout_spec(row.get("theme"), row.get("shape_budget")),
+        }
+        if train:
+            info["train_order_index"] = shard_index + idx * num_shards
+        prompts.append(row["prompt"])
+        infos.append(info)
+    return {"prompt": prompts, "info": infos}
+
+
+# Code whose output ends up in prepared splits; editing any of it changes
+# the cache key, so stale prepared splits are never loaded.
+_PREPARE_DEPENDENCIES = (
+    split_indices,
+    hash_split_indices,
+    _hash_unit,
+    env_rows_batch,
+    prefix_grouped_order,
+    TokenBudgetModel.budget,
+    layout_spec,
+    shingles,
+    minhash_signature,
+    near_duplicate_clusters,
+    capped_members,
+    shape_budget_bucket,
+    stratum_key,
+    stratum_weight,
+    stratified_order,
+)
+
+
+def prepared_splits_key(
+    dataset_path: str | None,
+    budget_model: TokenBudgetModel,
+    synthetic_examples: int = 0,
+    synthetic_seed: int = 0,
+    **params: Any,
+) -> str:
+    sources = [inspect.getsource(func) for func in _PREPARE_DEPENDENCIES]
+    settings = [f"{name}={params[name]!r}" for name in sorted(params)]
+    source = source_identity(dataset_path, synthetic_examples, synthetic_seed)
+    return _fingerprint(*sources, source, repr(sorted(asdict(budget_model).items())), *settings)
+
+
+def prepare_splits(
+    dataset_path: str | None = None,
+    budget_model: TokenBudgetModel | None = None,
+    max_examples: int = -1,
+    test_size: float = 0.2,
+    seed: int = 42,
+    split_method: str = "shuffle",
+    prefix_group_size: int = 0,
+    prefix_batch_size: int = 32,
+    system_prompt: str | None = None,
+    shard_index: int = 0,
+    num_shards: int = 1,
+    cache_dir: str | os.PathLike | None = None,
+    num_proc: int | None = None,
+    skip_train: Collection[int] | None = None,
+    near_duplicate_threshold: float | None = None,
+    near_duplicate_cap: int = 1,
+    eval_stratify: bool = False,
+    eval_stratum_weights: Mapping[str, float] | None = None,
+    eval_examples: int = -1,
+    synthetic_examples: int = 0,
+    synthetic_seed: int = 0,
+):
+    """
+    Build this shard's (train, eval) env datasets.
+
+    Split and order are computed on the full source index first, so every
+    shard agrees on membership and train order; only the shard's own rows are
+    then selected and converted, in one batched `map` with a deterministic
+    fingerprint. Before sharding:
+    - `split_method` is "shuffle" (`train_test_split`, the original
+      behaviour) or "hash" (`hash_split_indices`)
+    - with `near_duplicate_threshold`, prompts are clustered by shingle
+      Jaccard similarity and each cluster keeps only its `near_duplicate_cap`
+      lowest-`source_index` members, in either split
+    - with `eval_stratify`, eval rows are reordered so every prefix is a
+      theme/shape-budget stratified sample (`stratified_order`), and
+      `eval_examples` keeps only the first N eval rows
+    - train rows whose `source_index` is in `skip_train` are dropped (eval
+      keeps them)
+
+    With `cache_dir`, the result is saved under a key of the source identity,
+    every setting and the preparation code, and later calls with the same key
+    load it memory-mapped without touching the source.
+    """
+    import datasets
+
+    if split_method not in SPLIT_METHODS:
+        raise ValueError(f"split_method must be one of {SPLIT_METHODS}, got {split_method!r}")
+    budget_model = budget_model or TokenBudgetModel()
+    key = prepared_splits_key(
+        dataset_path,
+        budget_model,
+        synthetic_examples=synthetic_examples,
+        synthetic_seed=synthetic_seed,
+        max_examples=max_examples,
+        test_size=test_size,
+        seed=seed,
+        split_method=split_method,
+        skip_train=_fingerprint(*map(str, sorted(skip_train or ()))),
+        near_duplicate_threshold=near_duplicate_threshold,
+        near_duplicate_cap=near_duplicate_cap,
+        eval_stratify=eval_stratify,
+        eval_stratum_weights=sorted((eval_stratum_weights or {}).items()),
+        eval_examples=eval_examples,
+        prefix_group_size=prefix_group_size,
+        shard_index=shard_index,
+        num_shards=num_shards,
+    )
+    target = Path(cache_dir).expanduser() / f"splits-{key}" if cache_dir else None
+    if target is not None and (target / "dataset_dict.json").exists():
+        logger.info(f"Loading prepared splits from {target}")
+        prepared = datasets.load_from_disk(str(target))
+        return prepared["train"], prepared["eval"]
+
+    source = load_source_dataset(dataset_path, synthetic_examples, synthetic_seed)
+    num_rows = len(source) if max_examples <= 0 else min(max_examples, len(source))
+    source_prompts = None
+    if split_method == "hash" or near_duplicate_threshold:
+        source_prompts = source.select(range(num_rows))["prompt"]
+    if split_method == "hash":
+        train_rows, eval_rows = hash_split_indices(source_prompts, test_size, seed)
+    else:
+        train_rows, eval_rows = split_indices(num_rows, test_size, seed)
+    if near_duplicate_threshold:
+        clusters = near_duplicate_clusters(source_prompts, near_duplicate_threshold)
+        kept = capped_members(clusters, near_duplicate_cap)
+        logger.info(
+            f"Near-duplicate prompts: {len(set(clusters))} clusters among {num_rows} rows, "
+            f"keeping {len(kept)} (at most {near_duplicate_cap} per cluster)"
+        )
+        train_rows = [index for index in train_rows if index in kept]
+        eval_rows = [index for index in eval_rows if index in kept]
+    if eval_stratify:
+        selected = source.select(eval_rows, keep_in_memory=True)
+        themes = selected["theme"] if "theme" in selected.column_names else [None] * len(eval_rows)
+        budgets = selected["shape_budget"] if "shape_budget" in selected.column_names else [None] * len(eval_rows)
+        keys = [stratum_key(theme, budget) for theme, budget in zip(themes, budgets)]
+        eval_rows = [eval_rows[i] for i in stratified_order(keys, eval_stratum_weights)]
+        logger.info(f"Stratified {len(eval_rows)} eval examples over {len(set(keys))} theme/shape-budget strata")
+    if eval_examples > 0:
+        eval_rows = eval_rows[:eval_examples]
+    if skip_train:
+        before = len(train_rows)
+        train_rows = [index for index in train_rows if index not in skip_train]
+        logger.info(f"Skipping {before - len(train_rows)} of {before} train examples")
+
+    if prefix_group_size > 1:
+        selected = source.select(train_rows, keep_in_memory=True)
+        prompts = selected["prompt"]
+        themes = selected["theme"] if "theme" in selected.column_names else [None] * len(selected)
+        keys = [(str(theme or ""), prompt) for theme, prompt in zip(themes, prompts)]
+        order = prefix_grouped_order(keys, prefix_group_size)
+        train_rows = [train_rows[i] for i in order]
+
+        before = batch_prefix_ratios([render_prompt(p, system_prompt) for p in prompts], prefix_batch_size)
+        after = batch_prefix_ratios([render_prompt(prompts[i], system_prompt) for i in order], prefix_batch_size)
+        logger.info(
+            f"Shared-prefix token ratio per {prefix_batch_size}-example batch: "
+            f"{sum(before) / len(before):.3f} -> {sum(after) / len(after):.3f} after grouping"
+        )
+
+    # Strided shards: shard k holds global positions k, k + n, k + 2n, ...
+    train_rows = train_rows[shard_index::num_shards]
+    eval_rows = eval_rows[shard_index::num_shards]
+
+    # `map` output never goes next to the source (a local source directory
+    # would otherwise collect cache files): it is written to a scratch
+    # directory under `cache_dir` and dropped once saved, or kept in memory.
+    workdir = None
+    if target is not None:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        workdir = Path(tempfile.mkdtemp(prefix=".work-", dir=target.parent))
+
+    def to_env_rows(rows: List[int], name: str):
+        selected = source.select(rows, keep_in_memory=True)
+        return selected.map(
+            env_rows_batch,
+            batched=True,
+            with_indices=True,
+            fn_kwargs={
+                "source_indices": rows,
+                "budget_model": budget_model,
+                "train": name == "train",
+                "shard_index": shard_index,
+                "num_shards": num_shards,
+            },
+            remove_columns=selected.column_names,
+            num_proc=num_proc if num_proc and num_proc > 1 and len(rows) > num_proc else None,
+            new_fingerprint=_fingerprint(key, name),
+            keep_in_memory=workdir is None,
+            cache_file_name=str(workdir / f"{name}.arrow") if workdir is not None else None,
+            desc=f"Preparing {name} rows",
+        )
+
+    train_dataset = to_env_rows(train_rows, "train")
+    eval_dataset = to_env_rows(eval_rows, "eval")
+    if target is None:
+        return train_dataset, eval_dataset
+
+    # Write next to the target and rename, so concurrent starts never see a
+    # half-written directory.
+    staging = Path(tempfile.mkdtemp(prefix=f".{target.name}-", dir=target.parent))
+    try:
+        datasets.DatasetDict({"train": train_dataset, "eval": eval_dataset}).save_to_disk(str(staging))
+        os.rename(staging, target)
+    except OSError:
+        # Another process finished first; its copy is identical.
+        shutil.rmtree(staging, ignore_errors=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    logger.info(f"Saved prepared splits to {target}")
+    prepared = datasets.load_from_disk(str(target))
+    return prepared["train"], prepared["eval"]
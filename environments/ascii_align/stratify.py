@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Mapping, Sequence
+
+# Upper bounds of the shape budget buckets; budgets above the last one share
+# the final bucket.
+SHAPE_BUDGET_BUCKETS = (4, 9, 15)
+
+
+def shape_budget_bucket(shape_budget: Any) -> str:
+    try:
+        value = int(shape_budget)
+    except (TypeError, ValueError):
+        return "unknown"
+    lower = 1
+    for upper in SHAPE_BUDGET_BUCKETS:
+        if value <= upper:
+            return f"{lower}-{upper}"
+        lower = upper + 1
+    return f"{lower}+"
+
+
+def stratum_key(theme: Any, shape_budget: Any) -> str:
+    return f"{str(theme or '').lower() or 'unknown'}/{shape_budget_bucket(shape_budget)}"
+
+
+def stratum_weight(key: str, weights: Mapping[str, float] | None) -> float:
+    """Weight for a "theme/bucket" key: an exact entry, else the theme's entry, else 1.0."""
+    if not weights:
+        return 1.0
+    if key in weights:
+        return float(weights[key])
+    return float(weights.get(key.split("/", 1)[0], 1.0))
+
+
+def stratified_order(keys: Sequence[str], weights: Mapping[str, float] | None = None) -> List[int]:
+    """
+    Order indices so that every prefix is a stratified sample.
+
+    Each stratum's target share is its population share times its weight
+    (renormalized); strata with weight 0 are left out. Position k goes to
+    the stratum furthest below its target after k picks (ties by key), and
+    members of a stratum keep their original relative order. The first n
+    rows therefore match the target mix as closely as n allows, which is
+    what a `num_examples = n` validation run evaluates.
+    """
+    members: Dict[str, List[int]] = {}
+    for index, key in enumerate(keys):
+        members.setdefault(key, []).append(index)
+
+    targets = {key: len(rows) * stratum_weight(key, weights) for key, rows in members.items()}
+    targets = {key: target for key, target in targets.items() if target > 0}
+    total = sum(targets.values())
+    shares = {key: target / total for key, target in targets.items()}
+
+    taken = {key: 0 for key in shares}
+    order: List[int] = []
+    remaining = sorted(shares)
+    while remaining:
+        k = len(order) + 1
+        key = max(remaining, key=lambda s: (shares[s] * k - taken[s], s))
+        order.append(members[key][taken[key]])
+        taken[key] += 1
+        if taken[key] == len(members[key]):
+            remaining.remove(key)
+    return order
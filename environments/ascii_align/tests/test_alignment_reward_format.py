@@ -1,14 +1,5 @@
-import sys
-import types
-
 import pytest
 
-
-if "verifiers" not in sys.modules:
-    sys.modules["verifiers"] = types.SimpleNamespace(Environment=object, Rubric=object, SingleTurnEnv=object)
-if "datasets" not in sys.modules:
-    sys.modules["datasets"] = types.SimpleNamespace(load_dataset=lambda *args, **kwargs: None)
-
 from ascii_align import (
     alignment_reward,
     arrow_error_metric,
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+vf = pytest.importorskip("verifiers")
+datasets = pytest.importorskip("datasets")
+openai = pytest.importorskip("openai")
+
+from ascii_align import CLOSING_FENCE_STOP, fence_stop_sampling_args, load_environment  # noqa: E402
+from ascii_align_env import AsciiAlignEnv  # noqa: E402
+from mock_server import MockCompletions, MockServer  # noqa: E402
+from response_cache import ResponseCache, request_key  # noqa: E402
+
+PROMPT = [{"role": "user", "content": "Draw 3 boxes left-to-right with arrows between them."}]
+EVAL_INFO = {"max_tokens": 40}
+TRAIN_INFO = {"max_tokens": 40, "train_order_index": 0}
+
+
+class CountingCompletions(MockCompletions):
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.bodies = []
+
+    def complete(self, body):
+        self.bodies.append(body)
+        return super().complete(body)
+
+
+@pytest.fixture
+def server():
+    server = MockServer(CountingCompletions(flaw_rate=0.0)).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _env(cache=None, **kwargs) -> AsciiAlignEnv:
+    dataset = datasets.Dataset.from_list([{"prompt": PROMPT, "info": EVAL_INFO}])
+    return AsciiAlignEnv(dataset=dataset, rubric=vf.Rubric(), response_cache=cache, **kwargs)
+
+
+def _respond(env: AsciiAlignEnv, server: MockServer, info=EVAL_INFO, sampling_args=None):
+    state = {
+        "model": "mock",
+        "client": openai.AsyncOpenAI(base_url=server.base_url, api_key="mock"),
+        "oai_tools": None,
+        "sampling_args": {"seed": 1, **(sampling_args or {})},
+        "info": info,
+        "trajectory": [],
+    }
+    return asyncio.run(env.get_model_response(state, PROMPT))
+
+
+def test_responses_are_cached_and_read_back(server: MockServer, tmp_path) -> None:
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    env = _env(cache)
+    first = _respond(env, server)
+    assert len(server.completions.bodies) == 1 and len(cache) == 1
+
+    cache.reset_samples()
+    second = _respond(env, server)
+    assert len(server.completions.bodies) == 1
+    assert second.choices[0].message.content == first.choices[0].message.content
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+
+def test_replay_miss_raises_model_error(server: MockServer, tmp_path) -> None:
+    env = _env(ResponseCache(tmp_path / "responses.sqlite", replay=True))
+    with pytest.raises(vf.ModelError, match="replay"):
+        _respond(env, server)
+    assert server.completions.bodies == []
+
+
+def test_token_budget_is_sent_and_keys_the_cache(server: MockServer, tmp_path) -> None:
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    budgeted = _env(cache, per_example_max_tokens=True)
+    response = _respond(budgeted, server)
+    assert server.completions.bodies[0]["max_completion_tokens"] == EVAL_INFO["max_tokens"]
+    assert response.choices[0].finish_reason == "length"
+
+    # The unbudgeted request is a different key, so it is not served the truncated reply.
+    cache.reset_samples()
+    response = _respond(_env(cache), server)
+    assert len(server.completions.bodies) == 2
+    assert "max_completion_tokens" not in server.completions.bodies[1]
+    assert response.choices[0].finish_reason == "stop"
+
+
+def test_token_budget_lowers_a_configured_limit(server: MockServer) -> None:
+    _respond(_env(per_example_max_tokens=True), server, sampling_args={"max_tokens": 5000})
+    _respond(_env(per_example_max_tokens=True), server, sampling_args={"max_tokens": 20})
+    assert [body["max_completion_tokens"] for body in server.completions.bodies] == [EVAL_INFO["max_tokens"], 20]
+
+
+def test_token_budget_requires_a_calibration_file() -> None:
+    with pytest.raises(ValueError, match="token_budget_path"):
+        load_environment(per_example_max_tokens=True)
+
+
+def test_fence_is_restored_on_misses_and_hits(server: MockServer, tmp_path) -> None:
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    env = _env(cache)
+    # Without include_stop_str_in_output the server strips the stop string
+    # and, like vLLM, reports it as the stop_reason.
+    stop_args = {"stop": fence_stop_sampling_args()["stop"]}
+    missed = _respond(env, server, sampling_args=stop_args)
+    assert missed.choices[0].stop_reason == CLOSING_FENCE_STOP
+    assert missed.choices[0].message.content.endswith("\n```")
+
+    # The cache holds the raw reply; the repair is applied again when it is read.
+    raw = cache.get(f"{request_key('mock', PROMPT, {'seed': 1, **stop_args})}:0")
+    assert "```" not in raw["choices"][0]["message"]["content"].removeprefix("```text")
+    cache.reset_samples()
+    hit = _respond(env, server, sampling_args=stop_args)
+    assert len(server.completions.bodies) == 1
+    assert hit.choices[0].message.content == missed.choices[0].message.content
+
+
+def test_replies_that_end_inside_the_fence_are_not_repaired() -> None:
+    unclosed = "```text\n┌───┐\n│ A │\n└───┘"
+    server = MockServer(MockCompletions(recorded=[unclosed])).start()
+    try:
+        response = _respond(_env(), server, sampling_args=fence_stop_sampling_args())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert response.choices[0].finish_reason == "stop"
+    assert response.choices[0].stop_reason is None
+    assert response.choices[0].message.content == unclosed
+
+
+def test_training_rollouts_need_a_policy_version(server: MockServer, tmp_path) -> None:
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    env = _env(cache)
+    _respond(env, server, info=TRAIN_INFO)
+    _respond(env, server, info=TRAIN_INFO)
+    assert len(server.completions.bodies) == 2 and len(cache) == 0
+
+    with pytest.raises(vf.ModelError, match="policy version"):
+        _respond(_env(ResponseCache(tmp_path / "responses.sqlite", replay=True)), server, info=TRAIN_INFO)
+
+    versioned = ResponseCache(tmp_path / "responses.sqlite", policy_version="step-1")
+    env = _env(versioned)
+    _respond(env, server, info=TRAIN_INFO)
+    versioned.reset_samples()
+    _respond(env, server, info=TRAIN_INFO)
+    assert len(server.completions.bodies) == 3 and len(versioned) == 1
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import json
+import logging
+
+import pytest
+
+import alignment_check
+import ascii_align_cli
+import checker_diff
+from ascii_align import _extract_diagram, score_completion
+from checker_diff import CHECKER_PATH, CheckerDiff, checker_outputs, layout_helpers, load_checker, row_fields
+from data import generate_diagram
+from rescore import input_files, iter_records
+from scoring_cache import canonicalize_diagram
+
+# A candidate checker that stops counting connector errors.
+_LENIENT_PATCH = """
+
+_strict_detect_misaligned_grid = detect_misaligned_grid
+
+
+def detect_misaligned_grid(grid, require_at_least_one_rect=True):
+    stats = _strict_detect_misaligned_grid(grid, require_at_least_one_rect)
+    stats["misaligned"] -= stats["connector_errors"]
+    stats["connector_errors"] = 0
+    return stats
+"""
+
+
+def _write_dump(path, count: int) -> None:
+    rows = []
+    for i in range(count):
+        # Every diagram appears twice, the second time with trailing spaces.
+        diagram = generate_diagram(2 + i // 2 % 4, seed=i // 2, flaw_rate=0.4)
+        if i % 2:
+            diagram = "\n".join(line + "   " for line in diagram.splitlines())
+        rows.append({"example_id": i, "completion": f"```text\n{diagram}\n```", "info": {"shape_budget": 4}})
+    rows.append({"example_id": count, "completion": "no diagram here"})
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows), encoding="utf-8")
+
+
+def test_row_fields_match_the_rubric(tmp_path) -> None:
+    _write_dump(tmp_path / "a.jsonl", 12)
+    checker = load_checker(CHECKER_PATH.read_text(encoding="utf-8"))
+    assert checker is not alignment_check
+
+    for _, _, completion, info, _ in list(iter_records(input_files([tmp_path])))[:-1]:
+        canonical = canonicalize_diagram(_extract_diagram(completion))
+        fields = row_fields(checker_outputs(checker, canonical.lines), canonical.offset, canonical.width, info)
+        scores = score_completion(completion, info, features=True)
+        assert {name: fields[name] for name in scores if name in fields} == {
+            name: scores[name] for name in scores if name in fields
+        }
+
+
+def test_identical_checkers_report_nothing(tmp_path) -> None:
+    _write_dump(tmp_path / "a.jsonl", 10)
+    source = CHECKER_PATH.read_text(encoding="utf-8")
+    diff = CheckerDiff(source, source, workers=0)
+
+    assert list(diff.run(iter_records(input_files([tmp_path])))) == []
+    assert diff.summary()["rows"] == 11
+    assert diff.summary()["diagrams"] == 10
+    # Padded duplicates share a canonical grid and are checked once.
+    assert diff.summary()["checked"] == 5
+
+
+def test_diff_reports_changed_rows_and_reuses_cached_outputs(tmp_path) -> None:
+    dump = tmp_path / "dump"
+    dump.mkdir()
+    _write_dump(dump / "a.jsonl", 24)
+    strict = CHECKER_PATH.read_text(encoding="utf-8")
+    lenient = strict + _LENIENT_PATCH
+    cache = tmp_path / "cache.sqlite"
+
+    inline = CheckerDiff(strict, lenient, workers=0, cache_path=cache, batch_size=5, job_size=2)
+    rows = list(inline.run(iter_records(input_files([dump]))))
+    inline.close()
+    assert rows
+    for row in rows:
+        old, new, delta = row["changed"]["connector_errors"]
+        assert old > 0 and new == 0 and delta == -old
+        assert row["changed"]["misaligned"][2] == -old
+        assert row["changed"].get("reward", [0, 0, 0])[2] >= 0
+    assert any(row["changed"]["alignment_reward"][2] > 0 for row in rows if "alignment_reward" in row["changed"])
+    assert inline.summary()["changed"] == len(rows)
+    assert inline.summary()["fields"]["connector_errors"]["rows"] == len(rows)
+
+    pooled = CheckerDiff(strict, lenient, workers=2, cache_path=cache, batch_size=5, job_size=2)
+    assert list(pooled.run(iter_records(input_files([dump])))) == rows
+    pooled.close()
+    assert pooled.summary()["checked"] == 0
+
+    fresh = CheckerDiff(strict, lenient, workers=2, batch_size=7, job_size=3)
+    assert list(fresh.run(iter_records(input_files([dump])))) == rows
+
+
+def test_checker_without_layout_helpers_uses_the_working_copy(tmp_path, caplog) -> None:
+    _write_dump(tmp_path / "a.jsonl", 10)
+    strict = CHECKER_PATH.read_text(encoding="utf-8")
+    renamed = strict.replace("_find_spans", "_scan_spans")
+    checker = load_checker(renamed)
+    assert not hasattr(checker, "_find_spans")
+    assert layout_helpers(checker) == (alignment_check._find_spans, alignment_check._validate_box)
+
+    with caplog.at_level(logging.WARNING, logger="checker_diff"):
+        diff = CheckerDiff(strict, renamed, workers=0)
+    assert "candidate checker does not define _find_spans" in caplog.text
+    assert list(diff.run(iter_records(input_files([tmp_path])))) == []
+
+
+def test_cache_version_covers_the_layout_code(monkeypatch) -> None:
+    source = CHECKER_PATH.read_text(encoding="utf-8")
+    before = CheckerDiff(source, source, workers=0).baseline
+    monkeypatch.setattr(checker_diff, "layout_version", lambda compute_centers: "changed")
+    assert CheckerDiff(source, source, workers=0).baseline != before
+
+
+def test_diff_command_writes_report(tmp_path, capsys) -> None:
+    dump = tmp_path / "dump"
+    dump.mkdir()
+    _write_dump(dump / "a.jsonl", 16)
+    candidate = tmp_path / "alignment_check.py"
+    candidate.write_text(CHECKER_PATH.read_text(encoding="utf-8") + _LENIENT_PATCH, encoding="utf-8")
+    report = tmp_path / "report.jsonl"
+
+    ascii_align_cli.main(
+        ["diff", str(dump), "-o", str(report), "--baseline", str(CHECKER_PATH), "--candidate", str(candidate), "-w", "0"]
+    )
+    summary = json.loads(capsys.readouterr().out)
+    lines = report.read_text(encoding="utf-8").splitlines()
+    assert summary["rows"] == 17 and summary["changed"] == len(lines) > 0
+    assert all(set(json.loads(line)) == {"source", "index", "example_id", "diagram", "changed"} for line in lines)
+
+    with pytest.raises(SystemExit):
+        ascii_align_cli.main(["diff", str(dump)])
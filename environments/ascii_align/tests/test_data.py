@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import pytest
+
+from alignment_check import detect_misaligned
+from data import DEFAULT_THEMES, generate_diagram, generate_prompts
+from splits import source_identity
+
+
+def test_generate_prompts_is_reproducible_and_prefix_stable() -> None:
+    rows = generate_prompts(50, seed=3)
+    assert rows == generate_prompts(50, seed=3)
+    assert generate_prompts(20, seed=3) == rows[:20]
+    assert generate_prompts(50, seed=4) != rows
+
+
+def test_generate_prompts_matches_dataset_schema_and_cycles_themes() -> None:
+    rows = generate_prompts(2 * len(DEFAULT_THEMES))
+    names = [theme["name"] for theme in DEFAULT_THEMES]
+
+    assert [row["theme"] for row in rows] == names * 2
+    for row in rows:
+        assert set(row) == {"prompt", "theme", "shape_budget"}
+        assert isinstance(row["prompt"], str) and "{" not in row["prompt"]
+        assert isinstance(row["shape_budget"], int) and row["shape_budget"] >= 2
+
+
+def test_generate_prompts_varies_prompts() -> None:
+    prompts = [row["prompt"] for row in generate_prompts(1000)]
+    assert len(set(prompts)) > 500
+
+
+def test_generate_prompts_theme_filter() -> None:
+    rows = generate_prompts(10, themes=["sequence"])
+    assert {row["theme"] for row in rows} == {"sequence"}
+    with pytest.raises(ValueError):
+        generate_prompts(1, themes=["nope"])
+
+
+def test_synthetic_source_identity_tracks_settings() -> None:
+    assert source_identity(synthetic_examples=100) != source_identity(synthetic_examples=200)
+    assert source_identity(synthetic_examples=100, synthetic_seed=1) != source_identity(synthetic_examples=100)
+    assert source_identity(synthetic_examples=100) != source_identity()
+
+
+@pytest.mark.parametrize("columns", [1, 2, 3, 4])
+def test_generate_diagram_is_clean_without_flaws(columns: int) -> None:
+    for box_count in range(1, 25):
+        result = detect_misaligned(generate_diagram(box_count, seed=box_count, columns=columns))
+        assert result["misaligned"] == 0
+        assert result["correct_rectangles"] == box_count
+
+
+def test_generate_diagram_flaws_are_seeded_and_detected() -> None:
+    assert generate_diagram(6, seed="a", flaw_rate=0.5) == generate_diagram(6, seed="a", flaw_rate=0.5)
+    flawed = [detect_misaligned(generate_diagram(6, seed=s, flaw_rate=0.3))["misaligned"] > 0 for s in range(100)]
+    assert 50 < sum(flawed) < 100
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import pytest
+
+from data import get_default_prompts
+from dedup import capped_members, jaccard, lsh_bands, minhash_signature, near_duplicate_clusters, shingles
+
+
+def test_minhash_agreement_tracks_jaccard() -> None:
+    a = shingles("Draw 12 rectangles in a neat grid with equal spacing")
+    b = shingles("Draw 9 rectangles in a neat grid with equal spacing")
+    c = shingles("Sequence diagram for an OAuth login with token refresh")
+
+    sig_a, sig_b, sig_c = (minhash_signature(s, 256) for s in (a, b, c))
+    agree_ab = sum(x == y for x, y in zip(sig_a, sig_b)) / 256
+    agree_ac = sum(x == y for x, y in zip(sig_a, sig_c)) / 256
+    assert abs(agree_ab - jaccard(a, b)) < 0.1
+    assert agree_ac < 0.1
+
+
+@pytest.mark.parametrize("threshold", [0.5, 0.7, 0.9])
+def test_lsh_bands_fit_in_signature_and_reach_recall(threshold: float) -> None:
+    bands, rows = lsh_bands(64, threshold)
+    assert bands * rows <= 64
+    assert 1.0 - (1.0 - threshold**rows) ** bands >= 0.95
+
+
+def test_near_duplicate_clusters_group_variants_only() -> None:
+    texts = [
+        "Draw 12 rectangles in a neat grid with equal spacing",
+        "Sequence diagram for an OAuth login with token refresh",
+        "Draw 9 rectangles in a neat grid with equal spacing",
+        "draw 12 rectangles  in a neat grid with equal spacing",
+        "Sequence diagram for a password reset email flow",
+    ]
+    assert near_duplicate_clusters(texts, threshold=0.7) == [0, 1, 0, 0, 4]
+
+
+def test_near_duplicate_clusters_close_chains() -> None:
+    # a~b and b~c clear the threshold while a~c does not; all three still share a cluster.
+    a = "kappa rho psi chi gamma omicron rho lambda omega sigma epsilon rho"
+    b = "delta rho psi chi gamma omicron rho lambda omega sigma epsilon rho"
+    c = "delta phi psi gamma gamma omicron rho lambda omega sigma epsilon phi"
+    assert jaccard(shingles(a), shingles(b)) >= 0.6
+    assert jaccard(shingles(b), shingles(c)) >= 0.6
+    assert jaccard(shingles(a), shingles(c)) < 0.6
+    assert near_duplicate_clusters([a, b, c], threshold=0.6) == [0, 0, 0]
+
+
+def test_default_theme_prompts_are_distinct() -> None:
+    prompts = get_default_prompts()
+    clusters = near_duplicate_clusters(prompts + prompts[:3], threshold=0.8)
+    assert len(set(clusters)) == len(prompts)
+    assert clusters[len(prompts) :] == [0, 1, 2]
+
+
+def test_capped_members_keeps_lowest_indices_per_cluster() -> None:
+    clusters = [0, 1, 0, 0, 4, 1]
+    assert capped_members(clusters, cap=1) == {0, 1, 4}
+    assert capped_members(clusters, cap=2) == {0, 1, 2, 4, 5}
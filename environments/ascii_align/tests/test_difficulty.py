@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+
+from ascii_align import record_difficulty, score_completion
+from difficulty import DifficultyIndex, skipped_examples
+from scoring_pool import ScoringPool
+
+
+def test_difficulty_index_accumulates_across_instances(tmp_path: Path) -> None:
+    path = tmp_path / "difficulty.sqlite"
+    first = DifficultyIndex(path)
+    first.record(3, 1.0)
+    first.record(3, 2.0)
+    first.flush()
+
+    second = DifficultyIndex(path)
+    second.record(3, 3.0)
+    second.record(5, 0.5)
+    second.flush()
+
+    assert DifficultyIndex(path).stats() == {3: (3, 2.0), 5: (1, 0.5)}
+
+
+def test_saturated_uses_thresholds_and_min_rollouts(tmp_path: Path) -> None:
+    index = DifficultyIndex(tmp_path / "difficulty.sqlite")
+    for source_index, reward in [(0, 2.9), (1, 1.5), (2, 0.1), (3, 3.0)]:
+        rollouts = 1 if source_index == 3 else 4
+        for _ in range(rollouts):
+            index.record(source_index, reward)
+    index.flush()
+
+    assert index.saturated(easy_threshold=2.4, hard_threshold=0.6, min_rollouts=4) == {0, 2}
+    assert index.saturated(easy_threshold=2.4, hard_threshold=0.6, min_rollouts=1) == {0, 2, 3}
+
+
+def test_record_results_reads_verifiers_results_jsonl(tmp_path: Path) -> None:
+    results = tmp_path / "results.jsonl"
+    rows = [
+        {"example_id": 0, "reward": 3.0, "info": {"source_index": 7}},
+        {"example_id": 0, "reward": 1.0, "info": {"source_index": 7}},
+        {"example_id": 1, "reward": 2.0, "info": {}},
+    ]
+    results.write_text("".join(json.dumps(row) + "\n" for row in rows))
+
+    index = DifficultyIndex(tmp_path / "difficulty.sqlite")
+    assert index.record_results(results) == 2
+    assert index.stats() == {7: (2, 2.0)}
+
+
+def test_skipped_examples_keeps_a_deterministic_fraction() -> None:
+    saturated = set(range(1000))
+    assert skipped_examples(saturated, keep_fraction=0.0) == saturated
+    assert skipped_examples(saturated, keep_fraction=1.0) == set()
+
+    skipped = skipped_examples(saturated, keep_fraction=0.25, seed=1)
+    assert skipped == skipped_examples(saturated, keep_fraction=0.25, seed=1)
+    assert 0.7 <= len(skipped) / 1000 <= 0.8
+
+
+def test_scoring_pool_records_weighted_reward(tmp_path: Path) -> None:
+    index = DifficultyIndex(tmp_path / "difficulty.sqlite")
+    pool = ScoringPool(
+        score_completion,
+        executor="none",
+        on_scores=lambda info, scores: record_difficulty(index, info, scores),
+    )
+    completion = [{"role": "assistant", "content": "```text\n┌──┐\n│A │\n└──┘\n```"}]
+    scores = asyncio.run(pool.score(completion, {"source_index": 4}))
+    index.flush()
+
+    expected = scores["format_reward"] + scores["alignment_reward"] + scores["layout_spread_reward"]
+    assert index.stats() == {4: (1, expected)}
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+from eval_runner import DEFAULT_ENDPOINTS_PATH, AdaptiveLimiter, LimitedTransport, load_endpoints
+
+
+def test_limiter_grows_additively_and_halves_once_per_window() -> None:
+    async def run() -> AdaptiveLimiter:
+        limiter = AdaptiveLimiter(initial=4, max_limit=64)
+        for _ in range(8):
+            await limiter.release(await limiter.acquire(), 200)
+        assert 5.5 < limiter.limit < 6.0
+
+        # A burst of 429s to requests sent before the cut halves the limit once.
+        started = [await limiter.acquire() for _ in range(4)]
+        grown = limiter.limit
+        for start in started:
+            await limiter.release(start, 429)
+        assert limiter.limit == grown / 2
+        assert limiter.overloaded == 4
+
+        # A rejection of a request sent after the cut cuts again.
+        await limiter.release(await limiter.acquire(), 429)
+        assert limiter.limit == max(1.0, grown / 4)
+        return limiter
+
+    limiter = asyncio.run(run())
+    assert limiter.in_flight == 0
+
+
+def test_limiter_treats_slow_replies_as_overload() -> None:
+    async def run() -> float:
+        limiter = AdaptiveLimiter(initial=8, target_latency=0.0)
+        await limiter.release(await limiter.acquire(), 200)
+        return limiter.limit
+
+    assert asyncio.run(run()) == 4.0
+
+
+def test_limited_transport_caps_in_flight_requests() -> None:
+    class SlowTransport:
+        def __init__(self) -> None:
+            self.active = self.peak = 0
+
+        async def handle_async_request(self, request):
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            await asyncio.sleep(0.01)
+            self.active -= 1
+            return SimpleNamespace(status_code=200)
+
+    inner = SlowTransport()
+    limiter = AdaptiveLimiter(initial=3, max_limit=3)
+
+    async def run() -> None:
+        transport = LimitedTransport(inner, limiter)
+        await asyncio.gather(*(transport.handle_async_request(None) for _ in range(20)))
+
+    asyncio.run(run())
+    assert inner.peak == 3
+    assert limiter.stats() == {"limit": 3.0, "peak_in_flight": 3, "requests": 20, "overloaded": 0}
+
+
+def test_repo_endpoints_registry_loads() -> None:
+    endpoints = load_endpoints(DEFAULT_ENDPOINTS_PATH)
+    assert endpoints["mock"]["model"] == "mock"
+    assert all({"model", "url", "key"} <= set(endpoint) for endpoint in endpoints.values())
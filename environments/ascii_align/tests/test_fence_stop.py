@@ -0,0 +1,96 @@
+import inspect
+import types
+
+from ascii_align import (
+    CLOSING_FENCE_STOP,
+    _extract_diagram,
+    _restore_closing_fence,
+    fence_stop_sampling_args,
+    format_reward,
+    load_environment,
+    requests_fence_stop,
+)
+
+
+FULL_RESPONSE = """Here is the diagram:
+
+```text
+┌────┐   ┌────┐
+│ A  │──▶│ B  │
+└────┘   └────┘
+```
+
+The arrow shows that A calls B."""
+
+
+def _completion(content: str) -> list[dict[str, str]]:
+    return [{"role": "assistant", "content": content}]
+
+
+def _response(content: str, finish_reason: str = "stop", stop_reason=None):
+    message = types.SimpleNamespace(content=content)
+    choice = types.SimpleNamespace(message=message, finish_reason=finish_reason, stop_reason=stop_reason)
+    return types.SimpleNamespace(choices=[choice])
+
+
+def _stopped_text(text: str, include_stop: bool) -> str:
+    # Mimic a server cutting generation at the first stop-string match.
+    index = text.index(CLOSING_FENCE_STOP)
+    return text[: index + len(CLOSING_FENCE_STOP)] if include_stop else text[:index]
+
+
+def test_stop_string_skips_opening_fence_and_cuts_trailing_prose() -> None:
+    kept = _stopped_text(FULL_RESPONSE, include_stop=True)
+    assert kept.count("```") == 2
+    assert "arrow shows" not in kept
+    assert _extract_diagram(_completion(kept)) == _extract_diagram(_completion(FULL_RESPONSE))
+
+
+def test_restore_closing_fence_when_server_strips_stop_string() -> None:
+    response = _response(_stopped_text(FULL_RESPONSE, include_stop=False), stop_reason=CLOSING_FENCE_STOP)
+    assert format_reward(_completion(response.choices[0].message.content)) == 0.0
+
+    _restore_closing_fence(response)
+
+    content = response.choices[0].message.content
+    assert format_reward(_completion(content)) == 1.0
+    assert _extract_diagram(_completion(content)) == _extract_diagram(_completion(FULL_RESPONSE))
+
+
+def test_restore_closing_fence_ignores_end_of_sequence_stops() -> None:
+    # vLLM reports stop_reason=None when the model ended the reply itself;
+    # an open fence there is the model's own formatting error.
+    unclosed = _stopped_text(FULL_RESPONSE, include_stop=False)
+    eos = _response(unclosed, stop_reason=None)
+    _restore_closing_fence(eos)
+    assert eos.choices[0].message.content == unclosed
+    assert format_reward(_completion(unclosed)) == 0.0
+
+    # Servers that send no stop_reason field at all only stop early on the stop string.
+    message = types.SimpleNamespace(content=unclosed)
+    response = types.SimpleNamespace(choices=[types.SimpleNamespace(message=message, finish_reason="stop")])
+    _restore_closing_fence(response)
+    assert _extract_diagram(_completion(message.content)) == _extract_diagram(_completion(FULL_RESPONSE))
+
+
+def test_restore_closing_fence_leaves_other_responses_alone() -> None:
+    kept = _stopped_text(FULL_RESPONSE, include_stop=True)
+    unterminated = "```text\n┌─┐\n│ │\n└─┘"
+    responses = [
+        _response(kept, stop_reason=CLOSING_FENCE_STOP),
+        _response(FULL_RESPONSE, stop_reason=None),
+        _response(unterminated, finish_reason="length", stop_reason=None),
+        _response(unterminated, stop_reason="</answer>"),
+    ]
+    for response in responses:
+        before = response.choices[0].message.content
+        _restore_closing_fence(response)
+        assert response.choices[0].message.content == before
+
+
+def test_fence_stop_is_opt_in() -> None:
+    assert inspect.signature(load_environment).parameters["stop_after_fence"].default is False
+    assert requests_fence_stop(fence_stop_sampling_args())
+    assert requests_fence_stop({"stop": CLOSING_FENCE_STOP})
+    assert not requests_fence_stop({"stop": ["</answer>"]})
+    assert not requests_fence_stop(None)
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import copy
+import json
+import os
+
+import pytest
+
+import ascii_align_cli
+import golden
+from golden import (
+    DEFAULT_CORPUS_PATH,
+    build_corpus,
+    read_corpus,
+    synthetic_diagrams,
+    verify_corpus,
+    write_corpus,
+)
+from scoring_cache import checker_version
+
+
+# The whole corpus takes ~10s; by default check every hand-written entry and
+# a fixed 1-in-10 of the rest. `golden verify` (and this flag) checks them all.
+FULL_CORPUS = os.environ.get("ASCII_ALIGN_GOLDEN_FULL") == "1"
+SYNTHETIC_STRIDE = 10
+
+
+def test_checker_matches_golden_corpus() -> None:
+    header, entries = read_corpus(DEFAULT_CORPUS_PATH)
+    assert header["entries"] == len(entries) > 1000
+    assert {entry["id"].split(":")[0] for entry in entries} >= {"fixture", "test", "synthetic"}
+
+    if not FULL_CORPUS:
+        synthetic = [entry for entry in entries if entry["id"].startswith("synthetic:")]
+        entries = [entry for entry in entries if not entry["id"].startswith("synthetic:")]
+        entries += synthetic[::SYNTHETIC_STRIDE]
+    assert verify_corpus(entries) == []
+
+
+def test_verify_reports_first_divergences_in_order() -> None:
+    _, entries = read_corpus(DEFAULT_CORPUS_PATH)
+    entries = copy.deepcopy(entries[:300])
+    entries[40]["expected"]["connector_errors"] += 1
+    entries[41]["expected"]["layout_centers"] = [-1.0]
+    entries[250]["expected"]["misaligned"] += 5
+
+    inline = verify_corpus(entries, workers=0, chunk_size=16, max_divergences=2)
+    assert [(d["id"], d["field"]) for d in inline] == [
+        (entries[40]["id"], "connector_errors"),
+        (entries[41]["id"], "layout_centers"),
+    ]
+    assert inline[0]["actual"] == inline[0]["expected"] - 1
+    assert verify_corpus(entries, workers=2, chunk_size=16, max_divergences=2) == inline
+    assert len(verify_corpus(entries, workers=2, chunk_size=16)) == 3
+
+
+def test_build_is_deduplicated_and_reproducible(tmp_path) -> None:
+    diagrams = list(synthetic_diagrams(200, seed=7))
+    assert diagrams == list(synthetic_diagrams(200, seed=7))
+    entries = build_corpus(diagrams + diagrams[:10])
+    assert len(entries) == len({entry["diagram"] for entry in entries}) <= 200
+
+    first, second = tmp_path / "a.jsonl.gz", tmp_path / "b.jsonl.gz"
+    write_corpus(first, entries, version=3)
+    write_corpus(second, build_corpus(diagrams), version=3)
+    assert first.read_bytes() == second.read_bytes()
+    header, loaded = read_corpus(first)
+    assert header == {"golden_version": 3, "format": 1, "checker": checker_version(), "entries": len(entries)}
+    assert loaded == entries
+
+
+def test_golden_command_fails_on_divergence(tmp_path, capsys) -> None:
+    entries = build_corpus(synthetic_diagrams(50, seed=1))
+    corpus = tmp_path / "corpus.jsonl.gz"
+    write_corpus(corpus, entries, version=1)
+    ascii_align_cli.main(["golden", "verify", "--corpus", str(corpus), "-w", "0"])
+    assert json.loads(capsys.readouterr().out)["divergences"] == []
+
+    entries[3]["expected"]["rectangle_errors"] += 1
+    write_corpus(corpus, entries, version=1)
+    with pytest.raises(SystemExit):
+        ascii_align_cli.main(["golden", "verify", "--corpus", str(corpus), "-w", "0"])
+    summary = json.loads(capsys.readouterr().out)
+    assert [d["id"] for d in summary["divergences"]] == [entries[3]["id"]]
+
+
+@pytest.mark.parametrize("action", ["verify", "build"])
+def test_golden_command_needs_a_source_checkout(tmp_path, monkeypatch, action: str) -> None:
+    # An installed wheel has neither the tests directory nor the corpus in it.
+    monkeypatch.setattr(golden, "TESTS_DIR", tmp_path / "tests")
+    monkeypatch.setattr(golden, "DEFAULT_CORPUS_PATH", tmp_path / "tests" / "golden" / "corpus.jsonl.gz")
+    with pytest.raises(SystemExit, match="not available outside a source checkout"):
+        ascii_align_cli.main(["golden", action])
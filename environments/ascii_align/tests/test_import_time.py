@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from pathlib import Path
+import subprocess
+import sys
+
+import pytest
+
+
+ENV_DIR = Path(__file__).resolve().parents[1]
+
+# Cumulative import time budget (microseconds) for modules scoring workers
+# and CLIs load. Generous enough for slow CI machines; verifiers/datasets
+# alone take well over a second.
+IMPORT_BUDGET_US = {
+    "alignment_check": 100_000,
+    "ascii_align": 400_000,
+}
+
+HEAVY_MODULES = ("verifiers", "datasets", "openai", "pyarrow", "numpy")
+
+
+def _import_time_us(module: str) -> tuple[int, list[str]]:
+    code = f"import sys, {module}; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ENV_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative = None
+    for line in result.stderr.splitlines():
+        # "import time:      self [us] | cumulative | imported package"
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            cumulative = int(parts[1])
+    assert cumulative is not None, result.stderr
+    loaded = [name for name in result.stdout.strip().split(",") if name]
+    return cumulative, loaded
+
+
+@pytest.mark.parametrize("module", sorted(IMPORT_BUDGET_US))
+def test_import_stays_light(module: str) -> None:
+    cumulative, loaded = _import_time_us(module)
+    assert loaded == []
+    assert cumulative <= IMPORT_BUDGET_US[module], f"import {module} took {cumulative / 1000:.1f}ms"
@@ -1,13 +1,7 @@
-import sys
-import types
-
-
-if "verifiers" not in sys.modules:
-    sys.modules["verifiers"] = types.SimpleNamespace(Environment=object, Rubric=object, SingleTurnEnv=object)
-if "datasets" not in sys.modules:
-    sys.modules["datasets"] = types.SimpleNamespace(load_dataset=lambda *args, **kwargs: None)
+import pytest
 
 from ascii_align import layout_spread_reward
+from layout_spec import layout_spec
 
 
 def _completion(content: str) -> list[dict[str, str]]:
@@ -426,3 +420,31 @@ def test_layout_spread_two_column_dense_sequence_is_low() -> None:
         info={"theme": "sequence", "shape_budget": 16},
     )
     assert score <= 0.35
+
+
+@pytest.mark.parametrize(
+    ("theme", "shape_budget"),
+    [("sequence", 16), ("flowcharts", 4), ("flowcharts", 8), ("state_machines", 12), ("architecture", None)],
+)
+def test_layout_spread_precomputed_spec_matches_raw_info(theme: str, shape_budget: int | None) -> None:
+    response = """```text
+┌──────┐      ┌──────┐      ┌──────┐
+│ A    │────▶ │ B    │────▶ │ C    │
+└──────┘      └──────┘      └──────┘
+   │
+   ▼
+┌──────┐      ┌──────┐
+│ D    │────▶ │ E    │
+└──────┘      └──────┘
+   │
+   ▼
+┌──────┐
+│ F    │
+└──────┘
+```"""
+    raw = layout_spread_reward(_completion(response), info={"theme": theme, "shape_budget": shape_budget})
+    compact = layout_spread_reward(
+        _completion(response),
+        info={"source_index": 0, "layout": layout_spec(theme, shape_budget)},
+    )
+    assert compact == raw
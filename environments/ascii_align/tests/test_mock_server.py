@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from alignment_check import detect_misaligned
+from ascii_align import CLOSING_FENCE_STOP, _extract_diagram
+from load_driver import percentiles
+from mock_server import MockCompletions, MockServer, box_count_from_prompt
+
+
+@pytest.fixture
+def server():
+    server = MockServer(MockCompletions(flaw_rate=0.0)).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _post(server: MockServer, body: dict) -> dict:
+    request = urllib.request.Request(
+        server.base_url + "/chat/completions",
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def _body(**extra) -> dict:
+    messages = [{"role": "user", "content": "Draw 5 boxes left-to-right with arrows between them."}]
+    return {"model": "mock", "messages": messages, **extra}
+
+
+def test_chat_completion_returns_a_clean_diagram(server: MockServer) -> None:
+    response = _post(server, _body(n=2, seed=1))
+    assert response["object"] == "chat.completion"
+    assert [choice["index"] for choice in response["choices"]] == [0, 1]
+    assert response["usage"]["completion_tokens"] > 0
+
+    content = response["choices"][0]["message"]["content"]
+    diagram = _extract_diagram([{"role": "assistant", "content": content}])
+    result = detect_misaligned(diagram)
+    assert result["misaligned"] == 0 and result["correct_rectangles"] == 5
+    assert _post(server, _body(n=2, seed=1))["choices"][0]["message"] == response["choices"][0]["message"]
+
+
+@pytest.mark.parametrize("keep_stop", [True, False])
+def test_stop_string_cuts_reply_like_vllm(server: MockServer, keep_stop: bool) -> None:
+    choice = _post(server, _body(stop=[CLOSING_FENCE_STOP], include_stop_str_in_output=keep_stop))["choices"][0]
+    content = choice["message"]["content"]
+    assert choice["finish_reason"] == "stop"
+    assert choice["stop_reason"] == CLOSING_FENCE_STOP
+    assert content.endswith(CLOSING_FENCE_STOP) == keep_stop
+    assert "arrows show" not in content
+
+
+def test_max_tokens_truncates_with_length_finish(server: MockServer) -> None:
+    choice = _post(server, _body(max_tokens=10))["choices"][0]
+    assert choice["finish_reason"] == "length"
+    assert len(choice["message"]["content"]) <= 30
+
+
+def test_models_and_unknown_paths(server: MockServer) -> None:
+    with urllib.request.urlopen(server.base_url + "/models", timeout=10) as response:
+        assert json.loads(response.read())["data"][0]["id"] == "mock"
+    with pytest.raises(urllib.error.HTTPError):
+        urllib.request.urlopen(server.base_url + "/completions", timeout=10)
+
+
+def test_recorded_completions_are_replayed() -> None:
+    completions = MockCompletions(recorded=["first", "second"])
+    replies = {completions.complete(_body(seed=s))["choices"][0]["message"]["content"] for s in range(20)}
+    assert replies == {"first", "second"}
+
+
+@pytest.mark.parametrize(
+    ("prompt", "count"),
+    [
+        ("Draw 12 rectangles in a neat grid.", 12),
+        ("Draw a web app architecture with client, API, Redis queue, workers, and a Postgres database.", 5),
+        ("Sketch something.", 3),
+    ],
+)
+def test_box_count_from_prompt(prompt: str, count: int) -> None:
+    assert box_count_from_prompt(prompt) == count
+
+
+def test_percentiles_use_nearest_rank() -> None:
+    assert percentiles(list(range(1, 101))) == {"p50": 50, "p90": 90, "p99": 99, "max": 100}
+    assert percentiles([]) == {}
+
+
+def test_requests_over_max_in_flight_get_429() -> None:
+    server = MockServer(MockCompletions(), max_in_flight=0).start()
+    try:
+        with pytest.raises(urllib.error.HTTPError) as excinfo:
+            _post(server, _body())
+        assert excinfo.value.code == 429
+    finally:
+        server.shutdown()
+        server.server_close()
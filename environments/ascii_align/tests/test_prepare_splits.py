@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+datasets = pytest.importorskip("datasets")
+
+import splits  # noqa: E402
+from data import generate_prompts  # noqa: E402
+from splits import prepare_splits  # noqa: E402
+
+
+def _source(tmp_path: Path, kind: str, rows: int = 120) -> str:
+    dataset = datasets.Dataset.from_list(generate_prompts(rows, seed=3))
+    if kind == "parquet":
+        path = tmp_path / "source.parquet"
+        dataset.to_parquet(str(path))
+    else:
+        path = tmp_path / "source"
+        dataset.save_to_disk(str(path))
+    return str(path)
+
+
+@pytest.mark.parametrize("kind", ["save_to_disk", "parquet"])
+def test_second_call_hits_the_prepared_cache(tmp_path: Path, monkeypatch, kind: str) -> None:
+    source = _source(tmp_path, kind)
+    source_files = sorted(p.name for p in Path(source).parent.rglob("*"))
+    cache_dir = tmp_path / "prepared"
+
+    train, eval_ = prepare_splits(source, cache_dir=cache_dir)
+
+    def no_source(*args, **kwargs):
+        raise AssertionError("the source was opened again")
+
+    monkeypatch.setattr(splits, "load_source_dataset", no_source)
+    cached_train, cached_eval = prepare_splits(source, cache_dir=cache_dir)
+
+    assert cached_train.to_list() == train.to_list()
+    assert cached_eval.to_list() == eval_.to_list()
+    assert [p.name for p in cache_dir.iterdir()] == [next(cache_dir.glob("splits-*")).name]
+    # Nothing (e.g. `map` cache files) is written next to the source.
+    assert sorted(p.name for p in Path(source).parent.rglob("*") if "prepared" not in p.parts) == source_files
+
+
+@pytest.mark.parametrize("num_shards", [2, 3])
+def test_shards_partition_the_full_split(tmp_path: Path, num_shards: int) -> None:
+    source = _source(tmp_path, "save_to_disk")
+    full_train, full_eval = prepare_splits(source)
+
+    shards = [prepare_splits(source, shard_index=k, num_shards=num_shards) for k in range(num_shards)]
+
+    for full, part in ((full_train, 0), (full_eval, 1)):
+        rows = [row for shard in shards for row in shard[part].to_list()]
+        assert sorted(rows, key=lambda row: row["info"]["source_index"]) == sorted(
+            full.to_list(), key=lambda row: row["info"]["source_index"]
+        )
+    # Train positions keep their global meaning on every shard.
+    merged = sorted(info["train_order_index"] for shard in shards for info in shard[0]["info"])
+    assert merged == list(range(len(full_train)))
+
+
+def _old_pipeline(source: str):
+    # The pre-`prepare_splits` load_environment steps, minus the hub download.
+    dataset = datasets.load_from_disk(source)
+    dataset = dataset.map(lambda _row, idx: {"source_index": idx}, with_indices=True)
+    split = dataset.train_test_split(test_size=0.2, seed=42, shuffle=True)
+    return split["train"], split["test"]
+
+
+def test_default_output_matches_the_old_pipeline(tmp_path: Path) -> None:
+    source = _source(tmp_path, "save_to_disk")
+    old_train, old_eval = _old_pipeline(source)
+
+    train, eval_ = prepare_splits(source)
+
+    for new, old in ((train, old_train), (eval_, old_eval)):
+        assert [info["source_index"] for info in new["info"]] == old["source_index"]
+        assert [prompt[0]["content"] for prompt in new["prompt"]] == old["prompt"]
+        assert [(info["theme"], info["shape_budget"]) for info in new["info"]] == list(
+            zip(old["theme"], old["shape_budget"])
+        )
+    assert [info["train_order_index"] for info in train["info"]] == list(range(len(old_train)))
+    assert all("train_order_index" not in info for info in eval_["info"])
+
+
+def test_num_proc_does_not_change_the_output(tmp_path: Path) -> None:
+    source = _source(tmp_path, "parquet")
+    serial = prepare_splits(source)
+    parallel = prepare_splits(source, num_proc=2)
+
+    assert [split.to_list() for split in parallel] == [split.to_list() for split in serial]
+
+
+def test_prefix_grouping_without_a_theme_column(tmp_path: Path) -> None:
+    path = tmp_path / "prompts.parquet"
+    rows = [{"prompt": row["prompt"]} for row in generate_prompts(60, seed=3)]
+    datasets.Dataset.from_list(rows).to_parquet(str(path))
+
+    train, _ = prepare_splits(str(path), prefix_group_size=4)
+
+    assert sorted(info["train_order_index"] for info in train["info"]) == list(range(len(train)))
+    assert all(info["theme"] is None for info in train["info"])
@@ -0,0 +1,39 @@
+import pytest
+
+from ascii_align import SYSTEM_PROMPT
+from data import get_default_prompts
+from prompt_order import batch_prefix_ratios, prefix_grouped_order, render_prompt, shared_prefix_ratio
+
+
+def test_system_prompt_has_no_trailing_whitespace() -> None:
+    for line in SYSTEM_PROMPT.splitlines():
+        assert line == line.rstrip()
+
+
+def test_shared_prefix_ratio_counts_reusable_prefix_tokens() -> None:
+    assert shared_prefix_ratio([]) == 0.0
+    assert shared_prefix_ratio(["a b c"]) == 0.0
+    # Second prompt reuses "a", " ", "b", " " (4 of 5 tokens); total 10 tokens.
+    # The trie makes the ratio depend on batch composition, not order.
+    assert shared_prefix_ratio(["a b c", "a b d"]) == pytest.approx(4 / 10)
+    assert shared_prefix_ratio(["x y", "x y"]) == pytest.approx(3 / 6)
+
+
+def test_prefix_grouped_order_sorts_only_within_windows() -> None:
+    keys = [("b",), ("a",), ("c",), ("a",), ("z",), ("y",)]
+    order = prefix_grouped_order(keys, group_size=3)
+
+    assert order == [1, 0, 2, 3, 5, 4]
+    assert prefix_grouped_order(keys, group_size=0) == list(range(6))
+
+
+def test_grouping_raises_shared_prefix_ratio_on_default_prompts() -> None:
+    prompts = get_default_prompts()
+    # Interleave so similar prompts start in different batches.
+    shuffled = prompts[::2] + prompts[1::2]
+    grouped = [shuffled[i] for i in prefix_grouped_order([(p,) for p in shuffled], len(shuffled))]
+
+    before = batch_prefix_ratios([render_prompt(p, SYSTEM_PROMPT) for p in shuffled], batch_size=3)
+    after = batch_prefix_ratios([render_prompt(p, SYSTEM_PROMPT) for p in grouped], batch_size=3)
+
+    assert sum(after) > sum(before)
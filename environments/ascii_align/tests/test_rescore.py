@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+import ascii_align_cli
+from ascii_align import score_completion
+from data import generate_diagram
+from rescore import input_files, iter_records, rescore
+
+
+def _write_dump(path, count: int) -> list[dict]:
+    rows = []
+    for i in range(count):
+        content = f"```text\n{generate_diagram(2 + i % 5, seed=i, flaw_rate=0.3)}\n```"
+        row = {"example_id": i, "completion": [{"role": "assistant", "content": content}], "reward": 0.5}
+        if i % 3 == 0:
+            row["info"] = {"theme": "flowcharts", "shape_budget": 4}
+        elif i % 3 == 1:
+            row["info"] = json.dumps({"theme": "sequence", "shape_budget": 9})
+            row["completion"] = content
+        else:
+            row["theme"], row["shape_budget"] = "architecture", 6
+        rows.append(row)
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows), encoding="utf-8")
+    return rows
+
+
+def test_iter_records_normalizes_completion_and_info(tmp_path) -> None:
+    _write_dump(tmp_path / "a.jsonl", 3)
+    records = list(iter_records(input_files([tmp_path])))
+
+    assert [(r[0].endswith("a.jsonl"), r[1]) for r in records] == [(True, 0), (True, 1), (True, 2)]
+    assert all(r[2][-1]["role"] == "assistant" for r in records)
+    assert [r[3] for r in records] == [
+        {"theme": "flowcharts", "shape_budget": 4},
+        {"theme": "sequence", "shape_budget": 9},
+        {"theme": "architecture", "shape_budget": 6},
+    ]
+    assert records[0][4] == {"example_id": 0, "previous_reward": 0.5}
+
+
+def test_rescore_is_ordered_and_matches_rubric(tmp_path) -> None:
+    _write_dump(tmp_path / "a.jsonl", 20)
+    _write_dump(tmp_path / "b.jsonl", 5)
+    records = list(iter_records(input_files([tmp_path])))
+
+    inline = list(rescore(records, workers=0, chunk_size=3))
+    pooled = list(rescore(records, workers=2, chunk_size=3))
+    assert pooled == inline
+    assert [(row["source"], row["index"]) for row in inline] == [(r[0], r[1]) for r in records]
+
+    for row, record in zip(inline, records):
+        scores = score_completion(record[2], record[3])
+        assert {name: row[name] for name in scores} == scores
+        assert row["reward"] == pytest.approx(
+            scores["format_reward"] + scores["alignment_reward"] + scores["layout_spread_reward"]
+        )
+
+
+def test_score_command_resumes_after_a_torn_line(tmp_path) -> None:
+    dump = tmp_path / "dump"
+    dump.mkdir()
+    _write_dump(dump / "a.jsonl", 30)
+    full, partial = tmp_path / "full.jsonl", tmp_path / "partial.jsonl"
+
+    ascii_align_cli.main(["score", str(dump), "-o", str(full), "-w", "0"])
+    lines = full.read_text(encoding="utf-8").splitlines(keepends=True)
+    assert len(lines) == 30
+
+    partial.write_text("".join(lines[:12]) + lines[12][:20], encoding="utf-8")
+    ascii_align_cli.main(["score", str(dump), "-o", str(partial), "-w", "0"])
+    assert partial.read_text(encoding="utf-8") == full.read_text(encoding="utf-8")
+
+    _write_dump(dump / "a.jsonl", 5)
+    with pytest.raises(SystemExit):
+        ascii_align_cli.main(["score", str(dump), "-o", str(partial), "-w", "0"])
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from response_cache import ResponseCache, request_key
+
+PROMPT = [{"role": "system", "content": "Draw."}, {"role": "user", "content": "Draw 3 boxes."}]
+SAMPLING = {"temperature": 0.7, "max_tokens": 512}
+
+
+def test_request_key_covers_model_prompt_and_sampling() -> None:
+    key = request_key("m", PROMPT, SAMPLING)
+    assert key == request_key("m", [dict(m) for m in PROMPT], dict(reversed(SAMPLING.items())))
+    assert key != request_key("other", PROMPT, SAMPLING)
+    assert key != request_key("m", PROMPT[1:], SAMPLING)
+    assert key != request_key("m", PROMPT, {**SAMPLING, "seed": 1})
+    assert key != request_key("m", PROMPT, SAMPLING, message_type="completion")
+
+
+def test_repeated_requests_get_successive_sample_keys(tmp_path) -> None:
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    keys = [cache.sample_key("m", PROMPT, SAMPLING) for _ in range(3)]
+    assert len(set(keys)) == 3
+    assert [key.rsplit(":", 1)[1] for key in keys] == ["0", "1", "2"]
+
+    cache.reset_samples()
+    assert cache.sample_key("m", PROMPT, SAMPLING) == keys[0]
+
+
+def test_responses_persist_and_replay_does_not_write(tmp_path) -> None:
+    path = tmp_path / "responses.sqlite"
+    cache = ResponseCache(path)
+    key = cache.sample_key("m", PROMPT, SAMPLING)
+    cache.put(key, {"choices": [{"message": {"content": "hi"}}]})
+    cache.close()
+
+    replay = ResponseCache(path, replay=True)
+    assert replay.sample_key("m", PROMPT, SAMPLING) == key
+    assert replay.get(key) == {"choices": [{"message": {"content": "hi"}}]}
+    second = replay.sample_key("m", PROMPT, SAMPLING)
+    assert replay.get(second) is None
+    replay.put(second, {"choices": []})
+    assert replay.get(second) is None
+    assert replay.stats() == {"hits": 1, "misses": 2}
+
+
+def test_cache_is_pruned_to_max_entries(tmp_path) -> None:
+    cache = ResponseCache(tmp_path / "responses.sqlite", max_entries=100)
+    for i in range(512):
+        cache.put(cache.sample_key("m", PROMPT, {"seed": i}), {"i": i})
+    assert len(cache) <= 100
+    assert cache.get(f"{request_key('m', PROMPT, {'seed': 511})}:0") == {"i": 511}
+
+
+def test_policy_version_is_part_of_every_key(tmp_path) -> None:
+    assert request_key("m", PROMPT, SAMPLING, policy_version=None) == request_key("m", PROMPT, SAMPLING)
+    assert request_key("m", PROMPT, SAMPLING, policy_version="step-1") != request_key("m", PROMPT, SAMPLING)
+
+    step1 = ResponseCache(tmp_path / "responses.sqlite", policy_version="step-1")
+    step2 = ResponseCache(tmp_path / "responses.sqlite", policy_version="step-2")
+    step1.put(step1.sample_key("m", PROMPT, SAMPLING), {"step": 1})
+    assert step2.get(step2.sample_key("m", PROMPT, SAMPLING)) is None
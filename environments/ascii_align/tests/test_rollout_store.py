@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+
+import pytest
+
+from ascii_align import (
+    FEATURE_FIELDS,
+    REWARD_FUNCS,
+    ROLLOUT_COLUMNS,
+    rollout_features,
+    score_completion,
+    store_rollout,
+)
+from rollout_store import RolloutStore, read_rollouts
+from scoring_cache import scoring_cache_stats
+from scoring_pool import ScoringPool
+
+RESPONSE = """```text
+┌────┐   ┌────┐   ┌────┐
+│ A  │──▶│ B  │──▶│ C  │
+└────┘   └────┘   └────┘
+```"""
+
+
+def _completion(content: str) -> list[dict[str, str]]:
+    return [{"role": "assistant", "content": content}]
+
+
+class _ListStore:
+    def __init__(self) -> None:
+        self.rows: list[dict] = []
+
+    def append(self, row) -> None:
+        self.rows.append(dict(row))
+
+
+def test_rollout_features_report_checker_counts_and_layout() -> None:
+    features = rollout_features(_completion(RESPONSE), {"theme": "flowcharts", "shape_budget": 3})
+    assert features["correct_rectangles"] == 3
+    assert features["misaligned"] == 0
+    assert features["box_count"] == 3
+    assert features["layout_columns"] == 3
+    assert features["diagram_height"] == 3
+    assert 0.0 < features["layout_span"] <= 1.0
+
+    assert rollout_features(_completion("no diagram")) == dict.fromkeys(FEATURE_FIELDS)
+
+
+def test_features_are_added_only_on_request() -> None:
+    plain = score_completion(_completion(RESPONSE))
+    full = score_completion(_completion(RESPONSE), features=True)
+    assert set(full) == set(plain) | set(FEATURE_FIELDS)
+    assert all(full[name] == value for name, value in plain.items())
+
+
+def test_pool_reports_each_rollout_once_to_the_store() -> None:
+    store = _ListStore()
+    pool = ScoringPool(
+        functools.partial(score_completion, features=True),
+        executor="none",
+        on_rollout=functools.partial(store_rollout, store),
+        cache_stats_fn=scoring_cache_stats,
+    )
+    state = {
+        "trajectory_id": "r-1",
+        "model": "m",
+        "example_id": 7,
+        "info": {"source_index": 3, "train_order_index": 0, "theme": "flowcharts", "shape_budget": 3},
+        "completion": _completion(RESPONSE),
+        "timing": {"generation_ms": 12.5},
+    }
+
+    async def run() -> None:
+        # Every metric function of the rubric scores the same rollout.
+        await asyncio.gather(*(pool.score_rollout(_completion(RESPONSE), state["info"], state) for _ in REWARD_FUNCS))
+
+    asyncio.run(run())
+    assert len(store.rows) == 1
+    row = store.rows[0]
+    assert set(ROLLOUT_COLUMNS) <= set(row)
+    assert row["split"] == "train"
+    assert row["reward"] == pytest.approx(row["format_reward"] + row["alignment_reward"] + row["layout_spread_reward"])
+    assert row["correct_rectangles"] == 3
+    assert row["generation_ms"] == 12.5
+    assert row["completion"] == RESPONSE
+
+
+def test_store_appends_parts_across_runs(tmp_path) -> None:
+    pytest.importorskip("pyarrow")
+    columns = {"rollout_id": "string", "reward": "float64", "box_count": "int64"}
+
+    first = RolloutStore(tmp_path, columns, flush_rows=2)
+    for i in range(5):
+        first.append({"rollout_id": f"a{i}", "reward": i / 2, "box_count": None if i == 4 else i, "extra": 1})
+    first.close()
+    second = RolloutStore(tmp_path, {**columns, "theme": "string"}, flush_rows=2)
+    second.append({"rollout_id": "b0", "theme": "sequence"})
+    second.close()
+
+    assert len(list(tmp_path.glob("part-*.parquet"))) == 4
+    table = read_rollouts(tmp_path)
+    assert table.num_rows == 6
+    assert sorted(table.column("rollout_id").to_pylist()) == ["a0", "a1", "a2", "a3", "a4", "b0"]
+    assert "extra" not in table.schema.names
+    assert read_rollouts(tmp_path, columns=["theme"]).column("theme").null_count == 5
+
+
+def test_store_rejects_unknown_column_types(tmp_path) -> None:
+    with pytest.raises(ValueError):
+        RolloutStore(tmp_path, {"x": "decimal"})
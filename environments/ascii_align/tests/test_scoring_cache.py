@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+from pathlib import Path
+import re
+
+import pytest
+
+import alignment_check
+from alignment_check import _find_spans, _validate_box, detect_misaligned, normalize_grid
+from scoring_cache import (
+    MISALIGNED_CACHE,
+    DiskScoreCache,
+    LRUCache,
+    cached_detect_misaligned,
+    cached_layout_centers,
+    canonicalize_diagram,
+    configure_scoring_cache,
+    layout_dependencies,
+    layout_version,
+    scoring_cache_stats,
+)
+from test_alignment_regressions import USER_FLOWCHART_CASE, USER_SEQUENCE_CASE
+
+
+_FALSE_POS_DIR = Path(__file__).parent / "false-positives"
+_CODE_BLOCK_RE = re.compile(r"```text\n(.*?)\n```", re.S)
+
+
+def _diagrams() -> list[str]:
+    diagrams = [USER_FLOWCHART_CASE, USER_SEQUENCE_CASE]
+    for path in sorted(_FALSE_POS_DIR.glob("*.md")):
+        match = _CODE_BLOCK_RE.search(path.read_text())
+        assert match is not None
+        diagrams.append(match.group(1))
+    return diagrams
+
+
+def _shifted_variants(diagram: str) -> list[str]:
+    lines = diagram.splitlines()
+    return [
+        "\n".join("    " + line for line in lines),
+        "\n".join(line + "   " for line in lines),
+        "\n\n" + diagram + "\n\n   \n",
+        "\n".join("\t" + line for line in lines),
+    ]
+
+
+def _reference_centers(grid: list[list[str]]) -> list[float]:
+    # Uncached copy of ascii_align._layout_box_centers.
+    tops = sorted(_find_spans(grid, "┌", "┐"), key=lambda s: (s.row, s.c0, s.c1))
+    bottoms = sorted(_find_spans(grid, "└", "┘"), key=lambda s: (s.row, s.c0, s.c1))
+    centers = []
+    for top in tops:
+        for bottom in bottoms:
+            if (bottom.c0, bottom.c1) == (top.c0, top.c1) and bottom.row > top.row and _validate_box(grid, top, bottom):
+                centers.append(0.5 * (top.c0 + top.c1))
+                break
+    return centers
+
+
+@pytest.mark.parametrize("index", range(5))
+def test_cached_detect_misaligned_matches_uncached_for_shifted_variants(index: int) -> None:
+    diagram = _diagrams()[index]
+    for variant in [diagram, *_shifted_variants(diagram)]:
+        assert cached_detect_misaligned(variant) == detect_misaligned(variant)
+
+
+@pytest.mark.parametrize("index", range(5))
+def test_cached_layout_centers_match_uncached_for_shifted_variants(index: int) -> None:
+    diagram = _diagrams()[index]
+    for variant in [diagram, *_shifted_variants(diagram)]:
+        grid = normalize_grid(variant)
+        centers, width = cached_layout_centers(variant, _reference_centers)
+        assert centers == _reference_centers(grid)
+        assert width == len(grid[0])
+
+
+def test_canonical_key_ignores_indentation_and_trailing_space() -> None:
+    base = canonicalize_diagram("┌─┐\n│ │\n└─┘")
+    shifted = canonicalize_diagram("\n  ┌─┐   \n  │ │\n  └─┘\n")
+    assert base.key == shifted.key
+    assert shifted.offset == 2
+    assert canonicalize_diagram("┌─┐\n│x│\n└─┘").key != base.key
+
+
+def test_lru_cache_counts_hits_misses_and_evicts_oldest() -> None:
+    cache = LRUCache(maxsize=2)
+    calls: list[str] = []
+
+    def compute(key: str):
+        return lambda: calls.append(key) or key.upper()
+
+    assert cache.get_or_compute("a", compute("a")) == "A"
+    assert cache.get_or_compute("a", compute("a")) == "A"
+    cache.get_or_compute("b", compute("b"))
+    cache.get_or_compute("a", compute("a"))
+    cache.get_or_compute("c", compute("c"))  # evicts "b", the least recently used
+    cache.get_or_compute("b", compute("b"))
+
+    assert calls == ["a", "b", "c", "b"]
+    assert cache.stats() == {"hits": 2, "misses": 4, "evictions": 2, "size": 2, "maxsize": 2}
+
+
+def test_disk_cache_is_shared_between_instances_and_keyed_by_version(tmp_path: Path) -> None:
+    path = tmp_path / "scores.sqlite"
+    writer = DiskScoreCache(path)
+    reader = DiskScoreCache(path)
+
+    writer.put("detect_misaligned", "abc", "v1", {"misaligned": 2})
+    assert reader.get("detect_misaligned", "abc", "v1") == {"misaligned": 2}
+    assert reader.get("detect_misaligned", "abc", "v2") is None
+    assert reader.get("layout", "abc", "v1") is None
+    assert reader.stats() == {"hits": 1, "misses": 2}
+
+
+def test_disk_cache_prunes_least_recently_accessed(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(DiskScoreCache, "_PRUNE_EVERY", 1)
+    cache = DiskScoreCache(tmp_path / "scores.sqlite", max_entries=10)
+    for i in range(30):
+        cache.put("layout", f"k{i}", "v", [float(i)])
+
+    assert len(cache) <= 10
+    assert cache.get("layout", "k29", "v") == [29.0]
+    assert cache.get("layout", "k0", "v") is None
+
+
+def test_cached_detect_misaligned_reads_through_disk_cache(tmp_path: Path) -> None:
+    diagram = "┌──┐\n│ZZ│\n└──┘\n  │"
+    configure_scoring_cache(disk_path=tmp_path / "scores.sqlite")
+    try:
+        expected = detect_misaligned(diagram)
+        assert cached_detect_misaligned(diagram) == expected
+
+        # A fresh process would start with an empty LRU but the same file.
+        MISALIGNED_CACHE.clear()
+        assert cached_detect_misaligned(diagram) == expected
+        assert scoring_cache_stats()["disk"]["hits"] == 1
+    finally:
+        configure_scoring_cache()
+
+
+def test_layout_version_covers_constants_and_classes_the_layout_reaches(monkeypatch: pytest.MonkeyPatch) -> None:
+    from ascii_align import _layout_box_centers
+
+    names = set(layout_dependencies(_layout_box_centers))
+    assert {"N", "E", "S", "W", "DIR_MAP", "_Span", "_find_spans", "_validate_box", "connected"} <= names
+    assert not names & {"_count_connector_errors", "_count_arrow_errors", "detect_misaligned_grid"}
+
+    before = layout_version(_layout_box_centers)
+    monkeypatch.setattr(alignment_check, "N", 16)
+    assert layout_version(_layout_box_centers) != before
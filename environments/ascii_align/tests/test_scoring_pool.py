@@ -0,0 +1,232 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from ascii_align import DIAGNOSTIC_FIELDS, REWARD_FUNCS, layout_spread_reward, score_completion
+from scoring_cache import cache_hit_rate, scoring_cache_stats
+from scoring_pool import CACHE_HIT_METRIC, SAMPLED_METRIC, TIMEOUT_METRIC, ScoringPool, async_reward_funcs, diagnostic_means, sample_unit
+
+
+RESPONSE = """```text
+┌────┐   ┌────┐   ┌────┐
+│ A  │──▶│ B  │──▶│ C  │
+└────┘   └────┘   └────┘
+  │
+```"""
+
+
+def _completion(content: str) -> list[dict[str, str]]:
+    return [{"role": "assistant", "content": content}]
+
+
+def test_score_completion_matches_individual_reward_funcs() -> None:
+    info = {"theme": "flowcharts", "shape_budget": 6}
+    scores = score_completion(_completion(RESPONSE), info)
+
+    assert list(scores) == [func.__name__ for func in REWARD_FUNCS]
+    assert scores["layout_spread_reward"] == layout_spread_reward(_completion(RESPONSE), info=info)
+    for func in REWARD_FUNCS:
+        if func is not layout_spread_reward:
+            assert scores[func.__name__] == func(_completion(RESPONSE))
+
+
+@pytest.mark.parametrize("executor", ["none", "thread"])
+def test_async_reward_funcs_match_sync_scores(executor: str) -> None:
+    pool = ScoringPool(score_completion, executor=executor, max_workers=2)
+    funcs = async_reward_funcs([func.__name__ for func in REWARD_FUNCS], pool)
+    info = {"theme": "flowcharts", "shape_budget": 6}
+    state = {"trajectory_id": "t-1"}
+
+    async def run() -> list[float]:
+        return await asyncio.gather(*(func(_completion(RESPONSE), info=info, state=state) for func in funcs))
+
+    try:
+        values = asyncio.run(run())
+    finally:
+        pool.shutdown()
+
+    expected = score_completion(_completion(RESPONSE), info)
+    assert [func.__name__ for func in funcs] == list(expected)
+    assert values == list(expected.values())
+
+
+def test_scoring_pool_scores_each_rollout_once() -> None:
+    calls: list[str] = []
+
+    def score_fn(completion, info=None, diagnostics=True) -> dict[str, float]:
+        calls.append(completion[-1]["content"])
+        return {"format_reward": 1.0}
+
+    pool = ScoringPool(score_fn, executor="thread", max_workers=2, max_concurrency=1)
+
+    async def run() -> None:
+        for rollout in ("a", "b"):
+            state = {"trajectory_id": rollout}
+            await asyncio.gather(*(pool.score_rollout(_completion(rollout), None, state) for _ in range(5)))
+
+    try:
+        asyncio.run(run())
+    finally:
+        pool.shutdown()
+    assert calls == ["a", "b"]
+
+
+def test_pool_sums_the_process_workers_cache_counters() -> None:
+    pool = ScoringPool(score_completion, executor="process", max_workers=2, cache_stats_fn=scoring_cache_stats)
+
+    async def run() -> list[dict[str, float]]:
+        # The same diagram indented differently, so only its first check can miss.
+        first = await pool.score(_completion(RESPONSE))
+        rest = await asyncio.gather(*(pool.score(_completion(RESPONSE.replace("\n", "\n  "))) for _ in range(5)))
+        return [first, *rest]
+
+    try:
+        results = asyncio.run(run())
+        stats = pool.cache_stats()
+    finally:
+        pool.shutdown()
+
+    # The parent never scored, so everything counted here came from the workers.
+    assert 0 < stats["detect_misaligned"]["misses"] < stats["detect_misaligned"]["hits"]
+    assert all(0.0 < scores[CACHE_HIT_METRIC] <= 1.0 for scores in results[1:])
+    assert 0.0 < cache_hit_rate(stats) < 1.0
+
+
+def test_thread_pool_reads_this_process_cache_counters() -> None:
+    pool = ScoringPool(score_completion, executor="thread", cache_stats_fn=scoring_cache_stats)
+    try:
+        scores = asyncio.run(pool.score(_completion(RESPONSE)))
+    finally:
+        pool.shutdown()
+    assert pool.cache_stats() == scoring_cache_stats()
+    assert scores[CACHE_HIT_METRIC] == cache_hit_rate(scoring_cache_stats())
+
+
+def test_scoring_pool_rejects_unknown_executor() -> None:
+    with pytest.raises(ValueError):
+        ScoringPool(score_completion, executor="gpu")
+
+
+def slow_score(completion, info=None, diagnostics=True) -> dict[str, float]:
+    if "hang" in completion[-1]["content"]:
+        time.sleep(60)
+    return {"format_reward": 1.0}
+
+
+def test_process_pool_kills_timed_out_worker_and_captures_diagram(tmp_path) -> None:
+    pool = ScoringPool(
+        slow_score,
+        executor="process",
+        max_workers=1,
+        timeout=1.0,
+        timeout_scores={"format_reward": -1.0},
+        capture_dir=tmp_path,
+    )
+
+    async def run() -> list[dict[str, float]]:
+        hung = await pool.score(_completion("hang"))
+        # The single worker was replaced, so the next job still completes.
+        ok = await pool.score(_completion("fine"))
+        return [hung, ok]
+
+    started = time.monotonic()
+    try:
+        hung, ok = asyncio.run(run())
+    finally:
+        pool.shutdown()
+
+    assert time.monotonic() - started < 30
+    assert hung == {"format_reward": -1.0, SAMPLED_METRIC: 0.0, TIMEOUT_METRIC: 1.0}
+    assert ok == {"format_reward": 1.0, SAMPLED_METRIC: 1.0, TIMEOUT_METRIC: 0.0}
+    assert pool.timeouts == 1
+    records = [json.loads(line) for line in (tmp_path / "timeouts.jsonl").read_text().splitlines()]
+    assert [record["content"] for record in records] == ["hang"]
+
+
+def paced_score(completion, info=None, diagnostics=True) -> dict[str, float]:
+    time.sleep(0.3)
+    return {"format_reward": 1.0}
+
+
+def test_thread_pool_timeout_ignores_time_spent_queued() -> None:
+    pool = ScoringPool(paced_score, executor="thread", max_workers=1, timeout=0.5)
+
+    async def run() -> list[dict[str, float]]:
+        # Each job fits the timeout, but the last ones wait well past it for the single worker.
+        return await asyncio.gather(*(pool.score(_completion(f"job {i}")) for i in range(4)))
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        pool.shutdown()
+
+    assert [scores[TIMEOUT_METRIC] for scores in results] == [0.0] * 4
+    assert pool.timeouts == 0
+
+
+def test_score_completion_without_diagnostics_skips_zero_weight_metrics() -> None:
+    scores = score_completion(_completion(RESPONSE), diagnostics=False)
+    assert list(scores) == ["format_reward", "alignment_reward", "layout_spread_reward"]
+
+
+def test_diagnostic_sampling_is_deterministic_and_stores_raw_values() -> None:
+    rate = 0.25
+    raw: list[dict[str, float]] = []
+    pool = ScoringPool(
+        score_completion,
+        executor="none",
+        diagnostic_names=list(DIAGNOSTIC_FIELDS),
+        diagnostic_sample_rate=rate,
+        on_scores=lambda info, scores: raw.append(scores),
+    )
+    rollout_ids = [f"rollout-{i}" for i in range(400)]
+
+    async def run() -> list[dict[str, float]]:
+        return [await pool.score(_completion(RESPONSE), rollout_id=rollout_id) for rollout_id in rollout_ids]
+
+    results = asyncio.run(run())
+    full = score_completion(_completion(RESPONSE))
+
+    for rollout_id, stored, scores in zip(rollout_ids, raw, results):
+        if sample_unit(rollout_id) < rate:
+            assert stored[SAMPLED_METRIC] == scores[SAMPLED_METRIC] == 1.0
+            assert stored["misaligned_total_metric"] == full["misaligned_total_metric"]
+            assert scores["misaligned_total_metric"] > full["misaligned_total_metric"]
+        else:
+            assert stored[SAMPLED_METRIC] == scores[SAMPLED_METRIC] == 0.0
+            assert stored["misaligned_total_metric"] == scores["misaligned_total_metric"] == 0.0
+        assert scores["alignment_reward"] == full["alignment_reward"]
+
+    assert 0 < sum(scores[SAMPLED_METRIC] for scores in raw) < len(raw)
+    means = diagnostic_means(raw, DIAGNOSTIC_FIELDS)
+    assert means == pytest.approx({name: full[name] for name in DIAGNOSTIC_FIELDS})
+    assert diagnostic_means(raw[:0], DIAGNOSTIC_FIELDS) == dict.fromkeys(DIAGNOSTIC_FIELDS)
+    # What the rubric logs (the plain mean over all rollouts) is rate-corrected.
+    rubric_mean = sum(scores["misaligned_total_metric"] for scores in results) / len(results)
+    assert rubric_mean == pytest.approx(full["misaligned_total_metric"], rel=0.25)
+
+
+def test_rubric_means_are_corrected_for_diagnostics_skipped_under_pressure() -> None:
+    pool = ScoringPool(
+        score_completion,
+        executor="thread",
+        max_workers=1,
+        max_concurrency=1,
+        diagnostic_names=list(DIAGNOSTIC_FIELDS),
+        skip_diagnostics_under_pressure=True,
+    )
+
+    async def run() -> list[dict[str, float]]:
+        return await asyncio.gather(*(pool.score(_completion(RESPONSE)) for _ in range(8)))
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        pool.shutdown()
+
+    assert pool.diagnostics_skipped > 0
+    full = score_completion(_completion(RESPONSE))
+    rubric_mean = sum(scores["misaligned_total_metric"] for scores in results) / len(results)
+    assert rubric_mean == pytest.approx(full["misaligned_total_metric"])
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from layout_spec import layout_spec
+from splits import env_rows_batch, hash_split_indices, prepared_splits_key, source_identity
+from token_budget import TokenBudgetModel
+
+
+def _batch() -> dict:
+    return {
+        "prompt": ["Draw a login flow", "Draw a queue"],
+        "theme": ["flowcharts", "sequence"],
+        "shape_budget": [4, 8],
+    }
+
+
+def test_env_rows_batch_wraps_prompts_and_builds_info() -> None:
+    model = TokenBudgetModel()
+    rows = env_rows_batch(_batch(), [0, 1], source_indices=[7, 3], budget_model=model, train=True, shard_index=1, num_shards=3)
+
+    assert rows["prompt"] == [
+        [{"role": "user", "content": "Draw a login flow"}],
+        [{"role": "user", "content": "Draw a queue"}],
+    ]
+    first = rows["info"][0]
+    assert list(first) == ["source_index", "theme", "shape_budget", "max_tokens", "layout", "train_order_index"]
+    assert first["source_index"] == 7
+    assert first["layout"] == layout_spec("flowcharts", 4)
+    assert first["max_tokens"] == model.budget("flowcharts", 4)
+    assert [info["train_order_index"] for info in rows["info"]] == [1, 4]
+
+
+def test_env_rows_batch_eval_rows_have_no_train_order() -> None:
+    rows = env_rows_batch(_batch(), [0, 1], source_indices=[0, 1], budget_model=TokenBudgetModel(), train=False)
+    assert all("train_order_index" not in info for info in rows["info"])
+
+
+def test_prepared_splits_key_tracks_settings_and_source(tmp_path: Path) -> None:
+    model = TokenBudgetModel()
+    base = prepared_splits_key(None, model, seed=42, num_shards=1)
+
+    assert prepared_splits_key(None, model, seed=42, num_shards=1) == base
+    assert prepared_splits_key(None, model, seed=43, num_shards=1) != base
+    assert prepared_splits_key(None, TokenBudgetModel(scale=2.0), seed=42, num_shards=1) != base
+
+    data = tmp_path / "train.arrow"
+    data.write_bytes(b"a")
+    local = prepared_splits_key(str(data), model, seed=42, num_shards=1)
+    assert local != base
+    data.write_bytes(b"ab")
+    assert source_identity(str(data)) != source_identity(None)
+    assert prepared_splits_key(str(data), model, seed=42, num_shards=1) != local
+
+
+def test_source_identity_ignores_cache_files_in_a_saved_dataset(tmp_path: Path) -> None:
+    for name in ("state.json", "dataset_info.json", "data-00000-of-00001.arrow"):
+        (tmp_path / name).write_text(name)
+    identity = source_identity(str(tmp_path))
+
+    (tmp_path / "cache-0123456789abcdef.arrow").write_bytes(b"map output")
+    assert source_identity(str(tmp_path)) == identity
+    (tmp_path / "data-00000-of-00001.arrow").write_text("changed data")
+    assert source_identity(str(tmp_path)) != identity
+
+
+def _prompts(n: int) -> list[str]:
+    return [f"Draw diagram {i} with {i % 7 + 2} boxes" for i in range(n)]
+
+
+def test_hash_split_is_a_partition_close_to_test_size() -> None:
+    prompts = _prompts(2000)
+    train, eval_ = hash_split_indices(prompts, test_size=0.2, seed=42)
+
+    assert sorted(train + eval_) == list(range(2000))
+    assert 0.17 <= len(eval_) / 2000 <= 0.23
+    assert hash_split_indices(prompts, test_size=0.2, seed=42) == (train, eval_)
+    assert hash_split_indices(prompts, test_size=0.2, seed=7) != (train, eval_)
+
+
+def test_hash_split_is_stable_when_rows_are_added_or_reordered() -> None:
+    prompts = _prompts(500)
+    train, eval_ = hash_split_indices(prompts, test_size=0.2, seed=42)
+
+    grown = ["A brand new prompt", *prompts[:250], "Another new prompt", *reversed(prompts[250:])]
+    grown_train, grown_eval = hash_split_indices(grown, test_size=0.2, seed=42)
+
+    def texts(rows: list[int], source: list[str]) -> list[str]:
+        return [source[i] for i in rows]
+
+    # Same membership, and old prompts keep their relative train order.
+    assert set(texts(eval_, prompts)) <= set(texts(grown_eval, grown))
+    old = set(prompts)
+    assert [p for p in texts(grown_train, grown) if p in old] == texts(train, prompts)
+
+
+def test_hash_split_rejects_absolute_test_size() -> None:
+    with pytest.raises(ValueError):
+        hash_split_indices(_prompts(10), test_size=5, seed=42)
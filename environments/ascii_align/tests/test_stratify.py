@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from collections import Counter
+
+import pytest
+
+from stratify import shape_budget_bucket, stratified_order, stratum_key, stratum_weight
+
+
+@pytest.mark.parametrize(
+    ("shape_budget", "bucket"),
+    [(1, "1-4"), (4, "1-4"), (5, "5-9"), (12, "10-15"), (16, "16+"), ("8", "5-9"), (None, "unknown"), ("x", "unknown")],
+)
+def test_shape_budget_bucket(shape_budget, bucket: str) -> None:
+    assert shape_budget_bucket(shape_budget) == bucket
+
+
+def test_stratum_weight_prefers_exact_key_then_theme() -> None:
+    weights = {"sequence": 2.0, "sequence/10-15": 0.5}
+    assert stratum_weight("sequence/10-15", weights) == 0.5
+    assert stratum_weight("sequence/1-4", weights) == 2.0
+    assert stratum_weight("flowcharts/1-4", weights) == 1.0
+
+
+def test_stratified_order_prefixes_follow_population_shares() -> None:
+    keys = ["a"] * 60 + ["b"] * 30 + ["c"] * 10
+    order = stratified_order(keys)
+
+    assert sorted(order) == list(range(100))
+    for n in (10, 20, 50):
+        counts = Counter(keys[i] for i in order[:n])
+        assert counts == {"a": 6 * n // 10, "b": 3 * n // 10, "c": n // 10}
+    # Members of a stratum keep their relative order.
+    assert [i for i in order if keys[i] == "b"] == list(range(60, 90))
+
+
+def test_stratified_order_applies_weights_and_drops_zero_weight() -> None:
+    keys = [stratum_key("flowcharts", 8)] * 50 + [stratum_key("sequence", 8)] * 50 + [stratum_key("syntax_drills", 3)] * 5
+    order = stratified_order(keys, {"flowcharts": 3.0, "syntax_drills": 0.0})
+
+    assert len(order) == 100
+    counts = Counter(keys[i] for i in order[:20])
+    assert counts == {"flowcharts/5-9": 15, "sequence/5-9": 5}
+    assert stratified_order(keys, {"flowcharts": 3.0, "syntax_drills": 0.0}) == order
@@ -0,0 +1,48 @@
+import pytest
+
+from token_budget import TokenBudgetModel, apply_token_budget
+
+
+def test_budget_grows_with_shape_budget_and_theme() -> None:
+    model = TokenBudgetModel()
+    small = model.budget("frameworks", 4)
+    large = model.budget("swimlanes", 12)
+
+    assert model.min_tokens <= small < large <= model.max_tokens
+    assert model.budget("flowcharts", 8) == model.budget("unknown-theme", 8)
+    assert model.budget("flowcharts", None) == model.budget("flowcharts", "not-a-number")
+
+
+def test_budget_is_clamped_and_scaled() -> None:
+    model = TokenBudgetModel(min_tokens=600, max_tokens=2000)
+    assert model.budget("syntax_drills", 1) == 600
+    assert model.budget("sequence", 200) == 2000
+    assert TokenBudgetModel(scale=3.0).budget("flowcharts", 8) > TokenBudgetModel().budget("flowcharts", 8)
+
+
+def test_calibrate_uses_quantile_of_observed_rates(tmp_path) -> None:
+    observations = [
+        {"theme": "sequence", "shape_budget": 10, "completion_tokens": 256 + 10 * rate}
+        for rate in range(100, 200)
+    ]
+    observations += [{"theme": "frameworks", "shape_budget": 4, "completion_tokens": 900}]
+
+    model = TokenBudgetModel.calibrate(observations, quantile=0.9)
+
+    assert model.tokens_per_shape["sequence"] == pytest.approx(189.0)
+    # Too few observations: the default rate is kept.
+    assert model.tokens_per_shape["frameworks"] == TokenBudgetModel().tokens_per_shape["frameworks"]
+
+    path = tmp_path / "budget.json"
+    model.save(path)
+    assert TokenBudgetModel.load(path).budget("sequence", 10) == model.budget("sequence", 10)
+    assert TokenBudgetModel.load(path, scale=2.0).scale == 2.0
+
+
+def test_apply_token_budget_lowers_but_never_raises_a_configured_limit() -> None:
+    assert apply_token_budget({"max_tokens": 5000, "temperature": 1.0}, 820) == {"max_tokens": 820, "temperature": 1.0}
+    assert apply_token_budget({"max_tokens": 500}, 900) == {"max_tokens": 500}
+    assert apply_token_budget({"max_completion_tokens": 5000}, 900) == {"max_completion_tokens": 900}
+    assert apply_token_budget({"temperature": 1.0, "max_tokens": None}, 900) == {"temperature": 1.0, "max_tokens": 900}
+    assert apply_token_budget(None, 900) == {"max_tokens": 900}
+    assert apply_token_budget({"max_tokens": 5000}, None) == {"max_tokens": 5000}
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable
+
+DEFAULT_SHAPE_BUDGET = 8
+DEFAULT_MAX_TOKENS = 5000
+
+# Rough completion tokens per requested shape (box + label + connectors),
+# before calibration. Sequence and swimlane diagrams draw lifelines/lanes on
+# top of their boxes, so they run larger.
+DEFAULT_TOKENS_PER_SHAPE: Dict[str, float] = {
+    "default": 110.0,
+    "sequence": 150.0,
+    "swimlanes": 150.0,
+    "state_machines": 120.0,
+    "frameworks": 100.0,
+    "syntax_drills": 80.0,
+}
+
+
+def _shape_budget(value: Any) -> int:
+    try:
+        shape_budget = int(value) if value is not None else DEFAULT_SHAPE_BUDGET
+    except (TypeError, ValueError):
+        shape_budget = DEFAULT_SHAPE_BUDGET
+    return max(1, shape_budget)
+
+
+def _quantile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+@dataclass
+class TokenBudgetModel:
+    """
+    Per-example generation budget: `(base + per_shape[theme] * shape_budget) * headroom`,
+    scaled by `scale` and clamped to [min_tokens, max_tokens].
+
+    `scale` exists for thinking models, whose reasoning comes on top of the
+    diagram itself.
+    """
+
+    base_tokens: float = 256.0
+    tokens_per_shape: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_TOKENS_PER_SHAPE))
+    headroom: float = 1.25
+    scale: float = 1.0
+    min_tokens: int = 512
+    max_tokens: int = DEFAULT_MAX_TOKENS
+
+    def budget(self, theme: Any, shape_budget: Any) -> int:
+        theme = str(theme or "").lower()
+        per_shape = self.tokens_per_shape.get(theme, self.tokens_per_shape["default"])
+        estimate = (self.base_tokens + per_shape * _shape_budget(shape_budget)) * self.headroom * self.scale
+        return int(min(self.max_tokens, max(self.min_tokens, math.ceil(estimate))))
+
+    @classmethod
+    def calibrate(
+        cls,
+        observations: Iterable[Dict[str, Any]],
+        quantile: float = 0.95,
+        min_observations: int = 20,
+        **kwargs: Any,
+    ) -> "TokenBudgetModel":
+        """
+        Fit per-theme tokens-per-shape from observed rollouts.
+
+        Each observation needs `theme`, `shape_budget` and `completion_tokens`
+        (tokens the model actually used for a complete, fenced diagram).
+        Themes with fewer than `min_observations` keep the default rate.
+        """
+        model = cls(**kwargs)
+        rates: Dict[str, list[float]] = {}
+        for observation in observations:
+            tokens = observation.get("completion_tokens")
+            if tokens is None:
+                continue
+            theme = str(observation.get("theme") or "").lower() or "default"
+            shapes = _shape_budget(observation.get("shape_budget"))
+            rate = max(0.0, float(tokens) - model.base_tokens) / shapes
+            rates.setdefault(theme, []).append(rate)
+            rates.setdefault("default", []).append(rate)
+
+        for theme, values in rates.items():
+            if len(values) >= min_observations:
+                model.tokens_per_shape[theme] = _quantile(values, quantile)
+        return model
+
+    def save(self, path: str | os.PathLike) -> None:
+        Path(path).write_text(json.dumps(asdict(self), indent=2, sort_keys=True))
+
+    @classmethod
+    def load(cls, path: str | os.PathLike, **overrides: Any) -> "TokenBudgetModel":
+        data = json.loads(Path(path).read_text())
+        data.update(overrides)
+        return cls(**data)
+
+
+def apply_token_budget(sampling_args: Dict[str, Any] | None, budget: int | None) -> Dict[str, Any]:
+    """
+    Copy of `sampling_args` whose token limit is at most `budget`: a
+    configured `max_tokens`/`max_completion_tokens` is lowered to it (never
+    raised), and `max_tokens` is set to it when neither is configured.
+    """
+    merged = dict(sampling_args or {})
+    if not budget:
+        return merged
+    configured = [key for key in ("max_tokens", "max_completion_tokens") if merged.get(key) is not None]
+    for key in configured:
+        merged[key] = min(int(merged[key]), int(budget))
+    if not configured:
+        merged["max_tokens"] = int(budget)
+    return merged